@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Header
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 from app.services.csv_events_service import csv_events_service
+from app.services.compute_executor import compute_executor
 from app.models import EventInfo
 from app.core.config import settings
 
@@ -18,7 +19,8 @@ async def get_events_by_month(year: int, month: int) -> List[EventInfo]:
     else:
         end_date = date(year, month + 1, 1) - timedelta(days=1)
     
-    events = csv_events_service.get_events_for_date_range(
+    events = await compute_executor.run(
+        csv_events_service.get_events_for_date_range,
         start_date.strftime("%Y-%m-%d"),
         end_date.strftime("%Y-%m-%d")
     )
@@ -1,10 +1,15 @@
 import os
+import json
 import requests
 import csv as csv_lib
 import io
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from app.core.config import settings
+from app.services.analyze.pedestrian_store import pedestrian_store, read_pedestrian_csv
+from app.services.utils.files import atomic_write, file_signature, write_json_atomic
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.today_snapshots import refresh_snapshots
 import logging
 
 router = APIRouter()
@@ -13,6 +18,12 @@ security = HTTPBearer()
 data_dir = os.path.join("app", "data", "meidai")
 os.makedirs(data_dir, exist_ok=True)
 
+# 差分取り込み用の状態ファイル（CSVごとの ETag・最終日時・取り込み済みバイト位置）
+state_path = os.path.join("app", "data", "meidai_ingest_state.json")
+
+REQUEST_TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -35,66 +46,268 @@ csvs = [
 ]
 
 
-def filter_person_only(csv_data):
-    """CSVデータから"name"列が"person"の行のみを抽出する関数"""
-    input_file = io.StringIO(csv_data)
-    output_file = io.StringIO()
-    
-    csv_reader = csv_lib.reader(input_file)
-    csv_writer = csv_lib.writer(output_file)
-    
-    # ヘッダー行を取得
-    header = next(csv_reader)
-    csv_writer.writerow(header)
-    
-    # name列のインデックスを見つける
+def load_ingest_state():
+    """前回取り込み時の状態（ETag・最終日時・取り込み済みバイト数など）を読み込む"""
+    if not os.path.exists(state_path):
+        return {}
     try:
-        name_index = header.index('name')
-    except ValueError:
-        # name列がない場合は元のデータをそのまま返す
-        logger.warning("CSV does not have 'name' column, returning original data")
-        return csv_data
-    
-    # "person"の行のみをフィルタリング
-    person_rows = 0
-    for row in csv_reader:
-        if len(row) > name_index and row[name_index] == 'person':
-            csv_writer.writerow(row)
-            person_rows += 1
-    
-    logger.debug(f"Filtered {person_rows} 'person' rows from CSV")
-    return output_file.getvalue()
-
-
-def run_fetch_csv():
+        with open(state_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read ingest state, falling back to full fetch: {e}")
+        return {}
+
+
+def save_ingest_state(state):
+    """取り込み状態を一時ファイル経由で保存する"""
+    write_json_atomic(state_path, state)
+
+
+def iter_lines_with_offset(response, start_offset=0):
+    """
+    レスポンス本文を1行ずつ (行頭のバイト位置, 行のバイト列) で返す
+
+    改行は取り除く。末尾が改行で終わっていない場合も最後の行として返す。
+    """
+    offset = start_offset
+    pending = b""
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if not chunk:
+            continue
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield offset, line.rstrip(b"\r")
+            offset += len(line) + 1
+    if pending:
+        yield offset, pending.rstrip(b"\r")
+
+
+def _parse_row(line):
+    """CSVの1行を列のリストに変換する（引用符がなければ単純に分割する）"""
+    if '"' not in line:
+        return line.split(",")
+    return next(csv_lib.reader([line]))
+
+
+def _is_person(row, name_index):
+    return name_index is None or (len(row) > name_index and row[name_index] == 'person')
+
+
+def fetch_csv_full(csv, file_path):
+    """
+    CSVを全件取得し、"person" の行のみを一時ファイルに書き出してから置き換える
+
+    差分取り込みができない場合（初回・状態不整合・サーバー側の書き換え）に使用する。
+    """
+    headers = {"Accept-Encoding": "identity"}
+    with requests.get(csv['url'], headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        lines = iter_lines_with_offset(response)
+        first = next(lines, None)
+        if first is None:
+            raise ValueError(f"Empty CSV returned from {csv['url']}")
+        header_line = first[1].decode("utf-8-sig")
+        header = _parse_row(header_line)
+        name_index = header.index('name') if 'name' in header else None
+        if name_index is None:
+            logger.warning("CSV does not have 'name' column, keeping all rows")
+        datetime_index = header.index('datetime_jst') if 'datetime_jst' in header else None
+
+        tail_offset, tail = first
+        last_datetime = None
+        person_rows = 0
+        with atomic_write(file_path, "w", encoding="utf-8", newline="") as file:
+            file.write(header_line + "\n")
+            for offset, raw in lines:
+                if not raw:
+                    continue
+                tail_offset, tail = offset, raw
+                line = raw.decode("utf-8")
+                row = _parse_row(line)
+                if not _is_person(row, name_index):
+                    continue
+                file.write(line + "\n")
+                person_rows += 1
+                if datetime_index is not None and len(row) > datetime_index:
+                    last_datetime = max(last_datetime or "", row[datetime_index])
+
+        logger.debug(f"Filtered {person_rows} 'person' rows from CSV")
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "header": header_line,
+            "tail": tail.decode("utf-8"),
+            "tail_offset": tail_offset,
+            "remote_bytes": tail_offset + len(tail),
+            "last_datetime": last_datetime,
+        }
+    return entry, person_rows
+
+
+def fetch_csv_incremental(csv, file_path, state_entry):
+    """
+    前回から追記された行のみを取得してローカルCSVの末尾に追加する
+
+    - ETag / Last-Modified による条件付きGETで、変更がなければ本文を取得しない
+    - 前回取り込んだ最終行の位置からの Range リクエストで追記分のみを取得する
+      （先頭行が前回の最終行と一致しない場合は書き換えとみなし None を返す）
+    - Range に対応しないサーバーでは全件をストリームで読み、前回の最終日時より新しい行のみ追加する
+
+    Returns:
+        (更新後の状態, 追加した行のリスト) / 全件取得が必要な場合は None
+    """
+    headers = {"Accept-Encoding": "identity"}
+    if state_entry.get("etag"):
+        headers["If-None-Match"] = state_entry["etag"]
+    if state_entry.get("last_modified"):
+        headers["If-Modified-Since"] = state_entry["last_modified"]
+    if state_entry.get("tail") and state_entry.get("tail_offset") is not None:
+        headers["Range"] = f"bytes={state_entry['tail_offset']}-"
+
+    with requests.get(csv['url'], headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304:
+            return state_entry, []
+        if response.status_code == 416:
+            # 前回の最終行以降に何もない（= 変更なし）か、ファイルが縮んだ
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit() and int(total) == state_entry.get("remote_bytes"):
+                return state_entry, []
+            return None
+        response.raise_for_status()
+
+        header_line = state_entry["header"]
+        header = _parse_row(header_line)
+        name_index = header.index('name') if 'name' in header else None
+        datetime_index = header.index('datetime_jst') if 'datetime_jst' in header else None
+
+        if response.status_code == 206:
+            lines = iter_lines_with_offset(response, state_entry["tail_offset"])
+            first = next(lines, None)
+            if first is None or first[1].decode("utf-8") != state_entry["tail"]:
+                logger.info(f"{csv['name']} was rewritten on the server")
+                return None
+            tail_offset, tail = first
+            last_datetime = None
+        else:
+            # Range非対応: 全件を読み、前回の最終日時より新しい行のみ対象にする
+            lines = iter_lines_with_offset(response)
+            first = next(lines, None)
+            if first is None or first[1].decode("utf-8-sig") != header_line:
+                return None
+            tail_offset, tail = first
+            last_datetime = state_entry.get("last_datetime")
+
+        new_lines = []
+        new_rows = []
+        newest = state_entry.get("last_datetime")
+        for offset, raw in lines:
+            if not raw:
+                continue
+            tail_offset, tail = offset, raw
+            line = raw.decode("utf-8")
+            row = _parse_row(line)
+            if not _is_person(row, name_index):
+                continue
+            if datetime_index is not None and len(row) > datetime_index:
+                if last_datetime is not None and row[datetime_index] <= last_datetime:
+                    continue
+                newest = max(newest or "", row[datetime_index])
+            new_lines.append(line)
+            new_rows.append(row)
+
+        if new_lines:
+            with open(file_path, "a", encoding="utf-8", newline="") as file:
+                file.write("\n".join(new_lines) + "\n")
+
+        entry = dict(state_entry)
+        entry.update({
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "tail": tail.decode("utf-8"),
+            "tail_offset": tail_offset,
+            "remote_bytes": tail_offset + len(tail),
+            "last_datetime": newest,
+        })
+    if not new_rows:
+        return entry, []
+    return entry, [header] + new_rows
+
+
+def _rows_to_frame(rows):
+    """ヘッダー付きの行リストを集計用の型付きDataFrameに変換する"""
+    buffer = io.StringIO()
+    csv_lib.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    return read_pedestrian_csv(buffer)
+
+
+def run_fetch_csv(full_refresh=False):
     """
     API に依存しない CSV 取得・フィルタリング・保存の実行関数。
     CLI からも利用できるように切り出し。
+
+    通常は前回からの追記分のみを取り込み、集計キューブも追記された月のみ更新する。
+    full_refresh=True の場合は全件を取得してファイルとキューブを作り直す。
     """
+    state = {} if full_refresh else load_ingest_state()
     results = []
     for csv in csvs:
+        place = os.path.splitext(csv['name'])[0]
+        file_path = os.path.join(data_dir, csv['name'])
         try:
-            logger.debug(f"Fetching CSV from {csv['url']}")
-            response = requests.get(csv['url'])
-            response.raise_for_status()
-            csv_data = response.text
-            
-            # "person" のみにフィルタリング
-            logger.debug(f"Filtering '{csv['name']}' for 'person' rows only")
-            filtered_csv_data = filter_person_only(csv_data)
-
-            file_path = os.path.join(data_dir, csv['name'])
-            logger.debug(f"Saving filtered CSV to {file_path}")
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(filtered_csv_data)
-
-            logger.info(f"CSV {csv['name']} fetched, filtered, and saved successfully")
-            results.append({"name": csv['name'], "status": "success"})
+            entry = state.get(csv['name'])
+            incremental = None
+            previous_signature = file_signature(file_path)
+            if entry and entry.get("header") and previous_signature is not None:
+                logger.debug(f"Fetching new rows of {csv['name']} from {csv['url']}")
+                incremental = fetch_csv_incremental(csv, file_path, entry)
+
+            if incremental is None:
+                logger.debug(f"Fetching CSV from {csv['url']}")
+                entry, person_rows = fetch_csv_full(csv, file_path)
+                state[csv['name']] = entry
+                save_ingest_state(state)
+                logger.info(f"CSV {csv['name']} fetched, filtered, and saved successfully")
+
+                # 集計キューブを作り直して保存
+                rollup_store.rebuild(place)
+                logger.info(f"Rollup cubes for {place} rebuilt")
+                results.append({"name": csv['name'], "status": "success", "mode": "full", "rows": person_rows})
+                continue
+
+            # 追記したCSVと取り込み位置を先に保存する（集計への反映に失敗しても同じ行を再び追記しない。
+            # 反映できなかった集計は、次に読み込むときにCSVの変更を検出して作り直される）
+            entry, new_rows = incremental
+            state[csv['name']] = entry
+            save_ingest_state(state)
+            if new_rows:
+                rows = _rows_to_frame(new_rows)
+                pedestrian_store.apply_rows(place, rows, previous_signature)
+                rollup_store.apply_rows(place, rows, previous_signature)
+                logger.info(f"CSV {csv['name']}: appended {len(new_rows) - 1} rows")
+            else:
+                logger.info(f"CSV {csv['name']} is unchanged")
+            results.append({
+                "name": csv['name'],
+                "status": "success",
+                "mode": "incremental",
+                "rows": max(len(new_rows) - 1, 0),
+            })
         except Exception as e:
             logger.error(f"Error occurred while processing {csv['name']}: {str(e)}")
             results.append({"name": csv['name'], "status": "error", "error": str(e)})
 
-    return {"message": "CSV fetch and filter process completed", "results": results}
+    # 新しいデータを取り込んだ場所の「今日の詳細」スナップショットを作り直す
+    updated_places = [
+        os.path.splitext(result["name"])[0]
+        for result in results
+        if result["status"] == "success" and (result["mode"] == "full" or result["rows"] > 0)
+    ]
+    snapshots = refresh_snapshots(updated_places)
+
+    return {"message": "CSV fetch and filter process completed", "results": results, "snapshots": snapshots}
 
 
 @router.post("/api/fetch-csv")
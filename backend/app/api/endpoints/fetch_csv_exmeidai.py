@@ -1,21 +1,28 @@
 import os
+import json
+import math
+import time
 import boto3
-import csv
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from app.core.config import settings
+from app.services.analyze.pedestrian_store import pedestrian_store, read_pedestrian_csv
+from app.services.utils.files import atomic_write, file_signature
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.today_snapshots import refresh_snapshots
 import logging
 import io
 from datetime import datetime
-import pandas as pd
 
 router = APIRouter()
 security = HTTPBearer()
 
 # 出力ディレクトリを他のCSVファイルと同じmeidaiに変更
 data_dir = os.path.join("app", "data", "meidai")
-# 一時的にデータを保存するディレクトリ（処理途中で使用）
-temp_dir = os.path.join("app", "data", "temp_exmeidai")
+# 処理済みの .dat ファイル（キー → ETag・サイズ・処理日時）の一覧
+manifest_path = os.path.join("app", "data", "exmeidai_manifest.json")
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -33,223 +40,430 @@ CAMERA_NAME_MAPPING = {
     3: "gyouzinbashi"
 }
 
+# データが保存されているバケット
+BUCKET = 'datakiban-data-prd-takayama'
+
+# 同時に取得する .dat ファイル数の上限（カメラをまたいで共有する）
+MAX_IN_FLIGHT = int(os.environ.get("EXMEIDAI_MAX_IN_FLIGHT", "16"))
+# ファイルごとの再試行回数と初回の待ち時間（秒、再試行ごとに倍にする）
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# 最終ファイルのヘッダー
+CSV_HEADER = "datetime_jst,date_jst,time_jst,dayofweek,name,countingDirection,count_1_hour"
+
 # ディレクトリ作成
 os.makedirs(data_dir, exist_ok=True)
-os.makedirs(temp_dir, exist_ok=True)
 
-def dat_to_csv(dat_content, year, month, day, camera_num):
+def parse_dat_hourly(dat_content: str) -> dict:
     """
-    datファイルを名古屋大学フォーマットのCSVに変換する
+    datファイルの15分単位の人数を1時間ごとに合計する
+
+    時刻（HH:MM）は文字列を分割して整数に変換し、1行ずつ時間ごとの合計に加算する。
+    数値化できない人数は0として扱い、時刻が不正な行は読み飛ばす。
+
+    Returns:
+        {時間(0〜23): 人数の合計}
     """
-    # 名大フォーマット用のCSV出力
-    csv_content = io.StringIO()
-    csv_writer = csv.writer(csv_content)
-    
-    # 日付情報を準備
-    date_obj = datetime.strptime(f"{year}-{month}-{day}", "%Y-%m-%d")
-    dayofweek = date_obj.strftime("%A")
-    date_str = date_obj.strftime("%Y-%m-%d")
-    
     lines = dat_content.splitlines()
     if len(lines) > 1:
         lines = lines[1:]  # ヘッダー行削除
-    
-    rows = []
+
+    totals = {}
     for line in lines:
-        if line.strip():
+        if not line.strip():
+            continue
+        fields = line.split(',')
+        time_str = fields[0].strip('"').strip()
+        hour_str, sep, minute_str = time_str.partition(':')
+        try:
+            hour = int(hour_str)
+            minute = int(minute_str)
+            if not sep or not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError(time_str)
+        except ValueError:
+            logger.error(f"データ変換エラー: 時刻が不正です, 行: {line}")
+            continue
+
+        count = 0.0
+        if len(fields) > 1:
             try:
-                # ダブルクォート除去 & フィールド分割
-                fields = [field.strip('"').strip() for field in line.split(',')]
-                
-                # データ行から時刻と人数を抽出
-                time_str = fields[0] if len(fields) > 0 else "00:00"
-                count = fields[1] if len(fields) > 1 else "0"
-                
-                # 時刻から時間だけ抽出
-                time_obj = datetime.strptime(time_str, "%H:%M")
-                hour = time_obj.strftime("%H")
-                
-                # 完全な日時文字列を作成
-                datetime_str = f"{date_str} {time_str}:00"
-                
-                # 名大フォーマットの行を作成
-                rows.append([
-                    datetime_str,                 # datetime_jst
-                    date_str,                     # date_jst
-                    hour,                         # time_jst
-                    dayofweek,                    # dayofweek
-                    "person",                     # name
-                    "SumOfBothDirection",         # countingDirection
-                    count                         # count_1_hour
-                ])
-            except Exception as e:
-                logger.error(f"データ変換エラー: {e}, 行: {line}")
-    
-    # 行を書き込み
-    for row in rows:
-        csv_writer.writerow(row)
-    
-    return csv_content.getvalue()
-
-def fetch_and_process_camera_data(camera_num: int):
+                count = float(fields[1].strip('"').strip())
+            except ValueError:
+                pass
+            if not math.isfinite(count):
+                count = 0.0
+        totals[hour] = totals.get(hour, 0.0) + count
+    return totals
+
+
+def hourly_rows(date_str: str, totals: dict) -> list:
+    """1日分の時間ごとの合計を、時刻順の最終ファイルの行（文字列）に変換する"""
+    dayofweek = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A")
+    return [
+        f"{date_str} {hour:02d}:00:00,{date_str},{hour},{dayofweek},person,SumOfBothDirection,{round(total)}\n"
+        for hour, total in sorted(totals.items())
+    ]
+
+
+class FetchStats:
+    """取得したファイル数・バイト数と経過時間を記録する"""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def add(self, size: int):
+        self.files += 1
+        self.bytes += size
+
+    def summary(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "files": self.files,
+            "failed_files": self.failed,
+            "bytes": self.bytes,
+            "elapsed_sec": round(elapsed, 3),
+            "files_per_sec": round(self.files / elapsed, 2),
+            "bytes_per_sec": round(self.bytes / elapsed, 2),
+        }
+
+
+def list_dat_objects(camera_num: int, client=None):
     """
-    カメラデータを取得し、一時ファイルに保存する
+    カメラの .dat ファイル（例: C20200501.dat）を一覧し、
+    (S3オブジェクト情報, (年, 月, 日)) を順に返す
     """
+    client = client or s3
+    prefix = f'for-work/city-takayama/fa-cam{camera_num}/'
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            file_name = os.path.basename(key)
+            if not (key.endswith('.dat') and file_name.startswith('C')):
+                continue
+            # ファイル名から日付情報を抽出
+            date_str = file_name.replace('C', '').replace('.dat', '')
+            if len(date_str) >= 8:
+                yield obj, (date_str[:4], date_str[4:6], date_str[6:8])
+            else:
+                logger.warning(f"日付情報の抽出に失敗: {file_name}")
+
+
+def download_with_retry(key: str, client=None, max_retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF) -> bytes:
+    """オブジェクトを取得する。失敗した場合は待ち時間を倍にしながら再試行する"""
+    client = client or s3
+    for attempt in range(max_retries + 1):
+        try:
+            return client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            wait_sec = backoff * (2 ** attempt)
+            logger.warning(f"{key} の取得に失敗しました（{attempt + 1}回目）: {e} / {wait_sec:.1f}秒後に再試行します")
+            time.sleep(wait_sec)
+
+
+def load_manifest() -> dict:
+    """処理済み .dat ファイルの一覧を読み込む"""
+    if not os.path.exists(manifest_path):
+        return {}
     try:
-        camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
-        temp_file = os.path.join(temp_dir, f"{camera_name}_temp.csv")
-        
-        # 一時ファイルが存在する場合は削除
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        
-        # ヘッダー行を書き込み
-        with open(temp_file, "w", encoding="utf-8", newline='') as file:
-            file.write("datetime_jst,date_jst,time_jst,dayofweek,name,countingDirection,count_1_hour\n")
-        
-        bucket = 'datakiban-data-prd-takayama'
-        prefix = f'for-work/city-takayama/fa-cam{camera_num}/'
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"マニフェストの読み込みに失敗しました（全件処理します）: {e}")
+        return {}
 
-        logger.info(f"カメラ{camera_num}({camera_name})のデータ取得を開始します")
-        
-        paginator = s3.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
-
-        processed_files = 0
-        
-        for page in pages:
-            for obj in page.get('Contents', []):
-                key = obj['Key']
-                if key.endswith('.dat') and os.path.basename(key).startswith('C'):
-                    file_name = os.path.basename(key)
-                    # ファイル名から日付情報を抽出 (例: C20200501.dat)
-                    date_str = file_name.replace('C', '').replace('.dat', '')
-                    
-                    if len(date_str) >= 8:
-                        year = date_str[:4]
-                        month = date_str[4:6]
-                        day = date_str[6:8]
-                        
-                        logger.debug(f"処理中: {file_name}, 日付: {year}-{month}-{day}")
-                        
-                        try:
-                            data = s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
-                            
-                            # CSVに変換
-                            csv_data = dat_to_csv(data, year, month, day, camera_num)
-                            
-                            # 一時ファイルに追記
-                            with open(temp_file, "a", encoding="utf-8", newline='') as file:
-                                file.write(csv_data)
-                            
-                            processed_files += 1
-                            if processed_files % 100 == 0:
-                                logger.info(f"カメラ{camera_num}({camera_name}): {processed_files}ファイル処理済み")
-                                
-                        except Exception as e:
-                            logger.error(f"ファイル{file_name}の処理中にエラー発生: {str(e)}")
-                    else:
-                        logger.warning(f"日付情報の抽出に失敗: {file_name}")
-        
-        logger.info(f"カメラ{camera_num}({camera_name})の処理完了: {processed_files}ファイル処理")
-        return True, processed_files
-    
-    except Exception as e:
-        logger.error(f"カメラ{camera_num}の全体処理でエラー発生: {str(e)}")
-        return False, 0
 
-def aggregate_by_hour(df):
+def save_manifest(manifest: dict):
+    """処理済み .dat ファイルの一覧を一時ファイル経由で保存する"""
+    with atomic_write(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def manifest_entry(obj: dict) -> dict:
+    return {
+        "etag": obj.get('ETag'),
+        "size": obj.get('Size'),
+        "processed_at": datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def is_processed(manifest: dict, obj: dict) -> bool:
+    """マニフェストに同じETag・サイズで記録済みのオブジェクトか"""
+    entry = manifest.get(obj['Key'])
+    return entry is not None and entry.get('etag') == obj.get('ETag') and entry.get('size') == obj.get('Size')
+
+
+def _fetch_and_convert(client, key, backoff):
+    data = download_with_retry(key, client, backoff=backoff)
+    return len(data), parse_dat_hourly(data.decode('utf-8'))
+
+
+def fetch_cameras(
+    camera_nums,
+    client=None,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    backoff: float = RETRY_BACKOFF,
+    manifest: dict = None,
+):
     """
-    15分単位のデータを1時間単位に集計する
+    複数カメラの .dat ファイルを並列に取得し、日ごとの1時間単位の合計に変換する
+
+    ダウンロードと変換はカメラをまたいで共有するスレッドプールで行い、
+    同時に実行中・結果待ちのファイル数は max_in_flight の2倍までに抑える。
+    15分単位のデータは各ファイルの変換中にのみ保持し、一時ファイルには書き出さない。
+    個々のファイルは再試行後も失敗した場合のみスキップする。
+    manifest を指定した場合、記録済みでETag・サイズが変わっていないファイルは取得しない
+    （新規・更新のファイルがある日は、その日の全てのファイルを取得する）。
+    取得できなかったファイルがある日は days・objects に含めない。
+
+    Returns:
+        ({カメラ番号: {"success", "processed", "failed", "skipped", "objects", "days", "failed_dates"}}, FetchStats)
+        objects には反映できるファイルのS3オブジェクト情報、
+        days には {日付("YYYY-MM-DD"): {時間: 人数の合計}} が入る
     """
-    # 日時データを確実に日時型に変換
-    df['datetime_jst'] = pd.to_datetime(df['datetime_jst'])
-    
-    # 日付と時間でグループ化するための列を作成
-    df['date_hour'] = df['datetime_jst'].dt.floor('H')
-    
-    # 必要な列を抽出してグループ化し、countを合計
-    aggregated = df.groupby([
-        'date_hour',
-        'date_jst',
-        'time_jst',
-        'dayofweek',
-        'name',
-        'countingDirection'
-    ])['count_1_hour'].apply(lambda x: pd.to_numeric(x, errors='coerce').sum()).reset_index()
-    
-    # データ型整理と書式設定
-    aggregated['datetime_jst'] = aggregated['date_hour'].dt.strftime('%Y-%m-%d %H:00:00')
-    aggregated.drop('date_hour', axis=1, inplace=True)
-    
-    # count_1_hourを整数に変換
-    aggregated['count_1_hour'] = aggregated['count_1_hour'].round().astype(int)
-    
-    # 列の順序を整理
-    return aggregated[[
-        'datetime_jst',
-        'date_jst',
-        'time_jst',
-        'dayofweek',
-        'name',
-        'countingDirection',
-        'count_1_hour'
-    ]]
-
-def sort_and_finalize_csv(camera_num: int):
+    client = client or s3
+    stats = FetchStats()
+    results = {}
+    jobs = []
+
+    for camera_num in camera_nums:
+        camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
+        logger.info(f"カメラ{camera_num}({camera_name})のデータ取得を開始します")
+        try:
+            objects = list(list_dat_objects(camera_num, client))
+        except Exception as e:
+            logger.error(f"カメラ{camera_num}の全体処理でエラー発生: {str(e)}")
+            results[camera_num] = {
+                "success": False, "processed": 0, "failed": 0, "skipped": 0, "objects": [], "days": {},
+                "failed_dates": set(),
+            }
+            continue
+
+        skipped = 0
+        if manifest:
+            # 同じ日付のファイルは合算して1日分の行にするため、新規・更新のファイルがある日は
+            # 処理済みのファイルも取得し直す（その日の行は取得した合計で置き換える）
+            changed_dates = {date_parts for obj, date_parts in objects if not is_processed(manifest, obj)}
+            pending = [(obj, date_parts) for obj, date_parts in objects if date_parts in changed_dates]
+            skipped = len(objects) - len(pending)
+            objects = pending
+            logger.info(f"カメラ{camera_num}({camera_name}): 新規・更新 {len(objects)}ファイル / 処理済み {skipped}ファイル")
+
+        results[camera_num] = {
+            "success": True, "processed": 0, "failed": 0, "skipped": skipped, "objects": [], "days": {},
+            "failed_dates": set(),
+        }
+        jobs.extend((camera_num, obj, date_parts) for obj, date_parts in objects)
+
+    object_dates = {obj['Key']: "{}-{}-{}".format(*date_parts) for _, obj, date_parts in jobs}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        job_iter = iter(jobs)
+        in_flight = {}
+
+        def submit(count):
+            for camera_num, obj, date_parts in islice(job_iter, count):
+                future = executor.submit(_fetch_and_convert, client, obj['Key'], backoff)
+                in_flight[future] = (camera_num, obj, date_parts)
+
+        submit(max_in_flight * 2)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                camera_num, obj, (year, month, day) = in_flight.pop(future)
+                result = results[camera_num]
+                try:
+                    size, totals = future.result()
+                except Exception as e:
+                    logger.error(f"ファイル{os.path.basename(obj['Key'])}の処理中にエラー発生: {str(e)}")
+                    result["failed"] += 1
+                    result["failed_dates"].add(f"{year}-{month}-{day}")
+                    stats.failed += 1
+                    continue
+
+                # 同じ日付のファイルが複数ある場合は合算する
+                day_totals = result["days"].setdefault(f"{year}-{month}-{day}", {})
+                for hour, total in totals.items():
+                    day_totals[hour] = day_totals.get(hour, 0.0) + total
+                stats.add(size)
+                result["objects"].append(obj)
+                result["processed"] += 1
+                if result["processed"] % 100 == 0:
+                    camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
+                    logger.info(f"カメラ{camera_num}({camera_name}): {result['processed']}ファイル処理済み")
+            submit(len(done))
+
+    # 取得できなかったファイルがある日は一部のファイルの合計になるため反映せず、
+    # その日のファイルは処理済みとして記録しない（次回その日の全てのファイルを取得し直す）
+    for result in results.values():
+        if result["failed_dates"]:
+            for date_str in result["failed_dates"]:
+                result["days"].pop(date_str, None)
+            result["objects"] = [
+                obj for obj in result["objects"] if object_dates[obj['Key']] not in result["failed_dates"]
+            ]
+
+    summary = stats.summary()
+    for camera_num, result in results.items():
+        camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
+        logger.info(f"カメラ{camera_num}({camera_name})の処理完了: {result['processed']}ファイル処理")
+    logger.info(
+        f"取得完了: {summary['files']}ファイル / {summary['bytes']}バイト "
+        f"({summary['files_per_sec']} files/s, {summary['bytes_per_sec']} bytes/s)"
+    )
+    return results, stats
+
+
+def write_days_csv(final_file: str, days: dict):
+    """日ごとの1時間単位の合計から最終ファイルを日時順に作成する（一時ファイル経由で置き換え）"""
+    with atomic_write(final_file, "w", encoding="utf-8", newline='') as f:
+        f.write(CSV_HEADER + "\n")
+        for date_str in sorted(days):
+            f.writelines(hourly_rows(date_str, days[date_str]))
+
+
+def rebuild_camera_csv(camera_num: int, days: dict):
     """
-    一時的なCSVファイルを日時でソートして、1時間単位に集約後、最終的なファイルを作成
+    取得した全ての日から最終ファイルと集計キューブを作り直す
     """
     try:
         camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
-        temp_file = os.path.join(temp_dir, f"{camera_name}_temp.csv")
         final_file = os.path.join(data_dir, f"{camera_name}.csv")
-        
-        # CSVを読み込み
-        df = pd.read_csv(temp_file)
-        
-        # 空のデータフレームならエラー
-        if df.empty:
+
+        # 空のデータならエラー
+        if not any(days.values()):
             logger.error(f"カメラ{camera_num}({camera_name})のデータが空です")
             return False
-        
-        logger.info(f"カメラ{camera_num}({camera_name})のデータを1時間単位に集計します")
-        
-        # 1時間単位に集約
-        aggregated_df = aggregate_by_hour(df)
-        
-        # 日時でソート
-        aggregated_df = aggregated_df.sort_values('datetime_jst')
-        
-        # 結果を保存
-        aggregated_df.to_csv(final_file, index=False)
+
+        write_days_csv(final_file, days)
         logger.info(f"カメラ{camera_num}({camera_name})の最終ファイルを作成しました: {final_file}")
-        
-        # 一時ファイルを削除
-        os.remove(temp_file)
-        
+
+        # 集計キューブを作り直して保存
+        rollup_store.rebuild(camera_name)
+        logger.info(f"カメラ{camera_num}({camera_name})の集計キューブを作成しました")
+
         return True
-    
+
     except Exception as e:
-        logger.error(f"カメラ{camera_num}のデータのソートと最終化中にエラー発生: {str(e)}")
+        logger.error(f"カメラ{camera_num}の最終ファイルの作成中にエラー発生: {str(e)}")
         return False
 
 
-def run_fetch_all_exmeidai():
+def _read_last_line(path: str) -> str:
+    """ファイルの最終行を末尾から読み取る"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - 4096, 0))
+        lines = f.read().splitlines()
+    return lines[-1].decode("utf-8") if lines else ""
+
+
+def merge_hourly_into_csv(final_file: str, days: dict):
+    """
+    新しく取得した日の1時間単位データを最終ファイルに反映する
+
+    取得した日が全て既存の最終日より後であれば末尾に追記するだけで済ませる。
+    過去の日が再取得された場合は、既存ファイルを1行ずつ読みながら
+    その日の行を差し替えて書き直す（集計のための再読み込みは行わない）。
+    """
+    new_dates = sorted(days)
+    new_lines = [line for date_str in new_dates for line in hourly_rows(date_str, days[date_str])]
+    last_line = _read_last_line(final_file)
+
+    if not last_line.startswith('datetime_jst') and new_dates[0] > last_line[:10]:
+        with open(final_file, "a", encoding="utf-8", newline='') as f:
+            f.writelines(new_lines)
+        return new_lines
+
+    replaced = set(new_dates)
+    with open(final_file, "r", encoding="utf-8") as src, atomic_write(final_file, "w", encoding="utf-8", newline='') as dst:
+        dst.write(src.readline())
+        i = 0
+        for line in src:
+            if line[:10] in replaced:
+                continue
+            while i < len(new_lines) and new_lines[i][:19] < line[:19]:
+                dst.write(new_lines[i])
+                i += 1
+            dst.write(line)
+        dst.writelines(new_lines[i:])
+    return new_lines
+
+
+def merge_new_days(camera_num: int, days: dict):
+    """
+    新規・更新分の日の1時間単位データのみを最終ファイルと集計キューブに反映する
+    """
+    try:
+        camera_name = CAMERA_NAME_MAPPING.get(camera_num, f"fa-cam{camera_num}")
+        final_file = os.path.join(data_dir, f"{camera_name}.csv")
+
+        if not days:
+            logger.info(f"カメラ{camera_num}({camera_name})の新しいデータはありません")
+            return True
+
+        previous_signature = file_signature(final_file)
+        new_lines = merge_hourly_into_csv(final_file, days)
+        logger.info(f"カメラ{camera_num}({camera_name})の最終ファイルに{len(new_lines)}行を反映しました")
+
+        # 再取得した日は置き換え、それ以外の月のキャッシュはそのまま使えるようにする
+        new_rows = read_pedestrian_csv(io.StringIO(CSV_HEADER + "\n" + "".join(new_lines)))
+        pedestrian_store.apply_rows(camera_name, new_rows, previous_signature, replace_dates=True)
+        rollup_store.apply_rows(camera_name, new_rows, previous_signature, replace_dates=True)
+        return True
+
+    except Exception as e:
+        logger.error(f"カメラ{camera_num}の新しいデータの反映中にエラー発生: {str(e)}")
+        return False
+
+
+def run_fetch_all_exmeidai(max_in_flight: int = MAX_IN_FLIGHT, client=None, full_rebuild: bool = False):
     """
     API に依存しない Exmeidai 全カメラ取得・集計の実行関数。
     CLI からも利用できるように切り出し。
+
+    通常はマニフェストに記録されていない（または更新された）.dat ファイルのみを取得し、
+    既存の最終ファイルに反映する。full_rebuild=True の場合、
+    および最終ファイルやマニフェストの記録がないカメラは全件を取得して作り直す。
     """
+    cam_nums = [1, 2, 3]
+    manifest = {} if full_rebuild else load_manifest()
+
+    # 最終ファイルかマニフェストの記録がないカメラは全件を処理する
+    rebuild_cams = set()
+    for cam_num in cam_nums:
+        camera_name = CAMERA_NAME_MAPPING.get(cam_num, f"fa-cam{cam_num}")
+        prefix = f'for-work/city-takayama/fa-cam{cam_num}/'
+        has_entries = any(key.startswith(prefix) for key in manifest)
+        if not has_entries or not os.path.exists(os.path.join(data_dir, f"{camera_name}.csv")):
+            rebuild_cams.add(cam_num)
+            manifest = {key: entry for key, entry in manifest.items() if not key.startswith(prefix)}
+
     results = {}
     total_processed = 0
-    for cam_num in [1, 2, 3]:
+    camera_results, stats = fetch_cameras(cam_nums, client, max_in_flight, manifest=manifest)
+    for cam_num, result in camera_results.items():
         camera_name = CAMERA_NAME_MAPPING.get(cam_num, f"fa-cam{cam_num}")
-        success, processed = fetch_and_process_camera_data(cam_num)
-        if success:
-            final_success = sort_and_finalize_csv(cam_num)
+        processed = result["processed"]
+        if result["success"]:
+            if cam_num in rebuild_cams:
+                final_success = rebuild_camera_csv(cam_num, result["days"])
+            else:
+                final_success = merge_new_days(cam_num, result["days"])
+            if final_success:
+                for obj in result["objects"]:
+                    manifest[obj['Key']] = manifest_entry(obj)
             results[camera_name] = {
                 "status": "success" if final_success else "partial_success",
-                "files_processed": processed
+                "mode": "full" if cam_num in rebuild_cams else "incremental",
+                "files_processed": processed,
+                "files_skipped": result["skipped"],
+                "files_failed": result["failed"],
             }
             total_processed += processed
         else:
@@ -258,10 +472,20 @@ def run_fetch_all_exmeidai():
                 "files_processed": processed
             }
 
+    save_manifest(manifest)
+
+    # 新しいデータを取り込んだ場所の「今日の詳細」スナップショットを作り直す
+    snapshots = refresh_snapshots(
+        camera_name for camera_name, result in results.items()
+        if result["status"] == "success" and result["files_processed"] > 0
+    )
+
     return {
         "message": "カメラデータの収集と集約が完了しました",
         "total_processed": total_processed,
         "results": results,
+        "snapshots": snapshots,
+        "transfer": stats.summary(),
         "output_directory": data_dir
     }
 
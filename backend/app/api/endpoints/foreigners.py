@@ -2,6 +2,7 @@ from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
+from app.services.compute_executor import compute_executor
 from app.services.foreigners_service import foreigners_stats_service
 
 
@@ -31,12 +32,16 @@ async def get_foreigners_monthly_ranking(
     """
 
     try:
-        data = foreigners_stats_service.get_monthly_ranking(month, year, top_n)
+        data = await compute_executor.run(
+            foreigners_stats_service.get_monthly_ranking, month, year, top_n
+        )
         return {
             "success": True,
             "data": data,
             "message": "月別ランキングデータを取得しました。",
         }
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="外国人宿泊データが見つかりません。")
     except ValueError as exc:
@@ -65,12 +70,16 @@ async def get_foreigners_yearly_distribution(
     """
 
     try:
-        data = foreigners_stats_service.get_yearly_distribution(year, top_n)
+        data = await compute_executor.run(
+            foreigners_stats_service.get_yearly_distribution, year, top_n
+        )
         return {
             "success": True,
             "data": data,
             "message": "年間分布データを取得しました。",
         }
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="外国人宿泊データが見つかりません。")
     except ValueError as exc:
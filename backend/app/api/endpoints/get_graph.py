@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException
 import os
-import pandas as pd
 from app.services.analyze import (
     get_data_for_calendar250414 as calendar_service,
 )
@@ -10,6 +9,7 @@ from app.services.analyze import get_data_for_year
 from app.services.analyze import get_data_for_month
 from app.services.analyze import get_data_for_week
 from app.services.analyze import get_event_effect
+from app.services.analyze.rollup_store import rollup_store
 from app.services.ai_service_debug import analyze_csv_data_debug
 from app.services.highlighter_service import (
     highlight_calendar_data,
@@ -18,17 +18,46 @@ from app.services.highlighter_service import (
 )
 from app.services.weather.weather_service import weather_service
 from app.services.csv_events_service import csv_events_service
-from app.models import GraphRequest, GraphResponse, WeatherInfo, EventInfo
-import time
+from app.services.response_cache import ResponseCache
+from app.services.compute_executor import compute_executor
+from app.services.cache_backends import create_backend, dumps, loads
+from app.core.config import settings
+from app.services.analyze.trend_engine import months_between
+from app.models import (
+    GraphRequest,
+    GraphResponse,
+    WeatherInfo,
+    EventInfo,
+    CalendarBatchRequest,
+    CalendarBatchResponse,
+    MonthCalendar,
+)
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional, Tuple
 
 router = APIRouter()
 
-# キャッシュを格納する辞書
-cache = {}
-# キャッシュの有効期限（1日 = 86400秒）
-CACHE_EXPIRY = 86400
+# 年・月・週の推移（全期間のデータを使うアクション）
+TREND_ACTIONS = ["year_trend", "month_trend", "week_trend"]
+# 当月以降・推移のレスポンスの有効期限（秒）。過去の月は有効期限なし
+CURRENT_PERIOD_TTL = 600
+# カレンダーの一括取得で1回に指定できる月数の上限
+CALENDAR_BATCH_MAX_MONTHS = 24
+
+# レスポンスのキャッシュ（件数とJSONのバイト数で上限を設ける）
+# 共有先を設定した場合は、複数のワーカーで計算結果を共有する
+cache = ResponseCache(
+    max_entries=512,
+    max_bytes=64 * 1024 * 1024,
+    backend=create_backend(
+        settings.RESPONSE_CACHE_BACKEND,
+        path=settings.RESPONSE_CACHE_PATH,
+        url=settings.REDIS_URL,
+    ),
+    encode=lambda response: dumps(response.model_dump(mode="json")),
+    decode=lambda data: GraphResponse.model_validate(loads(data)),
+    namespace="get_graph",
+)
 
 
 @router.post("/api/get-graph")
@@ -39,32 +68,159 @@ async def get_graph(request: GraphRequest):
     action = request.action
     day = request.day
 
+    # event_effectの場合はキャッシュをスキップ（dayパラメータによって結果が変わるため）
+    if action == "event_effect":
+        return await build_graph_response(request)
+
     # キャッシュキーの作成（dayがある場合は含める）
     cache_key = f"{place}_{year}_{month}_{day if day else ''}_{action}"
 
-    # event_effectの場合はキャッシュをスキップ（dayパラメータによって結果が変わるため）
-    current_time = time.time()
-    if action != "event_effect" and cache_key in cache:
-        cached_data, timestamp = cache[cache_key]
-        if current_time - timestamp < CACHE_EXPIRY:
-            print(f"Cache hit for {cache_key}")
-            return cached_data
-        else:
-            # 期限切れのキャッシュを削除
-            del cache[cache_key]
-            print(f"Cache expired for {cache_key}")
+    # 同じキーの同時リクエストは1回の計算にまとめる
+    return await cache.get_or_compute(
+        cache_key,
+        lambda: build_graph_response(request),
+        ttl=_cache_ttl(year, month, action),
+        is_fresh=lambda stored_at: _cache_is_fresh(place, year, month, action, stored_at),
+    )
+
+
+@router.get("/api/get-graph/cache-stats")
+async def get_graph_cache_stats():
+    """レスポンスキャッシュのヒット・ミス・削除件数"""
+    return cache.stats()
+
 
-    # キャッシュがない場合、通常の処理を実行
-    csv_file_path = f"app/data/meidai/{place}.csv"
+@router.post("/api/get-calendars")
+async def get_calendars(request: CalendarBatchRequest) -> CalendarBatchResponse:
+    """
+    複数の月のカレンダーを1回のリクエストで返す
+
+    months で (年, 月) のリストを、または start〜end で範囲を指定する。
+    混雑度は全ての月をまとめて1回で計算し、ハイライトは月ごとに適用する。
+    """
+    if not request.action.startswith("cal"):
+        raise HTTPException(status_code=400, detail="action はカレンダーのアクション（cal〜）を指定してください")
+    months = _calendar_batch_months(request)
+
+    csv_file_path = f"app/data/meidai/{request.place}.csv"
     if not os.path.exists(csv_file_path):
         raise HTTPException(
             status_code=404, detail="CSV file not found for the given place"
         )
 
+    return await compute_executor.run(
+        compose_calendar_batch, request.place, request.action, months
+    )
+
+
+def _calendar_batch_months(request: CalendarBatchRequest) -> List[Tuple[int, int]]:
+    """リクエストから対象の (年, 月) のリストを作成する（不正な指定は400）"""
+    if request.months:
+        months = [(m.year, m.month) for m in request.months]
+    elif request.start and request.end:
+        if (request.start.year, request.start.month) > (request.end.year, request.end.month):
+            raise HTTPException(status_code=400, detail="start は end 以前の月を指定してください")
+        for m in (request.start, request.end):
+            if not 1 <= m.month <= 12:
+                raise HTTPException(status_code=400, detail=f"月の指定が正しくありません: {m.year}/{m.month}")
+        # 月数が多すぎる範囲は列挙する前に拒否する
+        span = (request.end.year - request.start.year) * 12 + request.end.month - request.start.month + 1
+        if span > CALENDAR_BATCH_MAX_MONTHS:
+            raise HTTPException(status_code=400, detail=f"一度に取得できるのは{CALENDAR_BATCH_MAX_MONTHS}か月までです")
+        months = months_between(
+            datetime(request.start.year, request.start.month, 1),
+            datetime(request.end.year, request.end.month, 1),
+        )
+    else:
+        raise HTTPException(status_code=400, detail="months または start と end を指定してください")
+
+    months = list(dict.fromkeys(months))
+    for year, month in months:
+        if not 1 <= month <= 12:
+            raise HTTPException(status_code=400, detail=f"月の指定が正しくありません: {year}/{month}")
+    if len(months) > CALENDAR_BATCH_MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"一度に取得できるのは{CALENDAR_BATCH_MAX_MONTHS}か月までです")
+    return months
+
+
+def compose_calendar_batch(place: str, action: str, months: List[Tuple[int, int]]) -> CalendarBatchResponse:
+    """複数の月のカレンダー・天気・イベントを組み立てる（ブロッキング処理）"""
     try:
-        # CSVファイルを読み込む
-        df = pd.read_csv(csv_file_path)
-        df['datetime_jst'] = pd.to_datetime(df['datetime_jst'])
+        rollup = rollup_store.get(place)
+        place_name = os.path.splitext(os.path.basename(place))[0]
+        weather_by_month = {
+            (year, month): weather_service.get_daily_weather_summary(year, month)
+            for year, month in months
+        }
+        calendars = calendar_service.get_data_for_calendars(
+            rollup, months, place_name, weather_by_month
+        )
+
+        return CalendarBatchResponse(
+            place=place,
+            action=action,
+            calendars=[
+                MonthCalendar(
+                    year=year,
+                    month=month,
+                    data=highlight_calendar_data(calendars[(year, month)], action),
+                    weather_data=[
+                        WeatherInfo(
+                            day=wd['day'],
+                            date=wd['date'],
+                            weather=wd['weather'],
+                            avg_temperature=wd['avg_temperature'],
+                            total_rain=wd['total_rain'],
+                        )
+                        for wd in weather_by_month[(year, month)] or []
+                    ],
+                    event_data=get_events_for_period(year, month),
+                )
+                for year, month in months
+            ],
+        )
+    except Exception as e:
+        print(f"Error processing calendar batch request: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing data: {str(e)}",
+        )
+
+
+async def build_graph_response(request: GraphRequest) -> GraphResponse:
+    """リクエストに応じたグラフ用データを作成する（キャッシュは get_graph で扱う）"""
+    csv_file_path = f"app/data/meidai/{request.place}.csv"
+    if not os.path.exists(csv_file_path):
+        raise HTTPException(
+            status_code=404, detail="CSV file not found for the given place"
+        )
+
+    # AIアドバイスの生成（定型文の組み立てのみのためイベントループ上で行う）
+    ai_advice = await analyze_csv_data_debug(
+        csv_file_path, request.year, request.month, request.action
+    )
+
+    # 集計はイベントループを止めないよう計算用のスレッドプールで行う
+    return await compute_executor.run(
+        compose_graph_response, request, csv_file_path, ai_advice
+    )
+
+
+def compose_graph_response(
+    request: GraphRequest, csv_file_path: str, ai_advice: str
+) -> GraphResponse:
+    """集計キューブ・天気・イベントからグラフ用のレスポンスを組み立てる（ブロッキング処理）"""
+    place = request.place
+    year = request.year
+    month = request.month
+    action = request.action
+    day = request.day
+
+    try:
+        # 取り込み時に作成した集計キューブを取得（古い場合は再作成される）
+        rollup = rollup_store.get(place)
         
         # 天気データを取得（既存のメソッドを使用）
         weather_data = None
@@ -92,7 +248,7 @@ async def get_graph(request: GraphRequest):
                     })
 
             trend_data = get_data_for_year.get_data_for_year(
-                df, place, yearly_weather_data
+                rollup, place, yearly_weather_data
             )
             response_data = {
                 "type": "year_trend",
@@ -117,7 +273,7 @@ async def get_graph(request: GraphRequest):
                     })
 
             trend_data = get_data_for_month.get_data_for_month(
-                df, year, place, monthly_weather_data
+                rollup, year, place, monthly_weather_data
             )
             response_data = {
                 "type": "month_trend",
@@ -142,7 +298,7 @@ async def get_graph(request: GraphRequest):
                     })
 
             trend_data = get_data_for_week.get_data_for_week(
-                df, year, month, place, weekly_weather_data
+                rollup, year, month, place, weekly_weather_data
             )
             response_data = {
                 "type": "week_trend",
@@ -176,11 +332,6 @@ async def get_graph(request: GraphRequest):
                 )
                 print(f"Event effect data received: {event_effect_data.get('event_date', 'N/A')}")
             
-            # AIアドバイスの生成
-            ai_advice = await analyze_csv_data_debug(
-                csv_file_path, year, month, action
-            )
-            
             # 天気データの整形
             weather_info_list = []
             if weather_data:
@@ -209,7 +360,6 @@ async def get_graph(request: GraphRequest):
             )
             
             # event_effectの場合はキャッシュしない（dayパラメータによって結果が変わるため）
-            # cache[cache_key] = (response, current_time)
             print(f"Event effect data returned (not cached)")
             
             return response
@@ -227,12 +377,9 @@ async def get_graph(request: GraphRequest):
             if action[:3] == "cal":
                 # カレンダーデータの作成 - placeをファイル名から抽出して渡す
                 place_name = os.path.splitext(os.path.basename(place))[0]
-                data = calendar_service.get_data_for_calendar(
-                    df, year, month, place_name, weather_data
-                )
-                # ハイライト処理
-                data = highlight_calendar_data(data, action)
-                
+                months = [(year, month)]
+                weather_by_month = {(year, month): weather_data}
+
                 # 先月のデータも必要なアクションの場合
                 if action in ["cal_holiday", "cal_shoping_holiday", "cal_long_holiday"]:
                     # 先月の年月を計算
@@ -247,15 +394,20 @@ async def get_graph(request: GraphRequest):
                     previous_month_weather_raw = weather_service.get_daily_weather_summary(
                         previous_year, previous_month
                     )
-                    
-                    # 先月のカレンダーデータを生成
-                    previous_month_data = calendar_service.get_data_for_calendar(
-                        df, previous_year, previous_month, place_name, previous_month_weather_raw
+                    months.append((previous_year, previous_month))
+                    weather_by_month[(previous_year, previous_month)] = previous_month_weather_raw
+
+                # 今月と先月のカレンダーデータをまとめて作成し、それぞれハイライト処理
+                calendars = calendar_service.get_data_for_calendars(
+                    rollup, months, place_name, weather_by_month
+                )
+                data = highlight_calendar_data(calendars[(year, month)], action)
+
+                if previous_month is not None:
+                    previous_month_data = highlight_calendar_data(
+                        calendars[(previous_year, previous_month)], action
                     )
                     
-                    # 先月のデータもハイライト処理
-                    previous_month_data = highlight_calendar_data(previous_month_data, action)
-                    
                     # 先月の天気データを整形
                     if previous_month_weather_raw:
                         previous_month_weather_data = [
@@ -277,7 +429,7 @@ async def get_graph(request: GraphRequest):
                     year, month
                 )
                 data = get_data_for_week_time250522.get_data_for_week_time(
-                    csv_file_path, year, month, week_weather_data
+                    rollup, year, month, week_weather_data
                 )
                 # ハイライト処理
                 data = highlight_week_time_data(data, action)
@@ -289,7 +441,7 @@ async def get_graph(request: GraphRequest):
                     )
                 )
                 data = get_data_for_date_time250504.get_data_for_date_time(
-                    df,
+                    rollup,
                     year,
                     month,
                     place,
@@ -302,11 +454,6 @@ async def get_graph(request: GraphRequest):
                 data = []
                 print(f"Warning: Unsupported action: {action}")
 
-            # AIアドバイスの生成
-            ai_advice = await analyze_csv_data_debug(
-                csv_file_path, year, month, action
-            )
-
             # 天気データの取得
             weather_info_list = [
                 WeatherInfo(
@@ -337,18 +484,10 @@ async def get_graph(request: GraphRequest):
                 previous_month=previous_month,
             )
 
-            # キャッシュにレスポンスを保存
-            cache[cache_key] = (response, current_time)
-            print(f"Cache set for {cache_key}")
-
             return response
 
         # 新しい傾向分析の場合はここで返す
         if action in ["year_trend", "month_trend", "week_trend"]:
-            # AIアドバイスの生成
-            ai_advice = await analyze_csv_data_debug(
-                csv_file_path, year, month, action
-            )
             response_data["ai_analysis"] = ai_advice
 
             # 天気データの整形
@@ -378,10 +517,6 @@ async def get_graph(request: GraphRequest):
                 highlighted_info=response_data["highlighted_info"],
             )
 
-            # キャッシュにレスポンスを保存
-            cache[cache_key] = (response, current_time)
-            print(f"Cache set for {cache_key}")
-
             return response
 
     except Exception as e:
@@ -395,6 +530,57 @@ async def get_graph(request: GraphRequest):
         )
 
 
+def _cache_ttl(year: int, month: int, action: str) -> Optional[float]:
+    """
+    レスポンスの有効期限を返す
+
+    過去の月のデータは変わらないため有効期限を設けない（データの更新は _cache_is_fresh で検知する）。
+    当月以降と、当月を含む推移は取り込みのたびに変わるため短い有効期限とする。
+    カレンダーの混雑度は全期間の平均で決まるため、過去の月も _cache_is_fresh でいずれかの月の更新を確認する。
+    """
+    if action in TREND_ACTIONS:
+        return CURRENT_PERIOD_TTL
+    today = datetime.now()
+    if (year, month) >= (today.year, today.month):
+        return CURRENT_PERIOD_TTL
+    return None
+
+
+def _cache_is_fresh(place: str, year: int, month: int, action: str, timestamp: float) -> bool:
+    """
+    キャッシュ作成後に、その結果の元になった月のデータが更新されていないか確認する
+
+    差分取り込みでは追記された月のみ更新時刻が進むため、
+    それ以外の月のキャッシュは有効期限まで利用し続ける。
+    年・月・週の推移は全期間のデータを使うため、いずれかの月が更新されれば無効にする。
+    カレンダー（cal〜）の混雑度も全期間の日別人数の平均（middles['calendar']）を基準にするため同様。
+    天気データはその月（と先月）の天気が変わった場合のみ無効にする。
+    イベント情報のCSVが更新された場合は全て無効にする。
+
+    キューブの保存済みの更新時刻のみを参照し、キューブの読み込み・作り直しは行わない
+    （取り込み直後でまだ反映されていない場合は無効とし、計算時に作り直す）。
+    """
+    rollup = rollup_store.stamps(place)
+    if rollup is None:
+        return False
+
+    try:
+        if os.path.getmtime(csv_events_service.events_file) > timestamp:
+            return False
+    except OSError:
+        pass
+
+    months = [(year, month)]
+    if action in ["cal_holiday", "cal_shoping_holiday", "cal_long_holiday"]:
+        months.append((year - 1, 12) if month == 1 else (year, month - 1))
+    if any(timestamp < weather_service.updated_at(y, m) for y, m in months):
+        return False
+
+    if action in TREND_ACTIONS or action.startswith("cal"):
+        return timestamp >= rollup.updated_at()
+    return all(timestamp >= rollup.updated_at(y, m) for y, m in months)
+
+
 def get_events_for_period(year: int, month: int) -> List[EventInfo]:
     """指定された年月のイベント情報を取得"""
     try:
@@ -412,18 +598,3 @@ def get_events_for_period(year: int, month: int) -> List[EventInfo]:
         return [EventInfo(**event) for event in events]
     except Exception:
         return []
-
-# キャッシュのクリーンアップ関数（定期的に実行する場合）
-def cleanup_cache():
-    """期限切れのキャッシュエントリを削除します"""
-    current_time = time.time()
-    expired_keys = [
-        key for key, (_, timestamp) in cache.items()
-        if current_time - timestamp > CACHE_EXPIRY
-    ]
-
-    for key in expired_keys:
-        del cache[key]
-
-    if expired_keys:
-        print(f"Cleaned up {len(expired_keys)} expired cache entries")
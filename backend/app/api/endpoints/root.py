@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from app.services.compute_executor import compute_executor
 
 router = APIRouter()
 
@@ -10,3 +11,8 @@ async def root():
 async def get_data():
     data = [1, 2, 3]
     return {"data": data}
+
+@router.get("/api/compute-stats")
+async def get_compute_stats():
+    """集計処理の実行待ち件数・待ち時間・実行時間"""
+    return compute_executor.stats()
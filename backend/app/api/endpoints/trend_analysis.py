@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime, timedelta
+import hashlib
+import json
 import os
-from app.services.analyze.get_trend_analysis import get_congestion_data
+from app.services.analyze.get_trend_analysis import (
+    TREND_DAY_FIELDS,
+    get_congestion_data,
+    get_trend_days_for_month,
+    get_trend_window,
+    get_year_over_year_comparison,
+)
+from app.services.analyze.place_pool import place_pool
+from app.services.analyze.today_snapshots import SNAPSHOT_WEEKS, today_snapshots
+from app.services.analyze.trend_engine import ALIGN_MODES, months_between
+from app.services.compute_executor import compute_executor
 from app.services.csv_events_service import csv_events_service
 from app.models import EventInfo
 
@@ -29,11 +42,85 @@ def get_events_for_date_range_extended(start_date: datetime, end_date: datetime)
     except Exception:
         return []
 
+# ストリーミングで返せる最大の週数（3年分）
+STREAM_MAX_WEEKS = 156
+
+# 前年比較で一度に比較できる最大の年数
+YOY_MAX_YEARS = 10
+
+ALIGN_DESCRIPTION = "去年の比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）"
+
+# スナップショットから作成したレスポンスの本文（場所ごとに最新の1件を ETag とともに保持）
+_snapshot_bodies = {}
+
+
+def _validate_align(align: str) -> None:
+    if align not in ALIGN_MODES:
+        raise HTTPException(status_code=400, detail=f"align は {', '.join(ALIGN_MODES)} のいずれかを指定してください")
+
+
+def _events_signature() -> int:
+    try:
+        return os.stat(csv_events_service.events_file).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def snapshot_response(place: str, analysis_date: datetime, if_none_match: Optional[str] = None) -> Optional[Response]:
+    """
+    事前計算されたスナップショットがあれば、そのレスポンスを返す（ない・古い場合はNone）
+
+    ETag はスナップショットとイベント情報のファイルから決まり、
+    If-None-Match が一致する場合は本文なしの 304 を返す。
+    ファイルの読み込みと本文の作成を行うため、計算用のスレッドプールから呼び出す。
+    """
+    date_str = analysis_date.strftime("%Y-%m-%d")
+    snapshot = today_snapshots.load(place, date_str)
+    if snapshot is None:
+        return None
+    signature, data = snapshot
+
+    key = f"{place}:{date_str}:{SNAPSHOT_WEEKS}:{signature[0]}:{signature[1]}:{_events_signature()}"
+    etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = _snapshot_bodies.get(place)
+    if cached is not None and cached[0] == etag:
+        body = cached[1]
+    else:
+        result = dict(data)
+        start_date = analysis_date - timedelta(days=SNAPSHOT_WEEKS * 7)
+        end_date = analysis_date + timedelta(days=7)
+        result["events"] = get_events_for_date_range_extended(start_date, end_date)
+        body = json.dumps(
+            {
+                "success": True,
+                "data": result,
+                "message": f"{place}の混雑度データが取得されました"
+            },
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        _snapshot_bodies[place] = (etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/congestion-data/{place}")
 async def get_place_congestion_data(
     place: str,
     target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)"),
-    weeks_count: Optional[int] = Query(3, description="取得する週数 (デフォルト3週間)")
+    weeks_count: Optional[int] = Query(3, description="取得する週数 (デフォルト3週間)"),
+    align: str = Query("calendar", description=ALIGN_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     指定した場所の混雑度データを取得する
@@ -44,6 +131,9 @@ async def get_place_congestion_data(
     返却データ:
     - recent_week: 直近1週間の混雑度データ
     - historical_comparison: 去年度同時期の混雑度データ
+    
+    基準日のスナップショット（generate_today_data.py で作成）がある場合はそれを返し、
+    ETag / If-None-Match に対応する。
     """
     try:
         # 場所名の検証
@@ -74,8 +164,18 @@ async def get_place_congestion_data(
                     detail="日付形式が正しくありません。YYYY-MM-DD形式で入力してください"
                 )
         
-        # 混雑度データの取得
-        result = get_congestion_data(csv_file_path, analysis_date, weeks_count)
+        _validate_align(align)
+        
+        # 事前計算されたスナップショット（同じ月日で比較）があればそのまま返す
+        if weeks_count == SNAPSHOT_WEEKS and align == "calendar":
+            response = await compute_executor.run(
+                snapshot_response, place, analysis_date or datetime.now(), if_none_match
+            )
+            if response is not None:
+                return response
+        
+        # 混雑度データの取得（計算用のスレッドプールで実行）
+        result = await compute_executor.run(get_congestion_data, csv_file_path, analysis_date, weeks_count, align)
         
         if not result:
             raise HTTPException(
@@ -91,7 +191,7 @@ async def get_place_congestion_data(
         start_date = analysis_date - timedelta(days=weeks_count * 7)
         end_date = analysis_date + timedelta(days=7)
         
-        events = get_events_for_date_range_extended(start_date, end_date)
+        events = await compute_executor.run(get_events_for_date_range_extended, start_date, end_date)
         
         # 結果にイベント情報を追加
         result["events"] = events
@@ -110,16 +210,186 @@ async def get_place_congestion_data(
             detail=f"予期しないエラーが発生しました: {str(e)}"
         )
 
+@router.get("/congestion-data/{place}/stream")
+async def stream_place_congestion_data(
+    place: str,
+    target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)"),
+    weeks_count: int = Query(52, ge=1, le=STREAM_MAX_WEEKS, description="取得する週数 (デフォルト52週間)"),
+    section: str = Query("extended_week", description="extended_week（今年）または historical（去年同期間）"),
+    fields: Optional[str] = Query(None, description="返す項目（カンマ区切り、省略時は全項目）"),
+    format: str = Query("ndjson", description="ndjson または json"),
+    align: str = Query("calendar", description=ALIGN_DESCRIPTION),
+):
+    """
+    指定した場所の長期間の日別混雑度データを月ごとに計算しながら返す
+    
+    - **format=ndjson**: 1行に1日分のJSON
+    - **format=json**: /congestion-data/{place} の extended_week / historical と同じ形の
+      JSONを、daily_data の要素を計算した順に送る
+    - **fields**: 例えば `date,congestion_level` とすると時間別データと天気データは計算しない。
+      `hourly_congestion` を含めて `weather_info` を含めない場合は、時間別データも天気なしになる
+    """
+    if place not in AVAILABLE_PLACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"指定された場所 '{place}' は利用できません。利用可能な場所: {', '.join(AVAILABLE_PLACES)}"
+        )
+    csv_file_path = os.path.join(DATA_DIR, f"{place}.csv")
+    if not os.path.exists(csv_file_path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"場所 '{place}' のデータファイルが見つかりません"
+        )
+    if section not in TREND_DAY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"section は {', '.join(TREND_DAY_FIELDS)} のいずれかを指定してください")
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="format は ndjson または json を指定してください")
+    _validate_align(align)
+    
+    analysis_date = datetime.now()
+    if target_date:
+        try:
+            analysis_date = datetime.strptime(target_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="日付形式が正しくありません。YYYY-MM-DD形式で入力してください"
+            )
+    
+    available_fields = TREND_DAY_FIELDS[section]
+    selected_fields = available_fields
+    if fields:
+        selected_fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+        unknown = [field for field in selected_fields if field not in available_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不明な項目です: {', '.join(unknown)}。指定できる項目: {', '.join(available_fields)}"
+            )
+    include_hourly = "hourly_congestion" in selected_fields
+    include_weather = "weather_info" in selected_fields
+    
+    try:
+        start_date, end_date, reference_date = get_trend_window(analysis_date, weeks_count, section, align)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"表示期間を計算できません: {e}")
+    
+    def encode(data) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    
+    async def generate_days():
+        """月ごとに計算し、計算できた日から順に返す"""
+        for year, month in months_between(start_date, end_date):
+            days = await compute_executor.run(
+                get_trend_days_for_month, csv_file_path, analysis_date, weeks_count, year, month,
+                section, include_hourly, include_weather, align,
+            )
+            for day in days:
+                yield {field: day[field] for field in selected_fields}
+    
+    async def ndjson_body():
+        try:
+            async for day in generate_days():
+                yield encode(day) + "\n"
+        except Exception as e:
+            # ヘッダー送信後のため、エラーは最後の行で知らせる
+            print(f"混雑度データのストリーミング中にエラーが発生しました ({place}): {e}")
+            yield encode({"error": f"データ取得中にエラーが発生しました: {e}"}) + "\n"
+    
+    async def json_body():
+        header = {
+            "period": section,
+            "reference_date": reference_date.strftime("%Y-%m-%d"),
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+            "weeks_count": weeks_count,
+            "fields": list(selected_fields),
+        }
+        yield '{"success":true,"data":' + encode(header)[:-1] + ',"daily_data":['
+        error = None
+        first = True
+        try:
+            async for day in generate_days():
+                yield ("" if first else ",") + encode(day)
+                first = False
+        except Exception as e:
+            print(f"混雑度データのストリーミング中にエラーが発生しました ({place}): {e}")
+            error = f"データ取得中にエラーが発生しました: {e}"
+        yield "]" + ("" if error is None else ',"error":' + encode(error)) + "}}"
+    
+    if format == "ndjson":
+        return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
+    return StreamingResponse(json_body(), media_type="application/json")
+
+@router.get("/congestion-data/{place}/yoy")
+async def get_place_year_over_year(
+    place: str,
+    target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)"),
+    weeks_count: int = Query(3, ge=1, le=STREAM_MAX_WEEKS, description="取得する週数 (デフォルト3週間)"),
+    years: int = Query(1, ge=1, le=YOY_MAX_YEARS, description="比較する過去の年数"),
+    align: str = Query("weekday", description="比較日の合わせ方（weekday: 同じISO週・曜日、calendar: 同じ月日）"),
+):
+    """
+    指定した場所の今年と過去 years 年分の同じ期間の日別混雑度を比較する
+    
+    - **align=weekday**（既定）: 同じISO週・同じ曜日どうしを比較する
+    - **align=calendar**: 同じ月日どうしを比較する（2/29 はうるう年でない年の2/28）
+    """
+    if place not in AVAILABLE_PLACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"指定された場所 '{place}' は利用できません。利用可能な場所: {', '.join(AVAILABLE_PLACES)}"
+        )
+    csv_file_path = os.path.join(DATA_DIR, f"{place}.csv")
+    if not os.path.exists(csv_file_path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"場所 '{place}' のデータファイルが見つかりません"
+        )
+    _validate_align(align)
+    
+    analysis_date = None
+    if target_date:
+        try:
+            analysis_date = datetime.strptime(target_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="日付形式が正しくありません。YYYY-MM-DD形式で入力してください"
+            )
+    
+    try:
+        result = await compute_executor.run(
+            get_year_over_year_comparison, csv_file_path, analysis_date, weeks_count, years, align
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"前年比較データの取得中にエラーが発生しました: {str(e)}"
+        )
+    
+    return {
+        "success": True,
+        "data": result,
+        "message": f"{place}の前年比較データが取得されました"
+    }
+
 @router.get("/congestion-data/")
 async def get_all_places_congestion_data(
-    target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)")
+    target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)"),
+    timeout: Optional[float] = Query(None, gt=0, description="1地点あたりのタイムアウト秒数 (省略時は設定値)")
 ):
     """
     全ての場所の混雑度データを取得する
     
     - **target_date**: 基準日（省略時は今日の日付）
+    - **timeout**: 1地点あたりのタイムアウト秒数
     
-    各場所の混雑度データをまとめて返却
+    各場所の混雑度データを並列に取得してまとめて返却する。
+    一部の場所が失敗・タイムアウトした場合も、取得できた場所の結果と
+    場所ごとの処理時間（timings）を返す。
     """
     try:
         # 基準日の解析
@@ -133,26 +403,36 @@ async def get_all_places_congestion_data(
                     detail="日付形式が正しくありません。YYYY-MM-DD形式で入力してください"
                 )
         
-        results = {}
         errors = {}
+        csv_file_paths = {}
         
-        # 各場所のデータを取得
+        # ファイルが存在する場所のみ取得を実行
         for place in AVAILABLE_PLACES:
-            try:
-                csv_file_path = os.path.join(DATA_DIR, f"{place}.csv")
-                
-                # ファイルが存在する場合のみ取得実行
-                if os.path.exists(csv_file_path):
-                    result = get_congestion_data(csv_file_path, analysis_date)
-                    if result:
-                        results[place] = result
-                    else:
-                        errors[place] = "混雑度データが取得できませんでした"
-                else:
-                    errors[place] = "データファイルが見つかりません"
-                    
-            except Exception as e:
-                errors[place] = f"データ取得中にエラーが発生しました: {str(e)}"
+            csv_file_path = os.path.join(DATA_DIR, f"{place}.csv")
+            if os.path.exists(csv_file_path):
+                csv_file_paths[place] = csv_file_path
+            else:
+                errors[place] = "データファイルが見つかりません"
+        
+        # スナップショットがある場所はそれを使う（全ての場所の読み込みと確認を計算用のスレッドプールの1枠で行う）
+        date_str = (analysis_date or datetime.now()).strftime("%Y-%m-%d")
+        snapshots = await compute_executor.run(today_snapshots.load_places, list(csv_file_paths), date_str)
+        snapshot_results = {}
+        for place, snapshot in snapshots.items():
+            snapshot_results[place] = snapshot[1]
+            del csv_file_paths[place]
+        
+        # 残りの場所のデータをプロセスプールで並列に取得（失敗・タイムアウトした場所はエラーに記録）
+        results, place_errors, timings = await place_pool.congestion_for_places(
+            csv_file_paths, analysis_date, timeout=timeout
+        )
+        results.update(snapshot_results)
+        timings.update({place: {"status": "snapshot", "seconds": 0.0} for place in snapshot_results})
+        errors.update(place_errors)
+        # 結果・エラー・処理時間は場所の定義順に並べる
+        results = {place: results[place] for place in AVAILABLE_PLACES if place in results}
+        timings = {place: timings[place] for place in AVAILABLE_PLACES if place in timings}
+        errors = {place: errors[place] for place in AVAILABLE_PLACES if place in errors}
         
         return {
             "success": True,
@@ -161,7 +441,8 @@ async def get_all_places_congestion_data(
                 "results": results,
                 "errors": errors if errors else None,
                 "analyzed_places": len(results),
-                "total_places": len(AVAILABLE_PLACES)
+                "total_places": len(AVAILABLE_PLACES),
+                "timings": timings
             },
             "message": f"{len(results)}箇所の混雑度データが取得されました"
         }
@@ -178,7 +459,8 @@ async def get_all_places_congestion_data(
 async def get_place_congestion_summary(
     place: str,
     target_date: Optional[str] = Query(None, description="基準日 (YYYY-MM-DD形式、省略時は今日)"),
-    weeks_count: Optional[int] = Query(3, description="取得する週数 (デフォルト3週間)")
+    weeks_count: Optional[int] = Query(3, description="取得する週数 (デフォルト3週間)"),
+    align: str = Query("calendar", description=ALIGN_DESCRIPTION)
 ):
     """
     指定した場所の混雑度データサマリーを取得する（軽量版）
@@ -217,8 +499,17 @@ async def get_place_congestion_summary(
                     detail="日付形式が正しくありません。YYYY-MM-DD形式で入力してください"
                 )
         
-        # 混雑度データの取得
-        result = get_congestion_data(csv_file_path, analysis_date, weeks_count)
+        # 混雑度データの取得（スナップショットがなければ計算用のスレッドプールで実行）
+        _validate_align(align)
+        snapshot = None
+        if weeks_count == SNAPSHOT_WEEKS and align == "calendar":
+            snapshot = await compute_executor.run(
+                today_snapshots.load, place, (analysis_date or datetime.now()).strftime("%Y-%m-%d")
+            )
+        if snapshot is not None:
+            result = snapshot[1]
+        else:
+            result = await compute_executor.run(get_congestion_data, csv_file_path, analysis_date, weeks_count, align)
         
         if not result:
             raise HTTPException(
@@ -234,7 +525,7 @@ async def get_place_congestion_summary(
         start_date = analysis_date - timedelta(days=weeks_count * 7)
         end_date = analysis_date + timedelta(days=7)
         
-        events = get_events_for_date_range_extended(start_date, end_date)
+        events = await compute_executor.run(get_events_for_date_range_extended, start_date, end_date)
         
         # サマリー情報のみを抽出（時間別の詳細データは除く）
         summary_data = {
@@ -16,6 +16,20 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str
     GOOGLE_SHEETS_ID: Optional[str] = None
     GOOGLE_SHEETS_CREDENTIALS: Optional[str] = None
+    # レスポンスキャッシュの共有先（memory / sqlite / redis）
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_PATH: str = "app/data/cache/response_cache.sqlite3"
+    REDIS_URL: Optional[str] = None
+    # 全地点のトレンド分析の並列数（未指定の場合はCPU数）と1地点あたりのタイムアウト（秒）
+    TREND_POOL_WORKERS: Optional[int] = None
+    TREND_PLACE_TIMEOUT: float = 30.0
+    # 集計処理用のスレッド数（未指定の場合はCPU数）と、それを超えて待たせるリクエスト数の上限
+    COMPUTE_WORKERS: Optional[int] = None
+    COMPUTE_MAX_QUEUE: int = 32
+    # 天気CSVの更新を確認する間隔（秒）。更新されていればバックグラウンドで読み込み直す
+    WEATHER_RELOAD_INTERVAL: float = 60.0
+    # 天気データの月ごとの更新時刻の保存先（未指定の場合は天気CSVの隣の {CSV}.months.json）
+    WEATHER_STAMPS_PATH: Optional[str] = None
     
     class Config:
         env_file = ".env"
@@ -1,3 +1,4 @@
+import argparse
 import json
 import logging
 
@@ -5,12 +6,18 @@ from app.api.endpoints.fetch_csv import run_fetch_csv
 
 
 def main():
+    parser = argparse.ArgumentParser(description="名古屋大学オープンデータのCSVを取り込む")
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="差分取り込みを行わず、全件を取得してCSVと集計キューブを作り直す",
+    )
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
-    result = run_fetch_csv()
+    result = run_fetch_csv(full_refresh=args.full_refresh)
     print(json.dumps(result, ensure_ascii=False))
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -1,16 +1,32 @@
+import argparse
 import json
 import logging
 
-from app.api.endpoints.fetch_csv_exmeidai import run_fetch_all_exmeidai
+from app.api.endpoints.fetch_csv_exmeidai import MAX_IN_FLIGHT, run_fetch_all_exmeidai
 
 
 def main():
+    parser = argparse.ArgumentParser(description="固定カメラ（exmeidai）のデータを取得して集計する")
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=MAX_IN_FLIGHT,
+        help="同時に取得する .dat ファイル数の上限",
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="処理済みの記録を無視して全ての .dat ファイルを取得し、最終ファイルを作り直す",
+    )
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
-    result = run_fetch_all_exmeidai()
+    result = run_fetch_all_exmeidai(
+        max_in_flight=args.max_in_flight,
+        full_rebuild=args.full_rebuild,
+    )
     print(json.dumps(result, ensure_ascii=False))
 
 
 if __name__ == "__main__":
     main()
-
-
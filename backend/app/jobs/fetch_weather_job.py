@@ -0,0 +1,40 @@
+import argparse
+import json
+from datetime import date
+
+from app.services.weather.past_weather import (
+    MAX_WORKERS,
+    REQUESTS_PER_SECOND,
+    run_fetch_weather,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="気象庁の過去の気象データを取得して天気CSVに追加する")
+    parser.add_argument("--start", type=date.fromisoformat, help="取得開始日（YYYY-MM-DD、省略時は終了日の10日前）")
+    parser.add_argument("--end", type=date.fromisoformat, help="取得終了日（YYYY-MM-DD、省略時は昨日）")
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="同時に取得する日数の上限",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=REQUESTS_PER_SECOND,
+        help="気象庁へのリクエスト数の上限（件/秒）",
+    )
+    args = parser.parse_args()
+
+    result = run_fetch_weather(
+        start_date=args.start,
+        end_date=args.end,
+        max_workers=args.max_workers,
+        requests_per_second=args.rate,
+    )
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
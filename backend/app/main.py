@@ -1,6 +1,10 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.services.analyze.place_pool import place_pool
+from app.services.compute_executor import compute_executor
 from app.api.endpoints import (
     csv_analysis,
     events,
@@ -12,7 +16,16 @@ from app.api.endpoints import (
     trend_analysis,
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 全地点のトレンド分析用のワーカープロセスと集計用のスレッドプールを終了する
+    place_pool.shutdown()
+    compute_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
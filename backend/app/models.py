@@ -49,6 +49,34 @@ class EventInfo(BaseModel):
     title: str
 
 
+class YearMonth(BaseModel):
+    year: int
+    month: int
+
+
+class CalendarBatchRequest(BaseModel):
+    place: str
+    action: str = "cal"  # ハイライトに使うカレンダーのアクション（cal_holiday など）
+    # 対象の月は months か、start〜end の範囲のどちらかで指定する
+    months: Optional[List[YearMonth]] = None
+    start: Optional[YearMonth] = None
+    end: Optional[YearMonth] = None
+
+
+class MonthCalendar(BaseModel):
+    year: int
+    month: int
+    data: List[List[Optional[DayCongestion]]]
+    weather_data: Optional[List[WeatherInfo]] = None
+    event_data: Optional[List[EventInfo]] = None
+
+
+class CalendarBatchResponse(BaseModel):
+    place: str
+    action: str
+    calendars: List[MonthCalendar]
+
+
 class GraphResponse(BaseModel):
     graph: str
     data: Any
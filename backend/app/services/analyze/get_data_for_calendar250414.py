@@ -1,36 +1,18 @@
+import numpy as np
 import pandas as pd
 import calendar
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from app.models import DayCongestion, WeatherInfo
-from app.services.analyze.utils.congestion_scale import (
-    TOTAL_CONGESTION_LEVELS,
-    build_congestion_bins,
-)
+from app.services.analyze.rollup_store import PlaceRollup
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.analyze.utils.congestion_thresholds import CALENDAR_THRESHOLDS as CONGESTION_THRESHOLDS
 import os
 import glob
 
-# 各場所の混雑度境界値の定義
-CONGESTION_THRESHOLDS = {
-    # 場所ごとの(min_threshold, max_threshold)を定義
-    'honmachi2': (2300, 9500),
-    'honmachi3': (1500, 8500),
-    'honmachi4': (1000, 10000),
-    'jinnya': (700, 7000),
-    'kokubunjidori': (1600, 5800),
-    'nakabashi': (1600, 7800),
-    'omotesando': (700, 7000),
-    'yasukawadori': (7000, 26000),
-    'yottekan': (300, 3500),
-    'gyouzinbashi': (300, 1400),  # 行神橋の閾値
-    'old-town': (850, 7000),     # 古い町並の閾値
-    'station': (400, 2100),   
-    # デフォルト値
-    'default': (2300, 9500)
-}
-
-def get_data_for_calendar(df: pd.DataFrame, year: int, month: int, place: str = 'default', weather_data: List[dict] = None) -> List[List[Optional[DayCongestion]]]:
+
+def get_data_for_calendar(rollup: PlaceRollup, year: int, month: int, place: str = 'default', weather_data: List[dict] = None) -> List[List[Optional[DayCongestion]]]:
     """
-    DataFrameから歩行者データを取得し、カレンダー形式に整形する。
+    集計キューブから歩行者データを取得し、カレンダー形式に整形する。
     混雑度を20段階で計算する。日曜始まりのカレンダーを作成する。
     
     混雑度計算方法:
@@ -42,68 +24,77 @@ def get_data_for_calendar(df: pd.DataFrame, year: int, month: int, place: str =
     データがない日は混雑度0となり、データが1以上ある日は混雑度1～10となる。
     
     Args:
-        df: 分析対象のDataFrame
+        rollup: 分析対象の場所の集計キューブ
         year: 年
         month: 月
         place: 場所の名前（CSVファイル名から拡張子を除いたもの）
     """
-    # 人のデータのみをフィルタリング
-    df_person = df[df['name'] == 'person']
-    
-    # 日付列をdatetimeに変換（既にdatetime型の場合はスキップ）
-    date_col = 'datetime_jst'
-    if not pd.api.types.is_datetime64_any_dtype(df_person[date_col]):
-        df_person[date_col] = pd.to_datetime(df_person[date_col])
-    
-    # 日付のみの列を追加
-    df_person['date_only'] = df_person[date_col].dt.date
+    calendars = get_data_for_calendars(rollup, [(year, month)], place, {(year, month): weather_data})
+    return calendars[(year, month)]
 
-    # 日ごとの歩行者数を集計（全方向の合計）
-    daily_counts = df_person.groupby('date_only')['count_1_hour'].sum().reset_index()
-    daily_counts['datetime_jst'] = pd.to_datetime(daily_counts['date_only'])
+
+def get_data_for_calendars(
+    rollup: PlaceRollup,
+    months: Iterable[Tuple[int, int]],
+    place: str = 'default',
+    weather_by_month: Optional[Dict[Tuple[int, int], List[dict]]] = None,
+) -> Dict[Tuple[int, int], List[List[Optional[DayCongestion]]]]:
+    """
+    複数の (年, 月) のカレンダーをまとめて作成する
+
+    混雑度の基準（全期間の中間閾値）は月によらず同じため、
+    対象の月に含まれる日の混雑度を1回の配列処理で計算し、月ごとのカレンダーに振り分ける。
+
+    Args:
+        rollup: 分析対象の場所の集計キューブ
+        months: (年, 月) のリスト
+        place: 場所の名前（CSVファイル名から拡張子を除いたもの）
+        weather_by_month: {(年, 月): 日別の天気データ}
+
+    Returns:
+        {(年, 月): カレンダー形式のデータ}（months の順）
+    """
+    months = list(dict.fromkeys((int(year), int(month)) for year, month in months))
+    weather_by_month = weather_by_month or {}
 
     # 場所に応じた混雑度の境界値を取得
     min_threshold, max_threshold = CONGESTION_THRESHOLDS.get(place, CONGESTION_THRESHOLDS['default'])
-    
-    # データの平均値を計算（混雑度5,6の境界値）
-    if not daily_counts.empty:
-        middle_threshold = daily_counts['count_1_hour'].mean()
-    else:
+
+    # データの平均値（混雑度5,6の境界値）は集計時に計算済み
+    middle_threshold = rollup.middles.get('calendar')
+    if middle_threshold is None:
         # データがない場合は、min_thresholdとmax_thresholdの中間値を使用
         middle_threshold = (min_threshold + max_threshold) / 2
-    
-    bins = build_congestion_bins(min_threshold, middle_threshold, max_threshold, TOTAL_CONGESTION_LEVELS)
-
-    # デバッグログを削減（必要時のみ出力）
-    # print(f"場所: {place}")
-    # print(f"混雑度1,2の境界値: {min_threshold}")
-    # print(f"混雑度5,6の境界値 (平均値): {middle_threshold}")
-    # print(f"混雑度9,10の境界値: {max_threshold}")
-    # print(f"計算された境界値: {[int(b) for b in bins[:-1]]}, inf")
-    
-    # データの最大値を確認（ログ出力は削減）
-    max_count = daily_counts['count_1_hour'].max() if not daily_counts.empty else 0
-    # print(f"{place}の最大歩行者数: {max_count}")
 
-    # 定義した境界値に基づいて混雑度レベルを割り当て
-    # データが0の場合は混雑度0、それ以外は1～20
-    daily_counts['level'] = pd.cut(
-        daily_counts['count_1_hour'], 
-        bins=bins, 
-        labels=False, 
-        include_lowest=True,
-        right=False
-    )  # 注：ここでは+1しない。0から始まる混雑度を作成
-
-    # 該当する月のデータをフィルタリング
-    monthly_counts = daily_counts[
-        (daily_counts['datetime_jst'].dt.year == year) &
-        (daily_counts['datetime_jst'].dt.month == month)
-    ]
-
-    # 日付をインデックスに設定
-    monthly_counts.set_index('datetime_jst', inplace=True)
+    scale = get_congestion_scale(place, 'calendar', middle_threshold)
 
+    # 対象の月に含まれる日だけを取り出し、まとめて混雑度レベルを割り当てる
+    # データが0の場合は混雑度0、それ以外は1～20
+    dates = rollup.daily['date']
+    month_keys = dates.dt.year.to_numpy() * 12 + dates.dt.month.to_numpy()
+    selected = np.isin(month_keys, [year * 12 + month for year, month in months])
+    levels = scale.levels(rollup.daily['count'].to_numpy()[selected])
+
+    levels_by_month: Dict[Tuple[int, int], Dict[int, int]] = {key: {} for key in months}
+    selected_dates = dates[selected]
+    for year, month, day, level in zip(
+        selected_dates.dt.year, selected_dates.dt.month, selected_dates.dt.day, levels
+    ):
+        levels_by_month[(year, month)][day] = int(level)
+
+    return {
+        (year, month): _calendar_grid(year, month, levels_by_month[(year, month)], weather_by_month.get((year, month)))
+        for year, month in months
+    }
+
+
+def _calendar_grid(
+    year: int,
+    month: int,
+    level_by_day: Dict[int, int],
+    weather_data: Optional[List[dict]] = None,
+) -> List[List[Optional[DayCongestion]]]:
+    """日別の混雑度から日曜始まりのカレンダーを作成する"""
     first_day_weekday = calendar.weekday(year, month, 1)
     first_day_weekday = (first_day_weekday + 1) % 7
 
@@ -128,16 +119,13 @@ def get_data_for_calendar(df: pd.DataFrame, year: int, month: int, place: str =
         None] * first_day_weekday  # 最初の週の空白を埋める
 
     for day in range(1, days_in_month + 1):
-        date = pd.Timestamp(year=year, month=month, day=day)
-        if date in monthly_counts.index:
-            level = monthly_counts.loc[date, 'level']
-        else:
-            level = 0  # データがない場合は混雑度0
+        # データがない場合は混雑度0
+        level = level_by_day.get(day, 0)
 
         # 天気情報を取得
         weather_info = weather_map.get(day, None)
     
-        day_data = DayCongestion(date=day, congestion=int(level), weather_info=weather_info)
+        day_data = DayCongestion(date=day, congestion=level, weather_info=weather_info)
         week.append(day_data)
 
         if len(week) == 7:
@@ -4,33 +4,14 @@ from typing import List, Dict, Optional, Tuple, Any
 from datetime import datetime, time
 import os
 import glob
-from app.services.analyze.utils.congestion_scale import (
-    TOTAL_CONGESTION_LEVELS,
-    build_congestion_bins,
-)
+from app.services.analyze.rollup_store import PlaceRollup
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.analyze.utils.congestion_thresholds import DATE_TIME_THRESHOLDS as CONGESTION_THRESHOLDS
 
-# 各場所の混雑度境界値の定義
-CONGESTION_THRESHOLDS = {
-    # 場所ごとの(min_threshold, max_threshold)を定義
-    'honmachi2': (65, 850),
-    'honmachi3': (35, 400),
-    'honmachi4': (50, 2000),
-    'jinnya': (50, 1000),
-    'kokubunjidori': (40, 450),
-    'nakabashi': (40, 650),
-    'omotesando': (25, 700),
-    'yasukawadori': (400, 2900),
-    'yottekan': (10, 300),
-    'old-town': (15, 150),        # 旧市街地域の歩行者データ分析に基づく
-    'gyouzinbashi': (25, 900),    # 行神橋のデータから適切な値を算出
-    'station': (25, 200),  
-    # デフォルト値
-    'default': (10, 500)
-}
 
-def get_data_for_date_time(df: pd.DataFrame, year: int, month: int, place: str = 'default', weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+def get_data_for_date_time(rollup: PlaceRollup, year: int, month: int, place: str = 'default', weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     """
-    DataFrameから歩行者データを取得し、時間×日付形式に整形する。
+    集計キューブから歩行者データを取得し、時間×日付形式に整形する。
     混雑度を20段階で計算する。7時から22時までの時間帯のデータを返す。
 
     混雑度計算方法:
@@ -42,7 +23,7 @@ def get_data_for_date_time(df: pd.DataFrame, year: int, month: int, place: str =
     データがない時間帯は混雑度0となり、データが1以上ある時間帯は混雑度1～10となる。
 
     Args:
-        df: 分析対象のDataFrame
+        rollup: 分析対象の場所の集計キューブ
         year: 年
         month: 月
         place: 場所の名前（CSVファイル名から拡張子を除いたもの）
@@ -50,54 +31,34 @@ def get_data_for_date_time(df: pd.DataFrame, year: int, month: int, place: str =
     Returns:
         List[Dict[str, Any]]: [{"date": 日付文字列, "day": 曜日, "hours": [{"hour": 時間, "congestion": 混雑度}, ...]}, ...] の形式で返す
     """
-    # 人のデータのみをフィルタリング
-    df_person = df[df['name'] == 'person']
-
-    # 日付列をdatetimeに変換（既にdatetime型の場合はスキップ）
     date_col = 'datetime_jst'
-    if not pd.api.types.is_datetime64_any_dtype(df_person[date_col]):
-        df_person[date_col] = pd.to_datetime(df_person[date_col])
 
-    # 該当する年月のデータのみにフィルタリング
-    df_month = df_person[
-        (df_person[date_col].dt.year == year) &
-        (df_person[date_col].dt.month == month)
-    ]
+    # 該当する年月の日付×時間の合計を集計キューブから切り出す
+    df_month = rollup.hourly_for_month(year, month)
 
     # 時間帯をフィルタリング（7時から22時まで）
-    df_filtered = df_month[(df_month['time_jst'] >= 7) & (df_month['time_jst'] <= 22)]
-
-    # 日付と時間でグループ化して合計
-    grouped = df_filtered.groupby([df_filtered[date_col].dt.day, 'time_jst'])['count_1_hour'].sum().reset_index()
+    df_filtered = df_month[(df_month['hour'] >= 7) & (df_month['hour'] <= 22)]
+    grouped = pd.DataFrame({
+        date_col: df_filtered['date'].dt.day.values,
+        'time_jst': df_filtered['hour'].values,
+        'count_1_hour': df_filtered['count'].values,
+    })
 
     # 場所に応じた混雑度の境界値を取得
     min_threshold, max_threshold = CONGESTION_THRESHOLDS.get(place, CONGESTION_THRESHOLDS['default'])
 
-    # データの平均値を計算（混雑度5,6の境界値）
-    # 0人の時間帯を除いた平均値を計算
-    if not grouped.empty:
-        # 0人より多い時間帯のデータのみで平均値を計算
-        non_zero_data = grouped[grouped['count_1_hour'] > 0]
-        if not non_zero_data.empty:
-            middle_threshold = non_zero_data['count_1_hour'].mean()
-        else:
-            # 全て0人の場合は、min_thresholdとmax_thresholdの中間値を使用
-            middle_threshold = (min_threshold + max_threshold) / 2
-    else:
-        # データがない場合は、min_thresholdとmax_thresholdの中間値を使用
+    # データの平均値（混雑度5,6の境界値）
+    # 0人の時間帯を除いた月内の平均値は集計時に計算済み
+    middle_threshold = rollup.month_middle(year, month, 'date_time_middle')
+    if middle_threshold is None:
+        # データがない、または全て0人の場合は、min_thresholdとmax_thresholdの中間値を使用
         middle_threshold = (min_threshold + max_threshold) / 2
 
-    bins = build_congestion_bins(min_threshold, middle_threshold, max_threshold, TOTAL_CONGESTION_LEVELS)
+    scale = get_congestion_scale(place, 'date_time', middle_threshold)
 
     # 定義した境界値に基づいて混雑度レベルを割り当て
     # データが0の場合は混雑度0、それ以外は1～10
-    grouped['level'] = pd.cut(
-        grouped['count_1_hour'],
-        bins=bins,
-        labels=False,
-        include_lowest=True,
-        right=False
-    )  # 注：ここでは+1しない。0から始まる混雑度を作成
+    grouped['level'] = scale.levels(grouped['count_1_hour'])  # 注：ここでは+1しない。0から始まる混雑度を作成
 
     # 結果を新しい形式で整理
     result_dict = {}
@@ -1,34 +1,11 @@
-import pandas as pd
 import calendar
 from typing import List, Dict, Any
 import os
 from app.models import HourData, DayWithHours, WeatherInfo
-from app.services.analyze.utils.congestion_scale import (
-    TOTAL_CONGESTION_LEVELS,
-    build_congestion_bins,
-)
+from app.services.analyze.rollup_store import PlaceRollup, rollup_store
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.analyze.utils.congestion_thresholds import WEEK_TIME_THRESHOLDS as CONGESTION_THRESHOLDS
 
-# 各場所の混雑度境界値の定義
-CONGESTION_THRESHOLDS = {
-    # 場所ごとの(min_threshold, max_threshold)を定義
-    'honmachi2': (15, 400),
-    'honmachi3': (10, 250),
-    'honmachi4': (15, 300),
-    'jinnya': (10, 500),
-    'kokubunjidori': (15, 220),
-    'nakabashi': (10, 350),
-    'omotesando': (5, 160),
-    'yasukawadori': (100, 2000),
-    'yottekan': (3, 70),
-    
-    # 新しく追加する3つの場所の閾値
-    'gyouzinbashi': (10, 170),    # 行神橋の閾値
-    'old-town': (5, 1000),        # 古い町並の閾値
-    'station': (10, 180),         # 駅周辺の閾値
-    
-    # デフォルト値
-    'default': (10, 500)
-}
 
 # 曜日名のマッピング
 WEEKDAY_NAMES = {
@@ -41,13 +18,13 @@ WEEKDAY_NAMES = {
     6: {"en": "Sun", "jp": "日"}
 }
 
-def get_data_for_week_time(csv_file_path: str, year: int, month: int, weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[DayWithHours]:
+def get_data_for_week_time(rollup: PlaceRollup, year: int, month: int, weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[DayWithHours]:
     """
-    CSVファイルから特定の年月の歩行者データを取得し、曜日×時間帯形式で整形する。
+    集計キューブから特定の年月の歩行者データを取得し、曜日×時間帯形式で整形する。
     混雑度を20段階で計算する。7時から22時までの時間帯のデータを返す。
 
     Args:
-        csv_file_path: CSVファイルのパス
+        rollup: 分析対象の場所の集計キューブ
         year: 年
         month: 月
 
@@ -55,60 +32,35 @@ def get_data_for_week_time(csv_file_path: str, year: int, month: int, weather_da
         List[DayWithHours]: 曜日ごとの時間帯データを含むモデルオブジェクトのリスト
     """
     try:
-        # CSVファイルを読み込む
-        df = pd.read_csv(csv_file_path)
-        
-        # 日時列をdatetimeに変換
-        date_col = 'datetime_jst'
-        if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
-            df[date_col] = pd.to_datetime(df[date_col])
-        
-        # 該当する年月のデータのみにフィルタリング
-        df_month = df[
-            (df[date_col].dt.year == year) &
-            (df[date_col].dt.month == month) &
-            (df['name'] == 'person')  # 人のデータのみ
-        ]
+        # 該当する年月の日付×時間の合計を集計キューブから切り出す
+        df_month = rollup.hourly_for_month(year, month)
         
         # 時間帯をフィルタリング（7時から22時まで）
-        df_filtered = df_month[(df_month['time_jst'] >= 7) & (df_month['time_jst'] <= 22)].copy()  # コピーを作成して警告を回避
-        
-        # 曜日情報を追加
-        df_filtered['weekday'] = df_filtered[date_col].dt.weekday
+        df_filtered = df_month[(df_month['hour'] >= 7) & (df_month['hour'] <= 22)]
         
-        # 曜日と時間でグループ化して合計
-        grouped = df_filtered.groupby(['weekday', 'time_jst'])['count_1_hour'].mean().reset_index()
+        # 曜日と時間でグループ化して平均（元データの行単位の平均 = 合計 / 行数）
+        sums = df_filtered.groupby(
+            [df_filtered['date'].dt.weekday.rename('weekday'), df_filtered['hour'].rename('time_jst')]
+        )[['count', 'rows']].sum()
+        grouped = (sums['count'] / sums['rows']).rename('count_1_hour').reset_index()
         
-        # 場所の名前を取得（ファイル名から拡張子を除いたもの）
-        place = os.path.splitext(os.path.basename(csv_file_path))[0]
+        # 場所の名前を取得
+        place = rollup.place
         
         # 場所に応じた混雑度の境界値を取得
         min_threshold, max_threshold = CONGESTION_THRESHOLDS.get(place, CONGESTION_THRESHOLDS['default'])
         
-        # データの平均値を計算（混雑度5,6の境界値）
-        # 0人の時間帯を除いた平均値を計算
-        if not grouped.empty:
-            # 0人より多い時間帯のデータのみで平均値を計算
-            non_zero_data = grouped[grouped['count_1_hour'] > 0]
-            if not non_zero_data.empty:
-                middle_threshold = non_zero_data['count_1_hour'].mean()
-            else:
-                # 全て0人の場合は、min_thresholdとmax_thresholdの中間値を使用
-                middle_threshold = (min_threshold + max_threshold) / 2
-        else:
-            # データがない場合は、min_thresholdとmax_thresholdの中間値を使用
+        # データの平均値（混雑度5,6の境界値）
+        # 0人の時間帯を除いた月内の平均値は集計時に計算済み
+        middle_threshold = rollup.month_middle(year, month, 'week_time_middle')
+        if middle_threshold is None:
+            # データがない、または全て0人の場合は、min_thresholdとmax_thresholdの中間値を使用
             middle_threshold = (min_threshold + max_threshold) / 2
         
-        bins = build_congestion_bins(min_threshold, middle_threshold, max_threshold, TOTAL_CONGESTION_LEVELS)
+        scale = get_congestion_scale(place, 'week_time', middle_threshold)
         
         # 定義した境界値に基づいて混雑度レベルを割り当て
-        grouped['level'] = pd.cut(
-            grouped['count_1_hour'],
-            bins=bins,
-            labels=False,
-            include_lowest=True,
-            right=False
-        )
+        grouped['level'] = scale.levels(grouped['count_1_hour'])
         
         # 結果を新しい形式で整理
         result = []
@@ -189,8 +141,7 @@ def get_data_for_week_time(csv_file_path: str, year: int, month: int, weather_da
 
 if __name__ == "__main__":
     # テスト用コード
-    test_file = "/Users/WakaY/Desktop/new_dashbord/backend/app/data/meidai/yasukawadori.csv"
-    result = get_data_for_week_time(test_file, 2024, 4)
+    result = get_data_for_week_time(rollup_store.get("yasukawadori"), 2024, 4)
     print(f"結果データ数: {len(result)}")
     if result:
         print(f"最初の曜日: {result[0].day}")
@@ -4,77 +4,41 @@ from typing import List, Dict, Optional, Tuple, Any
 from datetime import datetime, timedelta
 import os
 import glob
-from app.services.analyze.utils.congestion_scale import (
-    TOTAL_CONGESTION_LEVELS,
-    build_congestion_bins,
-)
-
-# 各場所の混雑度境界値の定義（年単位用）
-CONGESTION_THRESHOLDS_YEAR = {
-    # 場所ごとの(min_threshold, max_threshold)を定義（日単位の365倍程度）
-    'honmachi2': (838500, 3467500),
-    'honmachi3': (547500, 3102500),
-    'honmachi4': (365000, 3650000),
-    'jinnya': (255500, 2555000),
-    'kokubunjidori': (584000, 2117000),
-    'nakabashi': (584000, 2847000),
-    'omotesando': (255500, 2555000),
-    'yasukawadori': (2555000, 9490000),
-    'yottekan': (109500, 1277500),
-    'old-town': (310250, 2555000),
-    'gyouzinbashi': (109500, 511000),
-    'station': (146000, 766500),
-    # デフォルト値
-    'default': (838500, 3467500)
-}
-
-def get_data_for_year(df: pd.DataFrame, place: str = 'default', weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+from app.services.analyze.rollup_store import PlaceRollup
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.analyze.utils.congestion_thresholds import YEAR_THRESHOLDS as CONGESTION_THRESHOLDS_YEAR
+
+
+def get_data_for_year(rollup: PlaceRollup, place: str = 'default', weather_data: Dict[int, List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     """
-    DataFrameから歩行者データを取得し、年単位で混雑度を計算する。
+    集計キューブから歩行者データを取得し、年単位で混雑度を計算する。
     混雑度を20段階で計算する。
     
     Args:
-        df: 分析対象のDataFrame
+        rollup: 分析対象の場所の集計キューブ
         place: 場所の名前（CSVファイル名から拡張子を除いたもの）
         weather_data: 天気データ
 
     Returns:
         List[Dict[str, Any]]: [{"year": 年, "congestion": 混雑度, "total_count": 合計人数}, ...] の形式で返す
     """
-    # 人のデータのみをフィルタリング
-    df_person = df[df['name'] == 'person']
-
-    # 日付列をdatetimeに変換（既にdatetime型の場合はスキップ）
-    date_col = 'datetime_jst'
-    if not pd.api.types.is_datetime64_any_dtype(df_person[date_col]):
-        df_person[date_col] = pd.to_datetime(df_person[date_col])
-
-    if df_person.empty:
+    # 年ごとの歩行者数は集計キューブに保存済み
+    if rollup.yearly.empty:
         return []
-
-    # 年ごとの歩行者数を集計
-    yearly_counts = df_person.groupby(df_person[date_col].dt.year)['count_1_hour'].sum().reset_index()
-    yearly_counts.columns = ['year', 'total_count']
+    yearly_counts = rollup.yearly[['year', 'total_count']].copy()
 
     # 場所に応じた混雑度の境界値を取得
     min_threshold, max_threshold = CONGESTION_THRESHOLDS_YEAR.get(place, CONGESTION_THRESHOLDS_YEAR['default'])
 
-    # データの平均値を計算（混雑度5,6の境界値）
-    if not yearly_counts.empty:
-        middle_threshold = yearly_counts['total_count'].mean()
-    else:
+    # データの平均値（混雑度5,6の境界値）は集計時に計算済み
+    middle_threshold = rollup.middles.get('year')
+    if middle_threshold is None:
         middle_threshold = (min_threshold + max_threshold) / 2
 
-    bins = build_congestion_bins(min_threshold, middle_threshold, max_threshold, TOTAL_CONGESTION_LEVELS)
+    scale = get_congestion_scale(place, 'year', middle_threshold)
 
     # 定義した境界値に基づいて混雑度レベルを割り当て
-    yearly_counts['congestion'] = pd.cut(
-        yearly_counts['total_count'],
-        bins=bins,
-        labels=False,
-        include_lowest=True,
-        right=False
-    )
+    yearly_counts['congestion'] = scale.levels(yearly_counts['total_count'])
 
     # 結果を整形
     result = []
@@ -4,43 +4,14 @@ from datetime import datetime, timedelta
 import os
 from app.services.analyze.get_data_for_date_time250504 import get_data_for_date_time as dti_get
 from app.services.weather.weather_service import weather_service
-from app.services.analyze.utils.congestion_scale import (
-    TOTAL_CONGESTION_LEVELS,
-    calculate_scaled_level,
+from app.services.analyze.pedestrian_store import pedestrian_store, slice_range
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.analyze.utils.congestion_thresholds import (
+    EVENT_HOURLY_THRESHOLDS as HOURLY_CONGESTION_THRESHOLDS,
+    EVENT_THRESHOLDS as CONGESTION_THRESHOLDS,
 )
 
-# 各場所の混雑度境界値の定義
-CONGESTION_THRESHOLDS = {
-    # 場所ごとの(min_threshold, max_threshold)を定義
-    'honmachi2': (65, 850),
-    'honmachi3': (35, 400),
-    'honmachi4': (50, 2000),
-    'jinnya': (50, 1000),
-    'kokubunjidori': (40, 450),
-    'nakabashi': (40, 650),
-    'omotesando': (25, 700),
-    'yasukawadori': (400, 2900),
-    'yottekan': (10, 300),
-    'old-town': (15, 150),        # 旧市街地域の歩行者データ分析に基づく
-    'gyouzinbashi': (25, 900),    # 行神橋のデータから適切な値を算出
-    'station': (25, 200),  
-    # デフォルト値
-    'default': (10, 500)
-}
-
-
-# 時間別の混雑度計算では日次閾値を時間にスケーリングして使用
-def _scale_thresholds(thresholds):
-    min_threshold, max_threshold = thresholds
-    # 24でスケールしつつ、極端な小ささを避ける
-    min_hourly = max(1, int(min_threshold / 24))
-    max_hourly = max(min_hourly + 1, int(max_threshold / 24))
-    return (min_hourly, max_hourly)
-
-HOURLY_CONGESTION_THRESHOLDS = {
-    place: _scale_thresholds(bounds) for place, bounds in CONGESTION_THRESHOLDS.items()
-}
-
 
 def calculate_congestion_level(count: float, place: str = 'default', hourly: bool = False) -> int:
     """
@@ -53,19 +24,8 @@ def calculate_congestion_level(count: float, place: str = 'default', hourly: boo
     Returns:
         int: 1-10の混雑度レベル
     """
-    if pd.isna(count) or count == 0:
-        return 0
-    
-    # 時間別かどうかで閾値マップを切り替える
-    thresholds_map = HOURLY_CONGESTION_THRESHOLDS if hourly else CONGESTION_THRESHOLDS
-    min_threshold, max_threshold = thresholds_map.get(place, thresholds_map['default'])
-    
-    return calculate_scaled_level(
-        count=count,
-        min_threshold=min_threshold,
-        max_threshold=max_threshold,
-        total_levels=TOTAL_CONGESTION_LEVELS,
-    )
+    # 時間別かどうかで閾値（日次閾値を時間にスケーリングしたもの）を切り替える
+    return get_congestion_scale(place, 'event_hourly' if hourly else 'event').level(count)
 
 
 def get_hourly_data_for_date(df: pd.DataFrame, target_date: datetime, place: str = 'default') -> List[Dict[str, Any]]:
@@ -80,39 +40,27 @@ def get_hourly_data_for_date(df: pd.DataFrame, target_date: datetime, place: str
     Returns:
         List[Dict]: 時間別データのリスト
     """
-    # 人のデータのみをフィルタリング
-    df_person = df[df['name'] == 'person'].copy()
+    # 指定日の範囲のみを切り出し、人のデータのみをフィルタリング
+    day_start = pd.Timestamp(target_date.date())
+    df_day = slice_range(df, day_start, day_start + pd.Timedelta(days=1))
+    df_date = df_day[df_day['name'] == 'person'].copy()
     
-    # datetime_jst列をdatetimeに変換
-    if not pd.api.types.is_datetime64_any_dtype(df_person['datetime_jst']):
-        df_person['datetime_jst'] = pd.to_datetime(df_person['datetime_jst'])
+    # 時間別に集計し、7-22時に揃える（データがない時間は0人）
+    hours = range(7, 23)
+    hourly_counts = df_date.groupby(df_date['datetime_jst'].dt.hour)['count_1_hour'].sum()
+    counts = hourly_counts.reindex(hours, fill_value=0).astype('int64').to_numpy()
     
-    # 指定日のデータを抽出
-    target_date_str = target_date.strftime('%Y-%m-%d')
-    df_date = df_person[df_person['datetime_jst'].dt.date == target_date.date()].copy()
+    # 混雑度はまとめて計算（0人の時間は混雑度0）
+    levels = get_congestion_scale(place, 'event_hourly').levels(counts)
     
-    # 時間別に集計
-    df_date['hour'] = df_date['datetime_jst'].dt.hour
-    hourly_counts = df_date.groupby('hour')['count_1_hour'].sum().reset_index()
-    
-    # 7-22時のデータを作成
-    hourly_data = []
-    for hour in range(7, 23):
-        hour_data = hourly_counts[hourly_counts['hour'] == hour]
-        if not hour_data.empty:
-            count = int(hour_data['count_1_hour'].values[0])
-            congestion = calculate_congestion_level(count, place, hourly=True)
-        else:
-            count = 0
-            congestion = 0
-        
-        hourly_data.append({
+    return [
+        {
             'hour': hour,
-            'count': count,
-            'congestion': congestion
-        })
-    
-    return hourly_data
+            'count': int(count),
+            'congestion': int(level)
+        }
+        for hour, count, level in zip(hours, counts, levels)
+    ]
 
 
 def get_event_effect_data(
@@ -136,9 +84,10 @@ def get_event_effect_data(
     try:
         print(f"get_event_effect_data called with: {csv_file_path}, {event_year}/{event_month}/{event_day}")
         
-        # CSVファイルを読み込む
-        df = pd.read_csv(csv_file_path)
+        # 共有ストアからDataFrameを取得
+        df = pedestrian_store.load(csv_file_path)
         place = os.path.splitext(os.path.basename(csv_file_path))[0]
+        rollup = rollup_store.get(place)
         
         print(f"CSV loaded: {len(df)} rows, place: {place}")
         
@@ -155,7 +104,7 @@ def get_event_effect_data(
             try:
                 # DateTimeHeatmapと同様、月次の時間別天気を取得して渡す
                 date_time_weather_data = weather_service.get_weather_for_date_time(y, m)
-                return dti_get(df, y, m, place, date_time_weather_data) or []
+                return dti_get(rollup, y, m, place, date_time_weather_data) or []
             except Exception:
                 return []
 
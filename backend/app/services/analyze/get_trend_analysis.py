@@ -1,20 +1,149 @@
-import pandas as pd
 import calendar
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 import os
 from datetime import datetime, timedelta
+import numpy as np
 from app.models import HourData, DayWithHours, WeatherInfo, DayCongestion
-from app.services.analyze.get_data_for_calendar250414 import get_data_for_calendar
-from app.services.analyze.get_data_for_date_time250504 import get_data_for_date_time
 from app.services.analyze.get_data_for_week_time250522 import get_data_for_week_time
-from app.services.weather.weather_service import weather_service
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.trend_engine import ALIGN_MODES, TrendEngine, months_between, previous_year_date, trend_months
 
 def get_simple_weekday_label(date: datetime) -> str:
     """シンプルな曜日ラベルを返す"""
     weekday_names = ['月', '火', '水', '木', '金', '土', '日']
     return f"{weekday_names[date.weekday()]}曜日"
 
-def get_extended_week_congestion(csv_file_path: str, target_date: datetime, weeks_count: int = 3) -> Dict[str, Any]:
+def build_hourly_congestion(
+    engine: TrendEngine,
+    date: datetime,
+    hourly_data: Dict[int, Dict[str, Any]],
+    include_weather: bool = True,
+) -> List[Dict[str, Any]]:
+    """7-22時の完全な時間データを作成（データがない時間は0で埋める）"""
+    weather_by_hour = engine.day_weather(date)[1] if include_weather else {}
+    complete_hourly_data = []
+    for hour in range(7, 23):
+        hour_data = hourly_data.get(hour)
+        
+        # その時間の天気データを取得
+        if include_weather:
+            hour_weather = weather_by_hour.get(hour)
+            weather_info = {
+                'weather': hour_weather['weather'] if hour_weather and hour_weather['weather'] else '-',
+                'temperature': hour_weather['temperature'] if hour_weather and hour_weather['temperature'] is not None else None,
+                'humidity': '-'  # 湿度データがない場合
+            }
+        
+        if not hour_data:
+            hour_data = {
+                'hour': hour,
+                'congestion': 0,
+                'count': 0,
+            }
+        if include_weather:
+            hour_data['weather_info'] = weather_info
+        else:
+            hour_data.pop('weather_info', None)
+        complete_hourly_data.append(hour_data)
+    return complete_hourly_data
+
+def summarize_day_weather(engine: TrendEngine, date: datetime) -> Optional[Dict[str, Any]]:
+    """その日の天気情報をサマリー化（代表的な天気と平均気温）"""
+    daily_weather_data, _ = engine.day_weather(date)
+    if not daily_weather_data:
+        return None
+    
+    # 最も頻繁な天気を取得
+    weather_list = [w['weather'] for w in daily_weather_data if w['weather'] and w['weather'] != '-']
+    most_common_weather = max(set(weather_list), key=weather_list.count) if weather_list else '-'
+    
+    # 平均気温を計算
+    temps = [w['temperature'] for w in daily_weather_data if w['temperature'] is not None]
+    avg_temp = sum(temps) / len(temps) if temps else None
+    
+    return {
+        'weather': most_common_weather,
+        'avg_temperature': round(avg_temp, 1) if avg_temp is not None else None,
+        'total_rain': None  # 必要に応じて計算
+    }
+
+def iter_extended_week_days(
+    engine: TrendEngine,
+    start_date: datetime,
+    end_date: datetime,
+    target_date: datetime,
+    include_hourly: bool = True,
+    include_weather: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    今年の表示期間の日別データを1日ずつ返す
+    
+    include_hourly / include_weather が False の場合は時間別データ・天気データを作成しない
+    （該当するキーも含めない）。
+    """
+    current_date = start_date
+    while current_date <= end_date:
+        # 未来の日付（明日以降）はデータなしとして処理
+        is_future = current_date > target_date
+        day_congestion = 0 if is_future else engine.day_level(current_date)
+        
+        # 基準日からの相対日数を計算
+        days_from_today = (current_date - target_date).days
+        
+        day = {
+            'date': current_date.strftime('%Y-%m-%d'),
+            'day_of_week': current_date.strftime('%a'),
+            'congestion_level': day_congestion,
+        }
+        if include_hourly:
+            # その日の時間別データを取得（未来の場合は空）
+            hourly_data = {} if is_future else engine.hours(current_date)
+            day['hourly_congestion'] = build_hourly_congestion(engine, current_date, hourly_data, include_weather)
+        day.update({
+            'is_weekend': current_date.weekday() >= 5,
+            'days_from_today': days_from_today,
+            'week_of_month_label': get_simple_weekday_label(current_date),
+            # 今日、明日、明後日のラベルを設定
+            'date_label': get_relative_date_label(days_from_today),
+            'is_today': current_date.date() == target_date.date(),
+            'is_future': is_future,
+        })
+        if include_weather:
+            day['weather_info'] = summarize_day_weather(engine, current_date)
+        yield day
+        
+        current_date += timedelta(days=1)
+
+def iter_historical_days(
+    engine: TrendEngine,
+    start_date: datetime,
+    end_date: datetime,
+    reference_date: datetime,
+    include_hourly: bool = True,
+    include_weather: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """去年同期間の日別データを1日ずつ返す（引数は iter_extended_week_days と同じ）"""
+    current_date = start_date
+    while current_date <= end_date:
+        day = {
+            'date': current_date.strftime('%Y-%m-%d'),
+            'day_of_week': current_date.strftime('%a'),
+            'congestion_level': engine.day_level(current_date),
+        }
+        if include_hourly:
+            day['hourly_congestion'] = build_hourly_congestion(engine, current_date, engine.hours(current_date), include_weather)
+        day.update({
+            'is_weekend': current_date.weekday() >= 5,
+            'days_from_reference': (current_date - reference_date).days,
+            'week_of_month_label': get_simple_weekday_label(current_date),
+        })
+        if include_weather:
+            day['weather_info'] = summarize_day_weather(engine, current_date)
+        yield day
+        
+        current_date += timedelta(days=1)
+
+def get_extended_week_congestion(csv_file_path: str, target_date: datetime, weeks_count: int = 3, engine: Optional[TrendEngine] = None) -> Dict[str, Any]:
     """
     指定日から過去数週間の混雑度データを取得（拡張版）
     今日を含む過去のデータのみ取得し、未来のデータは除外
@@ -23,14 +152,12 @@ def get_extended_week_congestion(csv_file_path: str, target_date: datetime, week
         csv_file_path: CSVファイルのパス
         target_date: 基準日（今日）
         weeks_count: 取得する週数（デフォルト3週間）
+        engine: 混雑度を計算済みのエンジン（省略時はこの期間の分だけ計算する）
         
     Returns:
         Dict[str, Any]: 拡張された週間混雑度データ
     """
     try:
-        df = pd.read_csv(csv_file_path)
-        place = os.path.splitext(os.path.basename(csv_file_path))[0]
-        
         # 過去の週数分の範囲を計算（今日を含む過去のデータのみ）
         total_days = weeks_count * 7
         start_date = target_date - timedelta(days=total_days - 1)
@@ -40,141 +167,11 @@ def get_extended_week_congestion(csv_file_path: str, target_date: datetime, week
         
         print(f"拡張週間データ取得: {start_date.strftime('%Y-%m-%d')} から {end_date.strftime('%Y-%m-%d')} まで")
         
-        # 期間中の天気データを取得（月ごとにキャッシュ）
-        weather_data = {}
-        weather_cache = {}
-        
-        for date in pd.date_range(start_date, end_date):
-            year = date.year
-            month = date.month
-            day = date.day
-            month_key = f"{year}-{month:02d}"
-            
-            # 月ごとの天気データをキャッシュから取得
-            if month_key not in weather_cache:
-                weather_cache[month_key] = weather_service.get_weather_for_date_time(year, month)
-            
-            monthly_weather = weather_cache[month_key]
-            if day in monthly_weather:
-                weather_data[date.strftime('%Y-%m-%d')] = monthly_weather[day]
-
-        
-        # 期間中の全ての月のデータを事前に取得してキャッシュ
-        calendar_cache = {}
-        date_time_cache = {}
+        # 混雑度はエンジンがまとめて計算した結果から切り出す
+        if engine is None:
+            engine = TrendEngine(csv_file_path, months_between(start_date, end_date))
         
-        for date in pd.date_range(start_date, end_date):
-            year = date.year
-            month = date.month
-            month_key = f"{year}-{month:02d}"
-            
-            if month_key not in calendar_cache:
-                calendar_cache[month_key] = get_data_for_calendar(df, year, month, place)
-                date_time_cache[month_key] = get_data_for_date_time(df, year, month, place)
-        
-        daily_data = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            year = current_date.year
-            month = current_date.month
-            day = current_date.day
-            month_key = f"{year}-{month:02d}"
-            
-            # 未来の日付（明日以降）はデータなしとして処理
-            is_future = current_date > target_date
-            day_congestion = 0
-            
-            if not is_future and month_key in calendar_cache:
-                # キャッシュからカレンダーデータを取得
-                calendar_data = calendar_cache[month_key]
-                
-                # カレンダーデータから該当日の混雑度を抽出
-                for week in calendar_data:
-                    for day_data in week:
-                        if day_data and day_data.date == day:
-                            day_congestion = day_data.congestion
-                            break
-            
-            # その日の時間別データを取得（未来の場合は空）
-            hourly_data = []
-            if not is_future and month_key in date_time_cache:
-                date_time_data = date_time_cache[month_key]
-                
-                # 該当日の時間別データを抽出
-                for day_info in date_time_data:
-                    if day_info['date'] == current_date.strftime('%Y-%m-%d'):
-                        hourly_data = day_info['hours']
-                        break
-            
-            # その日の天気データを取得
-            date_str = current_date.strftime('%Y-%m-%d')
-            daily_weather_data = weather_data.get(date_str, [])
-            
-            # 7-22時の完全な時間データを作成
-            complete_hourly_data = []
-            for hour in range(7, 23):
-                hour_data = next((h for h in hourly_data if h['hour'] == hour), None)
-                
-                # その時間の天気データを取得
-                hour_weather = next((w for w in daily_weather_data if w['hour'] == hour), None)
-                weather_info = {
-                    'weather': hour_weather['weather'] if hour_weather and hour_weather['weather'] else '-',
-                    'temperature': hour_weather['temperature'] if hour_weather and hour_weather['temperature'] is not None else None,
-                    'humidity': '-'  # 湿度データがない場合
-                }
-                
-                if hour_data:
-                    hour_data['weather_info'] = weather_info
-                    complete_hourly_data.append(hour_data)
-                else:
-                    complete_hourly_data.append({
-                        'hour': hour,
-                        'congestion': 0,
-                        'count': 0,
-                        'weather_info': weather_info
-                    })
-            
-            # 基準日からの相対日数を計算
-            days_from_today = (current_date - target_date).days
-            
-            # 今日、明日、明後日のラベルを設定
-            date_label = get_relative_date_label(days_from_today)
-            
-            # その日の天気情報をサマリー化（代表的な天気と平均気温）
-            day_weather_info = None
-            if daily_weather_data:
-                # 最も頻繁な天気を取得
-                weather_list = [w['weather'] for w in daily_weather_data if w['weather'] and w['weather'] != '-']
-                most_common_weather = max(set(weather_list), key=weather_list.count) if weather_list else '-'
-                
-                # 平均気温を計算
-                temps = [w['temperature'] for w in daily_weather_data if w['temperature'] is not None]
-                avg_temp = sum(temps) / len(temps) if temps else None
-                
-                day_weather_info = {
-                    'weather': most_common_weather,
-                    'avg_temperature': round(avg_temp, 1) if avg_temp is not None else None,
-                    'total_rain': None  # 必要に応じて計算
-                }
-            
-            daily_data.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'day_of_week': current_date.strftime('%a'),
-                'congestion_level': day_congestion,
-                'hourly_congestion': complete_hourly_data,
-                'is_weekend': current_date.weekday() >= 5,
-                'days_from_today': days_from_today,
-                'week_of_month_label': get_simple_weekday_label(current_date),
-                'date_label': date_label,
-                'is_today': current_date.date() == target_date.date(),
-                'is_future': is_future,
-                'weather_info': day_weather_info
-            })
-            
-
-            
-            current_date += timedelta(days=1)
+        daily_data = list(iter_extended_week_days(engine, start_date, end_date, target_date))
         
         print(f"拡張週間データ: {len(daily_data)}日分のデータを取得しました")
         
@@ -192,7 +189,77 @@ def get_extended_week_congestion(csv_file_path: str, target_date: datetime, week
         print(f"拡張週間混雑度データ取得中にエラーが発生しました: {e}")
         return {}
 
-def get_historical_congestion(csv_file_path: str, target_date: datetime, weeks_count: int = 3) -> Dict[str, Any]:
+# 長期間のトレンド（ストリーミング）で返せるセクションと、日別データの項目
+TREND_DAY_FIELDS = {
+    'extended_week': (
+        'date', 'day_of_week', 'congestion_level', 'hourly_congestion', 'is_weekend',
+        'days_from_today', 'week_of_month_label', 'date_label', 'is_today', 'is_future', 'weather_info',
+    ),
+    'historical': (
+        'date', 'day_of_week', 'congestion_level', 'hourly_congestion', 'is_weekend',
+        'days_from_reference', 'week_of_month_label', 'weather_info',
+    ),
+}
+
+def get_trend_window(
+    target_date: datetime,
+    weeks_count: int,
+    section: str = 'extended_week',
+    align: str = 'calendar',
+) -> Tuple[datetime, datetime, datetime]:
+    """
+    セクションの表示期間 (開始日, 終了日, 基準日) を返す
+    
+    今年（extended_week）は基準日までの weeks_count 週と1週間先まで、
+    去年（historical）は去年の比較日（align の合わせ方）を基準に同じ長さの期間。
+    """
+    if section not in TREND_DAY_FIELDS:
+        raise ValueError(f"unknown section: {section}")
+    reference_date = target_date if section == 'extended_week' else previous_year_date(target_date, 1, align)
+    start_date = reference_date - timedelta(days=weeks_count * 7 - 1)
+    end_date = reference_date + timedelta(days=7)
+    return start_date, end_date, reference_date
+
+def get_trend_days_for_month(
+    csv_file_path: str,
+    target_date: datetime,
+    weeks_count: int,
+    year: int,
+    month: int,
+    section: str = 'extended_week',
+    include_hourly: bool = True,
+    include_weather: bool = True,
+    align: str = 'calendar',
+) -> List[Dict[str, Any]]:
+    """
+    セクションの表示期間のうち、指定した月の日別データを返す
+    
+    長期間のトレンドを月ごとに計算して順に返すために使う。内容は
+    get_extended_week_congestion / get_historical_congestion の daily_data と同じ。
+    """
+    start_date, end_date, reference_date = get_trend_window(target_date, weeks_count, section, align)
+    month_start = datetime(year, month, 1).date()
+    month_end = (datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)).date() - timedelta(days=1)
+    # 基準日と同じ時刻のまま月の範囲に切り詰める（相対日数の計算を変えないため）
+    first_day = start_date + timedelta(days=max(0, (month_start - start_date.date()).days))
+    last_day = end_date - timedelta(days=max(0, (end_date.date() - month_end).days))
+    if first_day > last_day:
+        return []
+    
+    engine = TrendEngine(csv_file_path, [(year, month)])
+    if section == 'extended_week':
+        days = iter_extended_week_days(engine, first_day, last_day, reference_date, include_hourly, include_weather)
+    else:
+        days = iter_historical_days(engine, first_day, last_day, reference_date, include_hourly, include_weather)
+    return list(days)
+
+def get_historical_congestion(
+    csv_file_path: str,
+    target_date: datetime,
+    weeks_count: int = 3,
+    engine: Optional[TrendEngine] = None,
+    align: str = 'calendar',
+) -> Dict[str, Any]:
     """
     去年度の同じ時期の混雑度データを取得（拡張版）
     今年と同じ期間（過去3週間 + 未来1週間）のデータを取得
@@ -201,16 +268,18 @@ def get_historical_congestion(csv_file_path: str, target_date: datetime, weeks_c
         csv_file_path: CSVファイルのパス
         target_date: 基準日
         weeks_count: 取得する週数
+        engine: 混雑度を計算済みのエンジン（省略時はこの期間の分だけ計算する）
+        align: 去年の比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）
         
     Returns:
         Dict[str, Any]: 去年度の混雑度データ
     """
     try:
-        df = pd.read_csv(csv_file_path)
         place = os.path.splitext(os.path.basename(csv_file_path))[0]
+        rollup = rollup_store.get(place)
         
-        # 去年度の同じ日付を計算
-        last_year_date = target_date.replace(year=target_date.year - 1)
+        # 去年度の比較日を計算
+        last_year_date = previous_year_date(target_date, 1, align)
         
         # 今年と同じ期間を取得（過去3週間 + 未来1週間）
         total_days = weeks_count * 7
@@ -220,130 +289,15 @@ def get_historical_congestion(csv_file_path: str, target_date: datetime, weeks_c
         
         print(f"去年同期間データ取得: {start_date.strftime('%Y-%m-%d')} から {end_date.strftime('%Y-%m-%d')} まで")
         
-        # 期間中の天気データを取得（去年、月ごとにキャッシュ）
-        weather_data = {}
-        weather_cache = {}
+        # 混雑度はエンジンがまとめて計算した結果から切り出す
+        if engine is None:
+            engine = TrendEngine(csv_file_path, months_between(start_date, end_date))
         
-        for date in pd.date_range(start_date, end_date):
-            year = date.year
-            month = date.month
-            day = date.day
-            month_key = f"{year}-{month:02d}"
-            
-            # 月ごとの天気データをキャッシュから取得
-            if month_key not in weather_cache:
-                weather_cache[month_key] = weather_service.get_weather_for_date_time(year, month)
-            
-            monthly_weather = weather_cache[month_key]
-            if day in monthly_weather:
-                weather_data[date.strftime('%Y-%m-%d')] = monthly_weather[day]
-        
-        # 期間中の全ての月のデータを事前に取得してキャッシュ
-        calendar_cache = {}
-        date_time_cache = {}
-        
-        for date in pd.date_range(start_date, end_date):
-            year = date.year
-            month = date.month
-            month_key = f"{year}-{month:02d}"
-            
-            if month_key not in calendar_cache:
-                calendar_cache[month_key] = get_data_for_calendar(df, year, month, place)
-                date_time_cache[month_key] = get_data_for_date_time(df, year, month, place)
-        
-        daily_data = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            year = current_date.year
-            month = current_date.month
-            day = current_date.day
-            month_key = f"{year}-{month:02d}"
-            
-            # キャッシュからカレンダーデータを取得
-            day_congestion = 0
-            if month_key in calendar_cache:
-                calendar_data = calendar_cache[month_key]
-                
-                # カレンダーデータから該当日の混雑度を抽出
-                for week in calendar_data:
-                    for day_data in week:
-                        if day_data and day_data.date == day:
-                            day_congestion = day_data.congestion
-                            break
-            
-            # キャッシュから時間別データを取得
-            hourly_data = []
-            if month_key in date_time_cache:
-                date_time_data = date_time_cache[month_key]
-                
-                # 該当日の時間別データを抽出
-                for day_info in date_time_data:
-                    if day_info['date'] == current_date.strftime('%Y-%m-%d'):
-                        hourly_data = day_info['hours']
-                        break
-            
-            # その日の天気データを取得
-            date_str = current_date.strftime('%Y-%m-%d')
-            daily_weather_data = weather_data.get(date_str, [])
-            
-            # 7-22時の完全な時間データを作成
-            complete_hourly_data = []
-            for hour in range(7, 23):
-                hour_data = next((h for h in hourly_data if h['hour'] == hour), None)
-                
-                # その時間の天気データを取得
-                hour_weather = next((w for w in daily_weather_data if w['hour'] == hour), None)
-                weather_info = {
-                    'weather': hour_weather['weather'] if hour_weather and hour_weather['weather'] else '-',
-                    'temperature': hour_weather['temperature'] if hour_weather and hour_weather['temperature'] is not None else None,
-                    'humidity': '-'  # 湿度データがない場合
-                }
-                
-                if hour_data:
-                    hour_data['weather_info'] = weather_info
-                    complete_hourly_data.append(hour_data)
-                else:
-                    complete_hourly_data.append({
-                        'hour': hour,
-                        'congestion': 0,
-                        'count': 0,
-                        'weather_info': weather_info
-                    })
-            
-            # その日の天気情報をサマリー化（代表的な天気と平均気温）
-            day_weather_info = None
-            if daily_weather_data:
-                # 最も頻繁な天気を取得
-                weather_list = [w['weather'] for w in daily_weather_data if w['weather'] and w['weather'] != '-']
-                most_common_weather = max(set(weather_list), key=weather_list.count) if weather_list else '-'
-                
-                # 平均気温を計算
-                temps = [w['temperature'] for w in daily_weather_data if w['temperature'] is not None]
-                avg_temp = sum(temps) / len(temps) if temps else None
-                
-                day_weather_info = {
-                    'weather': most_common_weather,
-                    'avg_temperature': round(avg_temp, 1) if avg_temp is not None else None,
-                    'total_rain': None  # 必要に応じて計算
-                }
-            
-            daily_data.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'day_of_week': current_date.strftime('%a'),
-                'congestion_level': day_congestion,
-                'hourly_congestion': complete_hourly_data,
-                'is_weekend': current_date.weekday() >= 5,
-                'days_from_reference': (current_date - last_year_date).days,
-                'week_of_month_label': get_simple_weekday_label(current_date),
-                'weather_info': day_weather_info
-            })
-            
-            current_date += timedelta(days=1)
+        daily_data = list(iter_historical_days(engine, start_date, end_date, last_year_date))
         
         # 曜日別の混雑度パターンも取得
         try:
-            weekday_pattern = get_data_for_week_time(csv_file_path, last_year_date.year, last_year_date.month)
+            weekday_pattern = get_data_for_week_time(rollup, last_year_date.year, last_year_date.month)
         except:
             weekday_pattern = []
         
@@ -375,7 +329,7 @@ def get_historical_congestion(csv_file_path: str, target_date: datetime, weeks_c
         print(f"去年度混雑度データ取得中にエラーが発生しました: {e}")
         return {
             'period': 'historical',
-            'reference_date': target_date.replace(year=target_date.year - 1).strftime('%Y-%m-%d'),
+            'reference_date': previous_year_date(target_date, 1, align).strftime('%Y-%m-%d'),
             'data_available': False,
             'message': f'去年度のデータが見つかりません: {e}'
         }
@@ -405,59 +359,43 @@ def get_relative_date_label(days_from_today: int) -> str:
     else:
         return ""
 
-def get_yesterday_hourly(csv_file_path: str, target_date: datetime) -> Dict[str, Any]:
+def get_yesterday_hourly(csv_file_path: str, target_date: datetime, engine: Optional[TrendEngine] = None) -> Dict[str, Any]:
     """
     昨日の時間別詳細データを取得（拡張版）
     
     Args:
         csv_file_path: CSVファイルのパス
         target_date: 基準日（今日）
+        engine: 混雑度を計算済みのエンジン（省略時はこの期間の分だけ計算する）
         
     Returns:
         Dict[str, Any]: 昨日の時間別データ
     """
     try:
-        df = pd.read_csv(csv_file_path)
-        place = os.path.splitext(os.path.basename(csv_file_path))[0]
-        
         # 昨日の日付を計算
         yesterday_date = target_date - timedelta(days=1)
         year = yesterday_date.year
         month = yesterday_date.month
-        day = yesterday_date.day
         
-        # その日のカレンダーデータを取得（日別混雑度）
-        calendar_data = get_data_for_calendar(df, year, month, place)
-        day_congestion = 0
+        if engine is None:
+            engine = TrendEngine(csv_file_path, [(year, month)])
         
-        # カレンダーデータから該当日の混雑度を抽出
-        for week in calendar_data:
-            for day_data in week:
-                if day_data and day_data.date == day:
-                    day_congestion = day_data.congestion
-                    break
+        # その日の日別混雑度
+        day_congestion = engine.day_level(yesterday_date)
         
-        # 天気データを取得
-        weather_data = weather_service.get_weather_for_date_time(year, month)
-        daily_weather_data = weather_data.get(day, [])
+        # 天気データを取得（時間ごとの索引付き）
+        daily_weather_data, weather_by_hour = engine.day_weather(yesterday_date)
         
         # その日の時間別データを取得
-        date_time_data = get_data_for_date_time(df, year, month, place)
-        hourly_data = []
-        
-        # 該当日の時間別データを抽出
-        for day_info in date_time_data:
-            if day_info['date'] == yesterday_date.strftime('%Y-%m-%d'):
-                hourly_data = day_info['hours']
-                break
+        hourly_data = engine.hours(yesterday_date)
         
         # 7-22時の完全な時間データを作成
         complete_hourly_data = []
         for hour in range(7, 23):  # 7時から22時まで
-            hour_data = next((h for h in hourly_data if h['hour'] == hour), None)
+            hour_data = hourly_data.get(hour)
             
             # その時間の天気データを取得
-            hour_weather = next((w for w in daily_weather_data if w['hour'] == hour), None)
+            hour_weather = weather_by_hour.get(hour)
             weather_info = {
                 'weather': hour_weather['weather'] if hour_weather and hour_weather['weather'] else '-',
                 'temperature': hour_weather['temperature'] if hour_weather and hour_weather['temperature'] is not None else None,
@@ -494,7 +432,7 @@ def get_yesterday_hourly(csv_file_path: str, target_date: datetime) -> Dict[str,
             'message': f'昨日の時間別データ取得中にエラーが発生しました: {e}'
         }
 
-def get_congestion_data(csv_file_path: str, target_date: datetime = None, weeks_count: int = 3) -> Dict[str, Any]:
+def get_congestion_data(csv_file_path: str, target_date: datetime = None, weeks_count: int = 3, align: str = 'calendar') -> Dict[str, Any]:
     """
     既存の分析ファイルを使用して混雑度データを取得（拡張版）
     
@@ -502,6 +440,7 @@ def get_congestion_data(csv_file_path: str, target_date: datetime = None, weeks_
         csv_file_path: CSVファイルのパス
         target_date: 基準日（デフォルトは今日）
         weeks_count: 取得する週数（デフォルト3週間）
+        align: 去年の比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）
         
     Returns:
         Dict[str, Any]: 混雑度データ
@@ -513,17 +452,20 @@ def get_congestion_data(csv_file_path: str, target_date: datetime = None, weeks_
     
     print(f"混雑度データ取得開始: {place}, 基準日: {target_date.strftime('%Y-%m-%d')}, 週数: {weeks_count}")
     
+    # 全セクションで必要な月の混雑度を1回で計算し、各セクションはそこから切り出す
+    engine = TrendEngine(csv_file_path, trend_months(target_date, weeks_count, align))
+    
     # 拡張された週間混雑度データ
-    extended_congestion = get_extended_week_congestion(csv_file_path, target_date, weeks_count)
+    extended_congestion = get_extended_week_congestion(csv_file_path, target_date, weeks_count, engine)
     
     # 去年度の同時期の混 congestionデータ
-    historical_congestion = get_historical_congestion(csv_file_path, target_date, weeks_count)
+    historical_congestion = get_historical_congestion(csv_file_path, target_date, weeks_count, engine, align)
     
     # 昨日の時間別データ
-    yesterday_hourly = get_yesterday_hourly(csv_file_path, target_date)
+    yesterday_hourly = get_yesterday_hourly(csv_file_path, target_date, engine)
     
     # 去年の同じ日付の時間別データ
-    last_year_hourly = get_last_year_today_hourly(csv_file_path, target_date)
+    last_year_hourly = get_last_year_today_hourly(csv_file_path, target_date, engine, align)
     
     return {
         'place': place,
@@ -535,59 +477,49 @@ def get_congestion_data(csv_file_path: str, target_date: datetime = None, weeks_
         'last_year_today_hourly': last_year_hourly
     }
 
-def get_last_year_today_hourly(csv_file_path: str, target_date: datetime) -> Dict[str, Any]:
+def get_last_year_today_hourly(
+    csv_file_path: str,
+    target_date: datetime,
+    engine: Optional[TrendEngine] = None,
+    align: str = 'calendar',
+) -> Dict[str, Any]:
     """
     去年の今日の時間別詳細データを取得（拡張版）
     
     Args:
         csv_file_path: CSVファイルのパス
         target_date: 基準日（今日）
+        engine: 混雑度を計算済みのエンジン（省略時はこの期間の分だけ計算する）
+        align: 去年の比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）
         
     Returns:
         Dict[str, Any]: 去年の今日の時間別データ
     """
     try:
-        df = pd.read_csv(csv_file_path)
-        place = os.path.splitext(os.path.basename(csv_file_path))[0]
-        
-        # 去年の同じ日付を計算
-        last_year_date = target_date.replace(year=target_date.year - 1)
+        # 去年の比較日を計算
+        last_year_date = previous_year_date(target_date, 1, align)
         year = last_year_date.year
         month = last_year_date.month
-        day = last_year_date.day
         
-        # その日のカレンダーデータを取得（日別混雑度）
-        calendar_data = get_data_for_calendar(df, year, month, place)
-        day_congestion = 0
+        if engine is None:
+            engine = TrendEngine(csv_file_path, [(year, month)])
         
-        # カレンダーデータから該当日の混雑度を抽出
-        for week in calendar_data:
-            for day_data in week:
-                if day_data and day_data.date == day:
-                    day_congestion = day_data.congestion
-                    break
+        # その日の日別混雑度
+        day_congestion = engine.day_level(last_year_date)
         
-        # 天気データを取得
-        weather_data = weather_service.get_weather_for_date_time(year, month)
-        daily_weather_data = weather_data.get(day, [])
+        # 天気データを取得（時間ごとの索引付き）
+        daily_weather_data, weather_by_hour = engine.day_weather(last_year_date)
         
         # その日の時間別データを取得
-        date_time_data = get_data_for_date_time(df, year, month, place)
-        hourly_data = []
-        
-        # 該当日の時間別データを抽出
-        for day_info in date_time_data:
-            if day_info['date'] == last_year_date.strftime('%Y-%m-%d'):
-                hourly_data = day_info['hours']
-                break
+        hourly_data = engine.hours(last_year_date)
         
         # 7-22時の完全な時間データを作成
         complete_hourly_data = []
         for hour in range(7, 23):  # 7時から22時まで
-            hour_data = next((h for h in hourly_data if h['hour'] == hour), None)
+            hour_data = hourly_data.get(hour)
             
             # その時間の天気データを取得
-            hour_weather = next((w for w in daily_weather_data if w['hour'] == hour), None)
+            hour_weather = weather_by_hour.get(hour)
             weather_info = {
                 'weather': hour_weather['weather'] if hour_weather and hour_weather['weather'] else '-',
                 'temperature': hour_weather['temperature'] if hour_weather and hour_weather['temperature'] is not None else None,
@@ -619,12 +551,12 @@ def get_last_year_today_hourly(csv_file_path: str, target_date: datetime) -> Dic
     except Exception as e:
         print(f"去年の時間別データ取得中にエラーが発生しました: {e}")
         return {
-            'date': target_date.replace(year=target_date.year - 1).strftime('%Y-%m-%d'),
+            'date': previous_year_date(target_date, 1, align).strftime('%Y-%m-%d'),
             'data_available': False,
             'message': f'去年の時間別データ取得中にエラーが発生しました: {e}'
         }
 
-def get_congestion_summary(csv_file_path: str, target_date: datetime = None, weeks_count: int = 3) -> Dict[str, Any]:
+def get_congestion_summary(csv_file_path: str, target_date: datetime = None, weeks_count: int = 3, align: str = 'calendar') -> Dict[str, Any]:
     """
     混雑度データのサマリー版を取得（軽量版）
     
@@ -632,6 +564,7 @@ def get_congestion_summary(csv_file_path: str, target_date: datetime = None, wee
         csv_file_path: CSVファイルのパス
         target_date: 基準日（デフォルトは今日）
         weeks_count: 取得する週数（デフォルト3週間）
+        align: 去年の比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）
         
     Returns:
         Dict[str, Any]: サマリー混雑度データ
@@ -644,8 +577,9 @@ def get_congestion_summary(csv_file_path: str, target_date: datetime = None, wee
     print(f"サマリーデータ取得開始: {place}, 基準日: {target_date.strftime('%Y-%m-%d')}, 週数: {weeks_count}")
     
     # 基本的なデータ取得
-    extended_data = get_extended_week_congestion(csv_file_path, target_date, weeks_count)
-    historical_data = get_historical_congestion(csv_file_path, target_date, weeks_count)
+    engine = TrendEngine(csv_file_path, trend_months(target_date, weeks_count, align))
+    extended_data = get_extended_week_congestion(csv_file_path, target_date, weeks_count, engine)
+    historical_data = get_historical_congestion(csv_file_path, target_date, weeks_count, engine, align)
     
     # 最近の週間サマリーを作成
     recent_week_summary = []
@@ -686,7 +620,7 @@ def get_congestion_summary(csv_file_path: str, target_date: datetime = None, wee
     last_year_today_summary = None
     
     try:
-        yesterday_data = get_yesterday_hourly(csv_file_path, target_date)
+        yesterday_data = get_yesterday_hourly(csv_file_path, target_date, engine)
         if yesterday_data.get('data_available'):
             yesterday_summary = {
                 'date': yesterday_data['date'],
@@ -699,7 +633,7 @@ def get_congestion_summary(csv_file_path: str, target_date: datetime = None, wee
         yesterday_summary = {'data_available': False}
     
     try:
-        last_year_data = get_last_year_today_hourly(csv_file_path, target_date)
+        last_year_data = get_last_year_today_hourly(csv_file_path, target_date, engine, align)
         if last_year_data.get('data_available'):
             last_year_today_summary = {
                 'date': last_year_data['date'],
@@ -730,6 +664,101 @@ def get_congestion_summary(csv_file_path: str, target_date: datetime = None, wee
         'last_year_today_hourly_summary': last_year_today_summary
     }
 
+def get_year_over_year_comparison(
+    csv_file_path: str,
+    target_date: datetime = None,
+    weeks_count: int = 3,
+    years: int = 1,
+    align: str = 'weekday',
+) -> Dict[str, Any]:
+    """
+    今年と過去 years 年分の同じ期間の日別混雑度をまとめて比較する
+    
+    過去の各年の期間は比較日（align の合わせ方）を基準に今年と同じ長さを取る。
+    weekday（既定）は同じISO週・曜日に合わせるため、平日と休日がずれない。
+    全ての年の日付を (年, 期間内の日) の配列にして、集計キューブから1回で引く。
+    
+    Args:
+        csv_file_path: CSVファイルのパス
+        target_date: 基準日（デフォルトは今日）
+        weeks_count: 取得する週数（デフォルト3週間）
+        years: 比較する過去の年数
+        align: 比較日の合わせ方（calendar: 同じ月日、weekday: 同じISO週・曜日）
+        
+    Returns:
+        Dict[str, Any]: 年ごとの日別混雑度・人数と、今年との比較
+    """
+    if align not in ALIGN_MODES:
+        raise ValueError(f"unknown align: {align}")
+    if target_date is None:
+        target_date = datetime.now()
+    
+    place = os.path.splitext(os.path.basename(csv_file_path))[0]
+    
+    # 期間内の日の基準日からの相対日数（今年は未来の日を含む）
+    offsets = np.arange(-(weeks_count * 7 - 1), 8)
+    reference_dates = [target_date] + [previous_year_date(target_date, n, align) for n in range(1, years + 1)]
+    
+    months = []
+    for reference_date in reference_dates:
+        months += months_between(reference_date + timedelta(days=int(offsets[0])), reference_date + timedelta(days=int(offsets[-1])))
+    engine = TrendEngine(csv_file_path, months)
+    
+    # (年, 日) の序数の配列から混雑度と人数をまとめて引く
+    ordinals = np.array([reference_date.toordinal() for reference_date in reference_dates])[:, None] + offsets[None, :]
+    levels, counts, found = engine.day_series(ordinals)
+    
+    # 今年の未来の日はデータなしとして扱う
+    is_future = np.zeros(ordinals.shape, dtype=bool)
+    is_future[0] = offsets > 0
+    levels = np.where(is_future, 0, levels)
+    counts = np.where(is_future, 0, counts)
+    found &= ~is_future
+    
+    # 比較は今年のデータがある日（基準日以前）に限る
+    compared = offsets <= 0
+    totals = np.where(found[:, compared], counts[:, compared], 0).sum(axis=1)
+    days_with_data = found[:, compared].sum(axis=1)
+    level_sums = np.where(found[:, compared], levels[:, compared], 0).sum(axis=1)
+    
+    periods = []
+    for i, reference_date in enumerate(reference_dates):
+        average_level = level_sums[i] / days_with_data[i] if days_with_data[i] else None
+        period = {
+            'years_back': i,
+            'reference_date': reference_date.strftime('%Y-%m-%d'),
+            'start_date': (reference_date + timedelta(days=int(offsets[0]))).strftime('%Y-%m-%d'),
+            'end_date': (reference_date + timedelta(days=int(offsets[-1]))).strftime('%Y-%m-%d'),
+            'data_available': bool(days_with_data[i]),
+            'days_with_data': int(days_with_data[i]),
+            'total_count': int(totals[i]),
+            'average_congestion': round(float(average_level), 2) if average_level is not None else None,
+            'daily_data': [
+                {
+                    'date': (reference_date + timedelta(days=int(offset))).strftime('%Y-%m-%d'),
+                    'day_of_week': (reference_date + timedelta(days=int(offset))).strftime('%a'),
+                    'days_from_reference': int(offset),
+                    'congestion_level': int(levels[i, j]),
+                    'count': int(counts[i, j]),
+                    'data_available': bool(found[i, j]),
+                }
+                for j, offset in enumerate(offsets)
+            ],
+        }
+        if i > 0:
+            # 今年の人数の増減率（%）
+            period['count_change_rate'] = round((int(totals[0]) - int(totals[i])) / int(totals[i]) * 100, 1) if totals[i] else None
+        periods.append(period)
+    
+    return {
+        'place': place,
+        'analysis_date': target_date.strftime('%Y-%m-%d'),
+        'weeks_count': weeks_count,
+        'years': years,
+        'align': align,
+        'periods': periods,
+    }
+
 if __name__ == "__main__":
     # テスト用コード
     test_file = "/Users/WakaY/Desktop/new_dashbord/backend/app/data/meidai/yasukawadori.csv"
@@ -0,0 +1,321 @@
+"""場所ごとの歩行者CSVをプロセス内で共有する列指向ストア"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.utils.files import file_lock, file_signature, write_json_atomic
+
+# 歩行者データのディレクトリ
+DATA_DIR = os.path.join("app", "data", "meidai")
+
+# CSVと同じ内容を列ごとの .npy 配列で保存するディレクトリ（起動直後の読み込みを速くする）
+BINARY_DIR = os.path.join("app", "data", "meidai_bin")
+BINARY_VERSION = 1
+
+# 列名と保存時の型（name / countingDirection はカテゴリのコードで保存する）
+_BINARY_COLUMNS = {
+    'datetime_jst': 'datetime64[ns]',
+    'time_jst': 'int16',
+    'name': 'int16',
+    'countingDirection': 'int16',
+    'count_1_hour': 'int32',
+}
+_CATEGORY_COLUMNS = ['name', 'countingDirection']
+
+# 分析で使用する列のみ読み込む
+_USE_COLUMNS = ['datetime_jst', 'time_jst', 'name', 'countingDirection', 'count_1_hour']
+
+
+def place_from_path(csv_file_path: str) -> str:
+    """CSVファイルのパスから場所名（拡張子を除いたファイル名）を取り出す"""
+    return os.path.splitext(os.path.basename(csv_file_path))[0]
+
+
+def slice_range(df: pd.DataFrame, start, end) -> pd.DataFrame:
+    """datetime_jst昇順のDataFrameから start以上end未満 の行を二分探索で切り出す"""
+    values = df['datetime_jst'].values
+    lo = values.searchsorted(pd.Timestamp(start).to_datetime64(), side='left')
+    hi = values.searchsorted(pd.Timestamp(end).to_datetime64(), side='left')
+    return df.iloc[lo:hi]
+
+
+def read_pedestrian_csv(csv_file_path: str) -> pd.DataFrame:
+    """
+    歩行者CSVを型付きの列指向DataFrameとして読み込む
+
+    - datetime_jst: datetime64（昇順ソート済み）
+    - time_jst: int16
+    - name / countingDirection: category
+    - count_1_hour: int32（数値化できない値は0）
+    """
+    df = pd.read_csv(
+        csv_file_path,
+        usecols=lambda column: column in _USE_COLUMNS,
+        dtype={'name': 'category', 'countingDirection': 'category'},
+    )
+
+    df['datetime_jst'] = pd.to_datetime(df['datetime_jst'])
+    if 'time_jst' in df.columns:
+        df['time_jst'] = pd.to_numeric(df['time_jst'], errors='coerce').fillna(0).astype('int16')
+    else:
+        df['time_jst'] = df['datetime_jst'].dt.hour.astype('int16')
+    if 'countingDirection' not in df.columns:
+        df['countingDirection'] = pd.Categorical(['SumOfBothDirection'] * len(df))
+    df['count_1_hour'] = pd.to_numeric(df['count_1_hour'], errors='coerce').fillna(0).astype('int32')
+
+    # 日時で並べておくことで期間指定の切り出しを二分探索で行える
+    if not df['datetime_jst'].is_monotonic_increasing:
+        df = df.sort_values('datetime_jst', kind='mergesort')
+    return df.reset_index(drop=True)[_USE_COLUMNS]
+
+
+def write_binary_twin(binary_dir: str, place: str, df: pd.DataFrame, source_signature) -> None:
+    """
+    歩行者データを列ごとの .npy 配列として保存する
+
+    配列は一時ディレクトリに書き出してから集計元CSVの (mtime, size) ごとのディレクトリに移し、
+    最後に meta.json をそのディレクトリに向けて置き換える。
+    読み込み中のプロセスが途中の状態を参照することはない。
+    同じ場所を複数のプロセスが同時に書き出した場合も、一時ディレクトリは別々に作り、
+    書き出し済みのディレクトリは置き換えない。
+    """
+    place_dir = os.path.join(binary_dir, place)
+    bundle = f"data-{source_signature[0]}-{source_signature[1]}"
+    bundle_dir = os.path.join(place_dir, bundle)
+    os.makedirs(place_dir, exist_ok=True)
+
+    categories = {}
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-data-", dir=place_dir)
+    try:
+        for column, dtype in _BINARY_COLUMNS.items():
+            if column in _CATEGORY_COLUMNS:
+                values = df[column].astype('category')
+                categories[column] = [str(value) for value in values.cat.categories]
+                array = values.cat.codes.to_numpy(dtype)
+            else:
+                array = df[column].to_numpy(dtype)
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), array)
+
+        meta = {
+            'place': place,
+            'version': BINARY_VERSION,
+            'source_signature': list(source_signature),
+            'bundle': bundle,
+            'rows': len(df),
+            'categories': categories,
+        }
+        # 配列の移動・meta.json の置き換え・古い配列の削除は他のプロセスと排他して行う
+        with file_lock(os.path.join(place_dir, ".lock")):
+            if os.path.isdir(bundle_dir):
+                # 他のプロセスが同じCSVから書き出し済み（同じ内容のため置き換えない）
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.rename(tmp_dir, bundle_dir)
+            write_json_atomic(os.path.join(place_dir, "meta.json"), meta)
+
+            # 書き出し済みの古い配列を削除（読み込み中のプロセスはファイルを開いたまま参照できる）
+            for name in os.listdir(place_dir):
+                if name.startswith("data-") and name != bundle:
+                    shutil.rmtree(os.path.join(place_dir, name), ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_binary_twin(binary_dir: str, place: str, source_signature, start=None, end=None) -> Optional[pd.DataFrame]:
+    """
+    .npy 配列から歩行者データを読み込む（集計元CSVと一致しない場合はNone）
+
+    配列はメモリマップで開き、start / end を指定した場合は
+    日時の配列を二分探索してその期間の行だけを読み込む。
+    """
+    place_dir = os.path.join(binary_dir, place)
+    try:
+        with open(os.path.join(place_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != BINARY_VERSION or meta.get('source_signature') != list(source_signature):
+            return None
+        bundle_dir = os.path.join(place_dir, meta['bundle'])
+        arrays = {
+            column: np.load(os.path.join(bundle_dir, f"{column}.npy"), mmap_mode='r')
+            for column in _BINARY_COLUMNS
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(array) != meta['rows'] for array in arrays.values()):
+        return None
+
+    lo, hi = 0, meta['rows']
+    datetimes = arrays['datetime_jst']
+    if start is not None:
+        lo = datetimes.searchsorted(pd.Timestamp(start).to_datetime64().astype('datetime64[ns]'), side='left')
+    if end is not None:
+        hi = datetimes.searchsorted(pd.Timestamp(end).to_datetime64().astype('datetime64[ns]'), side='left')
+
+    data = {}
+    for column in _BINARY_COLUMNS:
+        values = np.array(arrays[column][lo:hi])
+        if column in _CATEGORY_COLUMNS:
+            values = pd.Categorical.from_codes(values, meta['categories'][column])
+        data[column] = values
+    return pd.DataFrame(data, columns=_USE_COLUMNS)
+
+
+class PedestrianStore:
+    """
+    場所ごとの歩行者データを一度だけ読み込んで共有するストア
+
+    ファイルの mtime/size を毎回確認し、取得ジョブによって
+    CSVが書き換えられた場合のみ再読み込みする。
+    CSVと一致する .npy 配列（バイナリ版）があればそちらを優先して読み込み、
+    CSVを読み込んだ場合はバイナリ版を書き出しておく。
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, binary_dir: str = BINARY_DIR):
+        self.data_dir = data_dir
+        self.binary_dir = binary_dir
+        self._frames: Dict[str, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+        self._place_locks: Dict[str, threading.Lock] = {}
+
+    def path_for(self, place: str) -> str:
+        """場所名に対応するCSVファイルのパスを返す"""
+        return os.path.join(self.data_dir, f"{place}.csv")
+
+    def exists(self, place: str) -> bool:
+        return os.path.exists(self.path_for(place))
+
+    def _binary_place(self, csv_file_path: str) -> Optional[str]:
+        """データディレクトリ内のCSVであれば、バイナリ版の場所名を返す"""
+        if os.path.abspath(os.path.dirname(csv_file_path)) != os.path.abspath(self.data_dir):
+            return None
+        return place_from_path(csv_file_path)
+
+    def _write_binary(self, place: Optional[str], df: pd.DataFrame, signature) -> None:
+        if place is None or signature is None:
+            return
+        try:
+            write_binary_twin(self.binary_dir, place, df, signature)
+        except OSError as e:
+            print(f"PedestrianStore: failed to write binary data for {place}: {e}")
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._place_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._place_locks[key] = lock
+            return lock
+
+    def load(self, csv_file_path: str) -> pd.DataFrame:
+        """
+        CSVファイルのパスを指定してDataFrameを取得する
+
+        返却するDataFrameは共有されるため、呼び出し側で直接変更しないこと。
+        """
+        signature = file_signature(csv_file_path)
+        if signature is None:
+            raise FileNotFoundError(csv_file_path)
+
+        cached = self._frames.get(csv_file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        # 同じファイルの同時読み込みは1回にまとめる
+        with self._lock_for(csv_file_path):
+            signature = file_signature(csv_file_path)
+            if signature is None:
+                raise FileNotFoundError(csv_file_path)
+            cached = self._frames.get(csv_file_path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            place = self._binary_place(csv_file_path)
+            df = read_binary_twin(self.binary_dir, place, signature) if place else None
+            source = "binary"
+            if df is None:
+                df = read_pedestrian_csv(csv_file_path)
+                source = "csv"
+                self._write_binary(place, df, signature)
+            self._frames[csv_file_path] = (signature, df)
+            print(f"PedestrianStore: loaded {place_from_path(csv_file_path)} from {source} ({len(df)} rows)")
+            return df
+
+    def get(self, place: str) -> pd.DataFrame:
+        """場所名を指定してDataFrameを取得する"""
+        return self.load(self.path_for(place))
+
+    def get_range(self, place: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """
+        start以上end未満の期間の行のみを取得する
+
+        全体を読み込んでいない場合は、バイナリ版からその期間の行だけを読み込む。
+        """
+        csv_file_path = self.path_for(place)
+        signature = file_signature(csv_file_path)
+        cached = self._frames.get(csv_file_path)
+        if signature is not None and (cached is None or cached[0] != signature):
+            df = read_binary_twin(self.binary_dir, place, signature, start, end)
+            if df is not None:
+                return df
+        return slice_range(self.get(place), start, end)
+
+    def get_month(self, place: str, year: int, month: int) -> pd.DataFrame:
+        """指定した年月の行のみを取得する"""
+        start = pd.Timestamp(year=year, month=month, day=1)
+        return self.get_range(place, start, start + pd.offsets.MonthBegin(1))
+
+    def apply_rows(self, place: str, rows: pd.DataFrame, previous_signature, replace_dates: bool = False) -> None:
+        """
+        取り込みジョブでCSVに反映した行を、読み込み済みのデータとバイナリ版にも反映する
+
+        追記前のCSVと一致するデータがない場合は、CSVを読み込み直してバイナリ版を作成する。
+        replace_dates=True の場合、rows に含まれる日の既存の行は置き換える。
+        """
+        csv_file_path = self.path_for(place)
+        with self._lock_for(csv_file_path):
+            cached = self._frames.get(csv_file_path)
+            if cached is not None and previous_signature is not None and cached[0] == previous_signature:
+                base = cached[1]
+            elif previous_signature is not None:
+                base = read_binary_twin(self.binary_dir, place, previous_signature)
+            else:
+                base = None
+
+        if base is None:
+            self.load(csv_file_path)
+            return
+
+        if replace_dates:
+            dates = rows['datetime_jst'].dt.normalize().unique()
+            base = base[~base['datetime_jst'].dt.normalize().isin(dates)]
+        df = pd.concat([base, rows[_USE_COLUMNS]], ignore_index=True)
+        for column in _CATEGORY_COLUMNS:
+            df[column] = df[column].astype('category')
+        if not df['datetime_jst'].is_monotonic_increasing:
+            df = df.sort_values('datetime_jst', kind='mergesort').reset_index(drop=True)
+
+        with self._lock_for(csv_file_path):
+            signature = file_signature(csv_file_path)
+            self._frames[csv_file_path] = (signature, df)
+            self._write_binary(place, df, signature)
+        print(f"PedestrianStore: applied {len(rows)} rows to {place} ({len(df)} rows)")
+
+    def invalidate(self, place: Optional[str] = None) -> None:
+        """キャッシュを破棄する（place未指定時は全て）"""
+        with self._lock:
+            if place is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(self.path_for(place), None)
+
+
+# アプリケーション全体で共有するストア
+pedestrian_store = PedestrianStore()
@@ -0,0 +1,136 @@
+"""
+複数の場所のトレンド分析をプロセスプールで並列に実行する
+
+トレンド分析は pandas による CPU 処理が中心のため、スレッドではなくプロセスに分散する。
+場所ごとにタイムアウトを設け、一部の場所が失敗・タイムアウトしても他の場所の結果は返す。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.analyze.get_trend_analysis import get_congestion_data
+
+
+def _congestion_for_place(csv_file_path: str, analysis_date: Optional[datetime], weeks_count: int) -> Tuple[Dict[str, Any], float]:
+    """ワーカープロセスで1つの場所のトレンド分析を行い、(結果, 計算時間) を返す"""
+    start = time.perf_counter()
+    result = get_congestion_data(csv_file_path, analysis_date, weeks_count)
+    return result, time.perf_counter() - start
+
+
+class PlacePool:
+    """
+    場所ごとのトレンド分析を並列に実行するプロセスプール
+
+    プールは最初の利用時に作成し、ワーカーが異常終了した場合は作り直す。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 12)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_place(
+        self,
+        executor: ProcessPoolExecutor,
+        csv_file_path: str,
+        analysis_date: Optional[datetime],
+        weeks_count: int,
+        timeout: Optional[float],
+    ) -> Tuple[str, Any, Dict[str, Any]]:
+        """1つの場所を実行し、(状態, 結果またはエラー, 計測値) を返す"""
+        start = time.perf_counter()
+        future = executor.submit(_congestion_for_place, csv_file_path, analysis_date, weeks_count)
+        try:
+            result, compute_seconds = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # 開始前であれば取り消す（実行中の処理は止められないため結果は捨てる）
+            future.cancel()
+            return "timeout", f"{timeout}秒以内に完了しませんでした", {
+                'status': 'timeout',
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+        except BrokenProcessPool as e:
+            self._reset_executor(executor)
+            return "error", f"ワーカープロセスが異常終了しました: {e}", {
+                'status': 'error',
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+        except Exception as e:
+            return "error", f"データ取得中にエラーが発生しました: {str(e)}", {
+                'status': 'error',
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+        return "ok", result, {
+            'status': 'ok',
+            'seconds': round(time.perf_counter() - start, 3),
+            'compute_seconds': round(compute_seconds, 3),
+        }
+
+    async def congestion_for_places(
+        self,
+        csv_file_paths: Dict[str, str],
+        analysis_date: Optional[datetime] = None,
+        weeks_count: int = 3,
+        timeout: Optional[float] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, str], Dict[str, Dict[str, Any]]]:
+        """
+        {場所: CSVファイルのパス} のトレンド分析を並列に実行する
+
+        timeout は場所ごとの待ち時間の上限（空きワーカーを待つ時間を含む）。
+
+        Returns:
+            (成功した場所の結果, 失敗した場所のエラー, 場所ごとの処理時間)
+        """
+        if not csv_file_paths:
+            return {}, {}, {}
+        timeout = timeout if timeout is not None else self.timeout
+        executor = self._get_executor()
+        places = list(csv_file_paths)
+        outcomes = await asyncio.gather(*[
+            self._run_place(executor, csv_file_paths[place], analysis_date, weeks_count, timeout)
+            for place in places
+        ])
+
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        for place, (status, value, timing) in zip(places, outcomes):
+            timings[place] = timing
+            if status == "ok" and value:
+                results[place] = value
+            elif status == "ok":
+                timing['status'] = 'error'
+                errors[place] = "混雑度データが取得できませんでした"
+            else:
+                errors[place] = value
+        return results, errors, timings
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+place_pool = PlacePool(max_workers=settings.TREND_POOL_WORKERS, timeout=settings.TREND_PLACE_TIMEOUT)
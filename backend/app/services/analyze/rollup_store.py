@@ -0,0 +1,681 @@
+"""
+場所ごとの集計キューブ（時間・日・ISO週・月・年）を取り込み時に作成・保存するストア
+
+各ビューは生データ全期間を毎回集計する代わりに、ここで作成した
+数百〜数万行の集計済みテーブルを参照する。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.analyze.pedestrian_store import pedestrian_store
+from app.services.utils.files import atomic_write, file_lock, file_signature, write_json_atomic
+
+# 集計キューブの形式が変わったら更新する（古い形式は自動で再作成される）
+ROLLUP_VERSION = 2
+
+ROLLUP_DIR = os.path.join("app", "data", "rollups")
+
+# 時間帯ビューで使用する時間帯（7時〜22時）
+CORE_START_HOUR = 7
+CORE_END_HOUR = 22
+
+_TABLES = ('hourly', 'daily', 'weekly', 'monthly', 'yearly')
+_DATE_COLUMNS = {
+    'hourly': ['date'],
+    'daily': ['date'],
+    'weekly': ['start_date', 'end_date'],
+    'monthly': [],
+    'yearly': [],
+}
+
+
+def _updated_at(built_at: float, month_updates: Dict[str, float], year: Optional[int], month: Optional[int]) -> float:
+    if year is None or month is None:
+        return max([built_at, *month_updates.values()])
+    return max(built_at, month_updates.get(f"{year}-{month:02d}", 0.0))
+
+
+class RollupStamps:
+    """
+    集計キューブの更新時刻（キャッシュの有効性の確認用）
+
+    保存済みのメタ情報から作成できるため、キューブ本体の読み込みや作り直しを伴わない。
+    """
+
+    def __init__(self, built_at: float, month_updates: Dict[str, float]):
+        self.built_at = built_at
+        self.month_updates = month_updates
+
+    def updated_at(self, year: Optional[int] = None, month: Optional[int] = None) -> float:
+        """PlaceRollup.updated_at と同じ"""
+        return _updated_at(self.built_at, self.month_updates, year, month)
+
+
+class PlaceRollup:
+    """
+    1つの場所の集計キューブ
+
+    - hourly: date, hour, count（人数合計）, rows（元データの行数）
+    - daily: date, count（全時間帯）, core_count / core_rows（7〜22時）
+    - weekly: iso_year, iso_week, total_count, start_date, end_date, days_with_data（7〜22時）
+    - monthly: year, month, total_count, days_with_data（7〜22時）,
+      date_time_middle / week_time_middle（その月の時間帯ビューの中間閾値）
+    - yearly: year, total_count（全時間帯）
+    - middles: calendar / week / month / year の全期間の中間閾値
+    - middle_stats: 差分取り込みで中間閾値を更新するための累計（calendar: [日別人数の合計, 日数]）
+
+    built_at は全体を作成した時刻、month_updates は差分取り込みで
+    更新された月（"YYYY-MM"）ごとの更新時刻（いずれもUNIX時間）。
+    """
+
+    def __init__(
+        self,
+        place: str,
+        tables: Dict[str, pd.DataFrame],
+        middles: Dict[str, Optional[float]],
+        source_signature: Optional[list] = None,
+        version: int = ROLLUP_VERSION,
+        built_at: Optional[float] = None,
+        month_updates: Optional[Dict[str, float]] = None,
+        middle_stats: Optional[Dict[str, list]] = None,
+    ):
+        self.place = place
+        self.hourly = tables['hourly']
+        self.daily = tables['daily']
+        self.weekly = tables['weekly']
+        self.monthly = tables['monthly']
+        self.yearly = tables['yearly']
+        self.middles = middles
+        self.source_signature = list(source_signature) if source_signature else None
+        self.version = version
+        self.built_at = built_at if built_at is not None else time.time()
+        self.month_updates = dict(month_updates or {})
+        self.middle_stats = dict(middle_stats) if middle_stats else _middle_stats(self.daily)
+        self._month_rows: Optional[Dict[tuple, int]] = None
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        return {name: getattr(self, name) for name in _TABLES}
+
+    def hourly_for_month(self, year: int, month: int) -> pd.DataFrame:
+        """指定年月の時間別キューブを切り出す（dateで昇順）"""
+        start = pd.Timestamp(year=year, month=month, day=1)
+        end = start + pd.offsets.MonthBegin(1)
+        values = self.hourly['date'].values
+        lo = values.searchsorted(start.to_datetime64(), side='left')
+        hi = values.searchsorted(end.to_datetime64(), side='left')
+        return self.hourly.iloc[lo:hi]
+
+    def month_middle(self, year: int, month: int, column: str) -> Optional[float]:
+        """指定年月の中間閾値（date_time_middle / week_time_middle）を返す"""
+        if self._month_rows is None:
+            self._month_rows = {
+                (int(y), int(m)): i
+                for i, (y, m) in enumerate(zip(self.monthly['year'], self.monthly['month']))
+            }
+        i = self._month_rows.get((year, month))
+        if i is None:
+            return None
+        value = self.monthly[column].iloc[i]
+        return None if pd.isna(value) else float(value)
+
+    def updated_at(self, year: Optional[int] = None, month: Optional[int] = None) -> float:
+        """
+        キューブの内容が最後に変わった時刻を返す
+
+        年月を指定した場合はその月のデータが最後に変わった時刻、
+        省略した場合はキューブ全体で最後に変わった時刻。
+        """
+        return _updated_at(self.built_at, self.month_updates, year, month)
+
+    def is_current(self, source_signature) -> bool:
+        """集計元のファイルと形式のバージョンが一致しているか"""
+        return (
+            self.version == ROLLUP_VERSION
+            and source_signature is not None
+            and self.source_signature == list(source_signature)
+        )
+
+
+def _mean_or_none(series: pd.Series) -> Optional[float]:
+    return float(series.mean()) if not series.empty else None
+
+
+def build_hourly_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """歩行者データのDataFrameから 日 × 時間 の集計キューブを作成する"""
+    df_person = df[df['name'] == 'person']
+
+    # 場所 × 日 × 時間 の合計（元データの行数も保持して平均を再現できるようにする）
+    hourly = (
+        df_person.groupby(
+            [df_person['datetime_jst'].dt.normalize().rename('date'),
+             df_person['time_jst'].astype('int16').rename('hour')],
+            sort=True,
+        )['count_1_hour']
+        .agg(count='sum', rows='size')
+        .reset_index()
+    )
+    hourly['count'] = hourly['count'].astype('int64')
+    hourly['rows'] = hourly['rows'].astype('int32')
+    return hourly
+
+
+def build_rollup(place: str, df: pd.DataFrame, source_signature=None) -> PlaceRollup:
+    """歩行者データのDataFrameから集計キューブを作成する"""
+    return rollup_from_hourly(place, build_hourly_cube(df), source_signature)
+
+
+def _middle_stats(daily: pd.DataFrame) -> Dict[str, list]:
+    """中間閾値の累計（calendar: 日別人数の合計と日数）"""
+    return {'calendar': [int(daily['count'].sum()), int(len(daily))]}
+
+
+def _daily_from_hourly(hourly: pd.DataFrame) -> pd.DataFrame:
+    """日別（全時間帯と7〜22時）"""
+    is_core = (hourly['hour'] >= CORE_START_HOUR) & (hourly['hour'] <= CORE_END_HOUR)
+    daily = hourly.groupby('date', sort=True).agg(count=('count', 'sum')).reset_index()
+    core_daily = (
+        hourly[is_core]
+        .groupby('date', sort=True)
+        .agg(core_count=('count', 'sum'), core_rows=('rows', 'sum'))
+    )
+    daily = daily.merge(core_daily, left_on='date', right_index=True, how='left')
+    daily['core_count'] = daily['core_count'].fillna(0).astype('int64')
+    daily['core_rows'] = daily['core_rows'].fillna(0).astype('int64')
+    return daily
+
+
+def _weekly_from_daily(daily: pd.DataFrame) -> pd.DataFrame:
+    """ISO週別（7〜22時のデータがある日のみ）"""
+    core_days = daily[daily['core_rows'] > 0]
+    iso = core_days['date'].dt.isocalendar()
+    weekly = (
+        core_days.groupby([iso['year'].rename('iso_year'), iso['week'].rename('iso_week')])
+        .agg(
+            total_count=('core_count', 'sum'),
+            start_date=('date', 'min'),
+            end_date=('date', 'max'),
+            days_with_data=('date', 'nunique'),
+        )
+        .reset_index()
+    )
+    weekly['iso_year'] = weekly['iso_year'].astype('int64')
+    weekly['iso_week'] = weekly['iso_week'].astype('int64')
+    return weekly
+
+
+def _monthly_from(hourly: pd.DataFrame, daily: pd.DataFrame) -> pd.DataFrame:
+    """月別（7〜22時のデータがある日のみ）と月ごとの時間帯ビューの中間閾値"""
+    core_days = daily[daily['core_rows'] > 0]
+    monthly = (
+        core_days.groupby([core_days['date'].dt.year.rename('year'), core_days['date'].dt.month.rename('month')])
+        .agg(total_count=('core_count', 'sum'), days_with_data=('date', 'nunique'))
+        .reset_index()
+    )
+
+    # 月ごとの時間帯ビューの中間閾値（0人の時間帯を除いた平均）
+    is_core = (hourly['hour'] >= CORE_START_HOUR) & (hourly['hour'] <= CORE_END_HOUR)
+    core_hourly = hourly[is_core].assign(
+        year=lambda x: x['date'].dt.year,
+        month=lambda x: x['date'].dt.month,
+        weekday=lambda x: x['date'].dt.weekday,
+    )
+    date_time_middle = (
+        core_hourly[core_hourly['count'] > 0]
+        .groupby(['year', 'month'])['count']
+        .mean()
+        .rename('date_time_middle')
+    )
+    # 曜日×時間帯の平均は元データの行単位の平均（合計 / 行数）
+    weekday_hour = core_hourly.groupby(['year', 'month', 'weekday', 'hour'])[['count', 'rows']].sum()
+    weekday_hour_mean = weekday_hour['count'] / weekday_hour['rows']
+    week_time_middle = (
+        weekday_hour_mean[weekday_hour_mean > 0]
+        .groupby(level=['year', 'month'])
+        .mean()
+        .rename('week_time_middle')
+    )
+    monthly = (
+        monthly.merge(date_time_middle, left_on=['year', 'month'], right_index=True, how='left')
+        .merge(week_time_middle, left_on=['year', 'month'], right_index=True, how='left')
+    )
+    monthly['year'] = monthly['year'].astype('int64')
+    monthly['month'] = monthly['month'].astype('int64')
+    return monthly
+
+
+def _yearly_from_daily(daily: pd.DataFrame) -> pd.DataFrame:
+    """年別（全時間帯）"""
+    yearly = (
+        daily.groupby(daily['date'].dt.year.rename('year'))
+        .agg(total_count=('count', 'sum'))
+        .reset_index()
+    )
+    yearly['year'] = yearly['year'].astype('int64')
+    return yearly
+
+
+def _middles_from(
+    middle_stats: Dict[str, list],
+    weekly: pd.DataFrame,
+    monthly: pd.DataFrame,
+    yearly: pd.DataFrame,
+) -> Dict[str, Optional[float]]:
+    """全期間の中間閾値（calendar は累計から、その他は週・月・年の集計から）"""
+    total, days = middle_stats['calendar']
+    return {
+        'calendar': total / days if days else None,
+        'week': _mean_or_none(filter_complete_weeks(weekly)['total_count']),
+        'month': _mean_or_none(filter_complete_months(monthly)['total_count']),
+        'year': _mean_or_none(yearly['total_count']),
+    }
+
+
+def rollup_from_hourly(
+    place: str,
+    hourly: pd.DataFrame,
+    source_signature=None,
+    built_at: Optional[float] = None,
+    month_updates: Optional[Dict[str, float]] = None,
+) -> PlaceRollup:
+    """日 × 時間 の集計キューブから日・週・月・年の集計と中間閾値を作成する"""
+    daily = _daily_from_hourly(hourly)
+    weekly = _weekly_from_daily(daily)
+    monthly = _monthly_from(hourly, daily)
+    yearly = _yearly_from_daily(daily)
+    middle_stats = _middle_stats(daily)
+
+    tables = {
+        'hourly': hourly,
+        'daily': daily,
+        'weekly': weekly,
+        'monthly': monthly,
+        'yearly': yearly,
+    }
+    return PlaceRollup(
+        place,
+        tables,
+        _middles_from(middle_stats, weekly, monthly, yearly),
+        source_signature,
+        built_at=built_at,
+        month_updates=month_updates,
+        middle_stats=middle_stats,
+    )
+
+
+def update_rollup(
+    current: PlaceRollup,
+    hourly: pd.DataFrame,
+    first_date: pd.Timestamp,
+    source_signature=None,
+    month_updates: Optional[Dict[str, float]] = None,
+) -> PlaceRollup:
+    """
+    first_date 以降の行だけが変わった時間別キューブから、変わった部分だけ集計し直す
+
+    日別は first_date から、ISO週別はその週の月曜日から、月別はその月の1日から、
+    年別はその年の1月1日から作り直し、それより前の行は current のものをそのまま使う。calendar の中間閾値は
+    日別人数の累計（middle_stats）を差し替えた分だけ更新し、その他の中間閾値は
+    週・月・年の集計（数百行）から計算する。結果は rollup_from_hourly と同じになる。
+    """
+    first_date = pd.Timestamp(first_date).normalize()
+    week_start = first_date - pd.Timedelta(days=first_date.weekday())
+    month_start = first_date.replace(day=1)
+    start = min(week_start, month_start)
+
+    # start 以降の時間別キューブ（日・週・月の境界をまたがないように切り出す）
+    tail = hourly.iloc[hourly['date'].values.searchsorted(start.to_datetime64(), side='left'):]
+    tail_daily = _daily_from_hourly(tail)
+
+    old_daily = current.daily
+    keep = old_daily['date'] < first_date
+    daily = pd.concat([old_daily[keep], tail_daily[tail_daily['date'] >= first_date]], ignore_index=True)
+
+    # 日別人数の累計を差し替え
+    total, days = current.middle_stats['calendar']
+    replaced = old_daily.loc[~keep, 'count']
+    added = tail_daily.loc[tail_daily['date'] >= first_date, 'count']
+    middle_stats = {
+        'calendar': [
+            int(total - replaced.sum() + added.sum()),
+            int(days - len(replaced) + len(added)),
+        ],
+    }
+
+    # ISO週別（first_date を含む週から）
+    iso_year, iso_week, _ = week_start.isocalendar()
+    first_week = iso_year * 100 + iso_week
+    old_weeks = current.weekly['iso_year'] * 100 + current.weekly['iso_week']
+    tail_weekly = _weekly_from_daily(daily[daily['date'] >= week_start])
+    weekly = pd.concat([current.weekly[old_weeks < first_week], tail_weekly], ignore_index=True)
+
+    # 月別（first_date を含む月から）
+    first_month = first_date.year * 12 + first_date.month
+    old_months = current.monthly['year'] * 12 + current.monthly['month']
+    tail_monthly = _monthly_from(tail[tail['date'] >= month_start], daily[daily['date'] >= month_start])
+    monthly = pd.concat([current.monthly[old_months < first_month], tail_monthly], ignore_index=True)
+
+    # 年別（first_date を含む年から）
+    year_start = first_date.replace(month=1, day=1)
+    yearly = pd.concat(
+        [current.yearly[current.yearly['year'] < first_date.year], _yearly_from_daily(daily[daily['date'] >= year_start])],
+        ignore_index=True,
+    )
+
+    tables = {
+        'hourly': hourly,
+        'daily': daily,
+        'weekly': weekly,
+        'monthly': monthly,
+        'yearly': yearly,
+    }
+    return PlaceRollup(
+        current.place,
+        tables,
+        _middles_from(middle_stats, weekly, monthly, yearly),
+        source_signature,
+        built_at=current.built_at,
+        month_updates=month_updates,
+        middle_stats=middle_stats,
+    )
+
+
+def merge_hourly_cube(hourly: pd.DataFrame, delta: pd.DataFrame, replace_dates: bool = False) -> pd.DataFrame:
+    """
+    既存の時間別キューブに追加分を合算する
+
+    追加分の最初の日付より前の行はそのまま残し、それ以降の行のみ再集計する。
+    replace_dates=True の場合、追加分に含まれる日の既存の行は合算せずに置き換える。
+    """
+    if delta.empty:
+        return hourly
+    first_date = delta['date'].min().to_datetime64()
+    split = hourly['date'].values.searchsorted(first_date, side='left')
+    existing = hourly.iloc[split:]
+    if replace_dates:
+        existing = existing[~existing['date'].isin(delta['date'].unique())]
+    tail = (
+        pd.concat([existing, delta], ignore_index=True)
+        .groupby(['date', 'hour'], sort=True)[['count', 'rows']]
+        .sum()
+        .reset_index()
+    )
+    merged = pd.concat([hourly.iloc[:split], tail], ignore_index=True)
+    merged['hour'] = merged['hour'].astype('int16')
+    merged['count'] = merged['count'].astype('int64')
+    merged['rows'] = merged['rows'].astype('int32')
+    return merged
+
+
+def filter_complete_weeks(weekly: pd.DataFrame) -> pd.DataFrame:
+    """7日に満たない週（最新週など）と欠損率が高い週を除外する"""
+    calendar_days = (weekly['end_date'] - weekly['start_date']).dt.days + 1
+    coverage_ratio = weekly['days_with_data'] / calendar_days
+    return weekly[
+        (calendar_days >= 7) &  # 7日以上の週のみ
+        (weekly['days_with_data'] >= 5) &  # 最低5日はデータが必要
+        (coverage_ratio >= 0.8)
+    ]
+
+
+def filter_complete_months(monthly: pd.DataFrame) -> pd.DataFrame:
+    """その月のデータ存在日数が少ない年月を除外する"""
+    if monthly.empty:
+        return monthly
+    calendar_days = pd.to_datetime(
+        pd.DataFrame({'year': monthly['year'], 'month': monthly['month'], 'day': 1})
+    ).dt.days_in_month
+    coverage_ratio = monthly['days_with_data'] / calendar_days
+    return monthly[
+        (coverage_ratio >= 0.7) &  # 70%以上のカバレッジ
+        (monthly['days_with_data'] >= 20)  # 最低20日のデータ
+    ]
+
+
+def _month_keys(dates: Iterable) -> list:
+    """日付の列から "YYYY-MM" 形式の月キーの一覧を返す"""
+    return sorted({f"{date.year}-{date.month:02d}" for date in pd.DatetimeIndex(dates)})
+
+
+def _none_if_nan(value):
+    if value is None:
+        return None
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+class RollupStore:
+    """
+    集計キューブの作成・保存・読み込みを行うストア
+
+    保存されたキューブには形式のバージョンと集計元CSVの (mtime, size) を記録し、
+    どちらかが一致しない場合は古いキューブとして扱い再作成する。
+    """
+
+    def __init__(self, rollup_dir: str = ROLLUP_DIR, store=pedestrian_store):
+        self.rollup_dir = rollup_dir
+        self.store = store
+        self._rollups: Dict[str, PlaceRollup] = {}
+        self._lock = threading.Lock()
+        self._place_locks: Dict[str, threading.Lock] = {}
+
+    def _place_dir(self, place: str) -> str:
+        return os.path.join(self.rollup_dir, place)
+
+    def _lock_for(self, place: str) -> threading.Lock:
+        with self._lock:
+            lock = self._place_locks.get(place)
+            if lock is None:
+                lock = threading.Lock()
+                self._place_locks[place] = lock
+            return lock
+
+    def _file_lock(self, place: str):
+        """保存・読み込みの間、他のプロセス（ワーカー・取り込みジョブ）と排他する"""
+        return file_lock(os.path.join(self._place_dir(place), ".lock"))
+
+    def save(self, rollup: PlaceRollup) -> None:
+        """
+        キューブをCSVとメタ情報(JSON)で保存する（メタ情報は最後に書き込む）
+
+        他のプロセスが同時に保存した場合も、CSVとメタ情報が別のキューブのものにならないよう
+        プロセス間のロックを取ってから書き込む。
+        """
+        place_dir = self._place_dir(rollup.place)
+        meta = {
+            'place': rollup.place,
+            'version': rollup.version,
+            'source_signature': rollup.source_signature,
+            'built_at': rollup.built_at,
+            'month_updates': rollup.month_updates,
+            'middles': rollup.middles,
+            'middle_stats': rollup.middle_stats,
+        }
+        with self._file_lock(rollup.place):
+            for name, table in rollup.tables().items():
+                with atomic_write(os.path.join(place_dir, f"{name}.csv"), 'w', encoding='utf-8', newline='') as f:
+                    table.to_csv(f, index=False, date_format='%Y-%m-%d')
+            write_json_atomic(os.path.join(place_dir, "meta.json"), meta)
+
+    def read_meta(self, place: str) -> Optional[dict]:
+        meta_path = os.path.join(self._place_dir(place), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load_from_disk(self, place: str) -> Optional[PlaceRollup]:
+        if self.read_meta(place) is None:
+            return None
+        # 保存中の他のプロセスが書き終えるまで待ち、同じキューブのメタ情報とCSVを読み込む
+        with self._file_lock(place):
+            meta = self.read_meta(place)
+            if meta is None or meta.get('version') != ROLLUP_VERSION:
+                return None
+            try:
+                tables = {
+                    name: pd.read_csv(
+                        os.path.join(self._place_dir(place), f"{name}.csv"),
+                        parse_dates=_DATE_COLUMNS[name],
+                    )
+                    for name in _TABLES
+                }
+            except (OSError, ValueError) as e:
+                print(f"RollupStore: failed to read rollup for {place}: {e}")
+                return None
+        middles = {key: _none_if_nan(value) for key, value in meta.get('middles', {}).items()}
+        return PlaceRollup(
+            place,
+            tables,
+            middles,
+            source_signature=meta.get('source_signature'),
+            version=meta.get('version'),
+            built_at=meta.get('built_at'),
+            month_updates=meta.get('month_updates'),
+            middle_stats=meta.get('middle_stats'),
+        )
+
+    def rebuild(self, place: str, persist: bool = True) -> PlaceRollup:
+        """集計元CSVからキューブを作り直す（取り込みジョブから呼び出す）"""
+        with self._lock_for(place):
+            return self._rebuild(place, persist)
+
+    def _rebuild(self, place: str, persist: bool) -> PlaceRollup:
+        csv_file_path = self.store.path_for(place)
+        signature = file_signature(csv_file_path)
+        df = self.store.load(csv_file_path)
+        rollup = build_rollup(place, df, signature)
+        if persist:
+            try:
+                self.save(rollup)
+            except OSError as e:
+                print(f"RollupStore: failed to save rollup for {place}: {e}")
+        self._rollups[place] = rollup
+        print(f"RollupStore: built rollup for {place} ({len(rollup.hourly)} hourly rows)")
+        return rollup
+
+    def apply_rows(
+        self,
+        place: str,
+        rows: pd.DataFrame,
+        previous_signature=None,
+        replace_dates: bool = False,
+    ) -> PlaceRollup:
+        """
+        追記された行だけをキューブに反映する（差分取り込みジョブから呼び出す）
+
+        previous_signature には追記前の集計元CSVの (mtime, size) を渡す。
+        replace_dates=True の場合、rows に含まれる日の既存の集計は置き換える（日単位で再取得した場合）。
+        保存済みキューブが追記前のCSVと一致しない場合は全体を作り直す。
+        追記された行を含む月のみ更新時刻を進めるため、
+        他の月のキャッシュはそのまま利用できる。
+        """
+        with self._lock_for(place):
+            current = self._rollups.get(place) or self._load_from_disk(place)
+            if current is None or not current.is_current(previous_signature):
+                print(f"RollupStore: rollup for {place} does not match the previous source, rebuilding")
+                return self._rebuild(place, persist=True)
+
+            delta = build_hourly_cube(rows)
+            now = time.time()
+            month_updates = dict(current.month_updates)
+            for month_key in _month_keys(delta['date']):
+                month_updates[month_key] = now
+
+            if delta.empty:
+                rollup = PlaceRollup(
+                    place,
+                    current.tables(),
+                    current.middles,
+                    file_signature(self.store.path_for(place)),
+                    built_at=current.built_at,
+                    month_updates=month_updates,
+                    middle_stats=current.middle_stats,
+                )
+            else:
+                # 追記された日以降の集計と中間閾値だけを更新する
+                rollup = update_rollup(
+                    current,
+                    merge_hourly_cube(current.hourly, delta, replace_dates),
+                    delta['date'].min(),
+                    file_signature(self.store.path_for(place)),
+                    month_updates=month_updates,
+                )
+            try:
+                self.save(rollup)
+            except OSError as e:
+                print(f"RollupStore: failed to save rollup for {place}: {e}")
+            self._rollups[place] = rollup
+            print(f"RollupStore: applied {len(rows)} rows to {place} ({len(delta)} hourly rows)")
+            return rollup
+
+    def get(self, place: str) -> PlaceRollup:
+        """
+        場所の集計キューブを取得する
+
+        メモリ上 → 保存済みファイル → 再作成 の順に、集計元CSVと一致する最新のものを返す。
+        """
+        signature = file_signature(self.store.path_for(place))
+        if signature is None:
+            raise FileNotFoundError(self.store.path_for(place))
+
+        rollup = self._rollups.get(place)
+        if rollup is not None and rollup.is_current(signature):
+            return rollup
+
+        with self._lock_for(place):
+            signature = file_signature(self.store.path_for(place))
+            rollup = self._rollups.get(place)
+            if rollup is not None and rollup.is_current(signature):
+                return rollup
+
+            rollup = self._load_from_disk(place)
+            if rollup is not None and rollup.is_current(signature):
+                self._rollups[place] = rollup
+                return rollup
+
+            print(f"RollupStore: rollup for {place} is missing or stale, rebuilding")
+            return self._rebuild(place, persist=True)
+
+    def stamps(self, place: str) -> Optional[RollupStamps]:
+        """
+        集計元CSVと一致するキューブの更新時刻を返す
+
+        メモリ上のキューブか保存済みのメタ情報のみを参照し、キューブの読み込み・作り直しは行わない。
+        集計元CSVがない場合と、CSVの更新がまだキューブに反映されていない場合は None。
+        """
+        signature = file_signature(self.store.path_for(place))
+        if signature is None:
+            return None
+        rollup = self._rollups.get(place)
+        if rollup is not None and rollup.is_current(signature):
+            return RollupStamps(rollup.built_at, rollup.month_updates)
+        meta = self.read_meta(place)
+        if (
+            meta is None
+            or meta.get('version') != ROLLUP_VERSION
+            or meta.get('source_signature') != list(signature)
+            or meta.get('built_at') is None
+        ):
+            return None
+        return RollupStamps(meta['built_at'], meta.get('month_updates') or {})
+
+    def is_stale(self, place: str) -> bool:
+        """保存済みのキューブが集計元CSVより古いかどうか"""
+        meta = self.read_meta(place)
+        if meta is None or meta.get('version') != ROLLUP_VERSION:
+            return True
+        signature = file_signature(self.store.path_for(place))
+        return signature is None or meta.get('source_signature') != list(signature)
+
+
+# アプリケーション全体で共有するストア
+rollup_store = RollupStore()
@@ -0,0 +1,183 @@
+"""
+「今日の詳細」（/congestion-data/{place}）の事前計算スナップショット
+
+generate_today_data.py と取り込みジョブが場所ごと・日付ごとの get_congestion_data の結果を
+app/data/generated/today_details/{place}_{date}.json に保存し、エンドポイントはそれを返す。
+ファイルは一時ファイルに書き込んでから置き換えるため、読み込み途中のファイルを返すことはない。
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.services.analyze.get_trend_analysis import get_congestion_data
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.trend_engine import trend_months
+from app.services.utils.files import write_json_atomic
+from app.services.weather.weather_service import weather_service
+
+SNAPSHOT_DIR = os.path.join("app", "data", "generated", "today_details")
+DATA_DIR = os.path.join("app", "data", "meidai")
+
+# スナップショットを作成する週数（エンドポイントの既定値と同じ）
+SNAPSHOT_WEEKS = 3
+
+
+class TodaySnapshotStore:
+    """
+    スナップショットの読み書き
+
+    読み込んだ内容はファイルの (mtime, size) ごとにメモリに保持する。
+    集計キューブ、またはスナップショットに含まれる月（前月・去年の月も含む）の天気データが
+    スナップショットより後に更新された場合は古いものとして扱う。
+    """
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self._loaded: Dict[Tuple[str, str], Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, place: str, date_str: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{place}_{date_str}.json")
+
+    def signature(self, place: str, date_str: str) -> Optional[Tuple[int, int]]:
+        """スナップショットの (mtime_ns, size)。ファイルがない場合はNone"""
+        try:
+            stat = os.stat(self.path_for(place, date_str))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_fresh(self, place: str, signature: Tuple[int, int], date_str: Optional[str] = None) -> bool:
+        """
+        スナップショットの作成後に集計キューブ（と date_str のスナップショットに含まれる月の天気データ）が
+        更新されていないか
+
+        キューブの保存済みの更新時刻のみを参照し、キューブの読み込み・作り直しは行わない。
+        """
+        rollup = rollup_store.stamps(place)
+        if rollup is None:
+            return False
+        created_at = signature[0] / 1e9
+        if date_str is not None:
+            date = datetime.strptime(date_str, "%Y-%m-%d")
+            for year, month in set(trend_months(date, SNAPSHOT_WEEKS)):
+                if created_at < weather_service.updated_at(year, month):
+                    return False
+        return created_at >= rollup.updated_at()
+
+    def load(self, place: str, date_str: str) -> Optional[Tuple[Tuple[int, int], Dict[str, Any]]]:
+        """
+        利用できるスナップショットの (signature, 内容) を返す
+
+        ファイルがない、古い、生成時にエラーとなっていた場合はNone。
+        """
+        signature = self.signature(place, date_str)
+        if signature is None or not self.is_fresh(place, signature, date_str):
+            return None
+
+        key = (place, date_str)
+        with self._lock:
+            cached = self._loaded.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached
+
+        try:
+            with open(self.path_for(place, date_str), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"TodaySnapshotStore: failed to read snapshot for {place} {date_str}: {e}")
+            return None
+        if not data or data.get('status') == 'error':
+            return None
+
+        with self._lock:
+            self._loaded[key] = (signature, data)
+        return signature, data
+
+    def load_places(self, places: Iterable[str], date_str: str) -> Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]]:
+        """複数の場所の利用できるスナップショット {場所: (signature, 内容)}（ない場所は含めない）"""
+        snapshots = {}
+        for place in places:
+            snapshot = self.load(place, date_str)
+            if snapshot is not None:
+                snapshots[place] = snapshot
+        return snapshots
+
+    def write(self, place: str, date_str: str, data: Dict[str, Any]) -> str:
+        path = self.path_for(place, date_str)
+        write_json_atomic(path, data)
+        return path
+
+
+today_snapshots = TodaySnapshotStore()
+
+
+def generate_snapshot(place: str, target_date: datetime, snapshot_dir: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+    """1つの場所のスナップショットを作成する（ワーカープロセスからも呼び出す）"""
+    store = TodaySnapshotStore(snapshot_dir)
+    date_str = target_date.strftime("%Y-%m-%d")
+    start = time.perf_counter()
+    try:
+        csv_file_path = os.path.join(DATA_DIR, f"{place}.csv")
+        data = get_congestion_data(csv_file_path, target_date, SNAPSHOT_WEEKS)
+        store.write(place, date_str, data)
+        status = {"status": "success"}
+    except Exception as e:
+        print(f"✗ Error generating data for {place}: {e}")
+        # エラーの場合は空のデータ構造を保存
+        store.write(place, date_str, {
+            "status": "error",
+            "message": f"データ生成エラー: {str(e)}",
+            "data": None
+        })
+        status = {"status": "error", "error": str(e)}
+    status["seconds"] = round(time.perf_counter() - start, 3)
+    return status
+
+
+def generate_snapshots(
+    places: Iterable[str],
+    target_date: Optional[datetime] = None,
+    max_workers: Optional[int] = None,
+    snapshot_dir: str = SNAPSHOT_DIR,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    複数の場所のスナップショットをプロセスプールで並列に作成する
+
+    1か所のみの場合はプロセスを起動せずにその場で作成する。
+    """
+    places = list(places)
+    target_date = target_date or datetime.now()
+    if len(places) <= 1 or max_workers == 1:
+        return {place: generate_snapshot(place, target_date, snapshot_dir) for place in places}
+
+    max_workers = max_workers or min(os.cpu_count() or 1, len(places))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            place: executor.submit(generate_snapshot, place, target_date, snapshot_dir)
+            for place in places
+        }
+        results = {}
+        for place, future in futures.items():
+            try:
+                results[place] = future.result()
+            except Exception as e:
+                results[place] = {"status": "error", "error": str(e)}
+        return results
+
+
+def refresh_snapshots(places: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """新しいデータを取り込んだ場所の今日のスナップショットを作り直す（取り込みジョブから呼び出す）"""
+    places = sorted(set(places))
+    if not places:
+        return {}
+    try:
+        return generate_snapshots(places)
+    except Exception as e:
+        print(f"TodaySnapshotStore: failed to refresh snapshots for {places}: {e}")
+        return {place: {"status": "error", "error": str(e)} for place in places}
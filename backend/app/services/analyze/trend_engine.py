@@ -0,0 +1,196 @@
+"""
+トレンド分析（/congestion-data）で使う日別・時間別の混雑度をまとめて計算するエンジン
+
+今週・去年同期間・昨日・去年の今日の各セクションが必要とする月をまとめて受け取り、
+集計キューブから1回の処理で混雑度を計算する。各セクションはその結果から該当日を切り出す。
+"""
+
+import os
+from datetime import date as date_type, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.analyze.rollup_store import CORE_END_HOUR, CORE_START_HOUR, rollup_store
+from app.services.analyze.utils.congestion_scale import get_congestion_scale
+from app.services.weather.weather_service import weather_service
+
+# 1970-01-01 の序数（datetime64[D] の値に足すと date.toordinal() と同じ値になる）
+_EPOCH_ORDINAL = date_type(1970, 1, 1).toordinal()
+
+
+def _ordinals(dates: pd.Series) -> np.ndarray:
+    """日付の列を日付の序数（date.toordinal()）の配列に変換する"""
+    return dates.to_numpy().astype('datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+
+
+# 去年以前の比較日の合わせ方
+# - calendar: 同じ月日（2/29 は2/28）
+# - weekday: 同じISO週・同じ曜日（その年に第53週がない場合は第52週）
+ALIGN_MODES = ('calendar', 'weekday')
+
+
+def previous_year_date(target_date: datetime, years_back: int = 1, align: str = 'calendar') -> datetime:
+    """years_back 年前の比較日を返す（時刻は target_date のまま）"""
+    if align == 'calendar':
+        year = target_date.year - years_back
+        try:
+            return target_date.replace(year=year)
+        except ValueError:
+            # 2/29 の場合、うるう年でない年は2/28と比較する
+            return target_date.replace(year=year, day=28)
+    if align == 'weekday':
+        iso_year, week, weekday = target_date.isocalendar()
+        try:
+            day = date_type.fromisocalendar(iso_year - years_back, week, weekday)
+        except ValueError:
+            day = date_type.fromisocalendar(iso_year - years_back, 52, weekday)
+        return datetime.combine(day, target_date.time())
+    raise ValueError(f"unknown align: {align}")
+
+
+def months_between(start_date: datetime, end_date: datetime) -> List[Tuple[int, int]]:
+    """start_date〜end_date に含まれる (年, 月) を昇順で返す"""
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class TrendEngine:
+    """
+    1つの場所・複数の月の混雑度を保持する
+
+    - day_level: カレンダービューと同じ基準（全期間の中間閾値）の日別混雑度
+    - hours: 時間帯ビューと同じ基準（月ごとの中間閾値）の7〜22時の時間別混雑度
+    - day_weather: 日付ごとの天気データと時間ごとの索引
+
+    日別・時間別のデータは日付の序数をキーとする辞書に保持するため、
+    各セクションは表示する日数によらず1日あたり定数時間で切り出せる。
+
+    計算は最初に参照されたときに1回だけ行う。集計キューブの取得や計算で
+    例外が起きた場合は参照した側（各セクション）にそのまま伝わる。
+    """
+
+    def __init__(self, csv_file_path: str, months: Iterable[Tuple[int, int]]):
+        self.place = os.path.splitext(os.path.basename(csv_file_path))[0]
+        self.months = sorted(set(months))
+        self._day_levels: Optional[Dict[int, Any]] = None
+        self._day_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._hours: Optional[Dict[int, List[Tuple[int, Any, int]]]] = None
+        self._weather: Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]] = {}
+        self._day_weather: Dict[int, Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]] = {}
+
+    def _ensure(self) -> None:
+        if self._hours is not None:
+            return
+        rollup = rollup_store.get(self.place)
+        month_ids = {year * 12 + month for year, month in self.months}
+
+        # 日別の混雑度（全期間の平均を中間閾値とする）
+        daily = rollup.daily
+        in_months = (daily['date'].dt.year * 12 + daily['date'].dt.month).isin(month_ids)
+        daily = daily[in_months]
+        levels = get_congestion_scale(self.place, 'calendar', rollup.middles.get('calendar')).levels(daily['count'])
+        day_ordinals = _ordinals(daily['date'])
+        day_levels = dict(zip(day_ordinals.tolist(), levels.tolist()))
+        # 複数の日をまとめて引くための (序数, 混雑度, 人数) の配列（序数の昇順）
+        order = np.argsort(day_ordinals, kind='stable')
+        self._day_arrays = (
+            day_ordinals[order],
+            levels[order],
+            daily['count'].to_numpy(dtype=np.int64)[order],
+        )
+
+        # 時間別の混雑度（月ごとに0人の時間帯を除いた平均を中間閾値とする）
+        hours: Dict[int, List[Tuple[int, Any, int]]] = {}
+        for year, month in self.months:
+            df_month = rollup.hourly_for_month(year, month)
+            df_month = df_month[(df_month['hour'] >= CORE_START_HOUR) & (df_month['hour'] <= CORE_END_HOUR)]
+            if df_month.empty:
+                continue
+            scale = get_congestion_scale(self.place, 'date_time', rollup.month_middle(year, month, 'date_time_middle'))
+            levels = scale.levels(df_month['count'])
+            for ordinal, hour, level, count in zip(
+                _ordinals(df_month['date']).tolist(),
+                df_month['hour'].tolist(),
+                levels.tolist(),
+                df_month['count'].tolist(),
+            ):
+                hours.setdefault(ordinal, []).append((hour, level, count))
+
+        self._day_levels = day_levels
+        self._hours = hours
+
+    def day_level(self, date: datetime) -> int:
+        """日別の混雑度（データがない日は0）"""
+        self._ensure()
+        level = self._day_levels.get(date.toordinal())
+        return 0 if level is None else int(level)
+
+    def day_series(self, ordinals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        日付の序数の配列に対する (混雑度, 人数, データの有無) の配列を返す
+
+        任意の形の配列を受け取り、同じ形で返す（データがない日は混雑度・人数とも0）。
+        """
+        self._ensure()
+        day_ordinals, levels, counts = self._day_arrays
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        if len(day_ordinals) == 0:
+            zeros = np.zeros(ordinals.shape, dtype=np.int64)
+            return zeros, zeros.copy(), np.zeros(ordinals.shape, dtype=bool)
+        index = np.clip(np.searchsorted(day_ordinals, ordinals), 0, len(day_ordinals) - 1)
+        found = day_ordinals[index] == ordinals
+        return np.where(found, levels[index], 0), np.where(found, counts[index], 0), found
+
+    def hours(self, date: datetime) -> Dict[int, Dict[str, Any]]:
+        """7〜22時のうちデータがある時間の {時間: 時間別データ} を返す（呼び出しごとに新しい辞書）"""
+        self._ensure()
+        return {
+            int(hour): {
+                "hour": int(hour),
+                "congestion": int(level),
+                "count": int(count),
+                "highlighted": False,
+                "highlight_reason": "",
+                "weather_info": None,
+            }
+            for hour, level, count in self._hours.get(date.toordinal(), [])
+        }
+
+    def weather(self, year: int, month: int) -> Dict[int, List[Dict[str, Any]]]:
+        """月ごとの日付別・時間別天気データ（月ごとに1回だけ取得する）"""
+        key = (year, month)
+        if key not in self._weather:
+            self._weather[key] = weather_service.get_weather_for_date_time(year, month)
+        return self._weather[key]
+
+    def day_weather(self, date: datetime) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+        """
+        その日の天気データ（時間順のリスト）と {時間: 天気データ} の索引を返す
+
+        同じ時間のデータが複数ある場合は、リストで先に現れるものを索引に使う。
+        """
+        ordinal = date.toordinal()
+        if ordinal not in self._day_weather:
+            entries = self.weather(date.year, date.month).get(date.day, [])
+            by_hour: Dict[int, Dict[str, Any]] = {}
+            for entry in entries:
+                by_hour.setdefault(entry['hour'], entry)
+            self._day_weather[ordinal] = (entries, by_hour)
+        return self._day_weather[ordinal]
+
+
+def trend_months(target_date: datetime, weeks_count: int, align: str = 'calendar') -> List[Tuple[int, int]]:
+    """トレンド分析の全セクション（今年・去年の表示期間、昨日、去年の今日）に必要な月"""
+    total_days = weeks_count * 7
+    months = months_between(target_date - timedelta(days=total_days - 1), target_date + timedelta(days=7))
+    yesterday = target_date - timedelta(days=1)
+    months.append((yesterday.year, yesterday.month))
+    last_year_date = previous_year_date(target_date, 1, align)
+    months += months_between(last_year_date - timedelta(days=total_days - 1), last_year_date + timedelta(days=7))
+    return months
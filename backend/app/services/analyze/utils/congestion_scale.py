@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.analyze.utils.congestion_thresholds import LINEAR_GRANULARITIES, THRESHOLDS_BY_GRANULARITY
 
 TOTAL_CONGESTION_LEVELS = 20
 _EPSILON = 1e-6
@@ -107,3 +112,92 @@ def calculate_scaled_level(
     level = int((count - min_threshold) / step) + 1
     return min(max(level, 1), total_levels)
 
+
+
+class CongestionScale:
+    """
+    人数の配列をまとめて混雑度の配列に変換する
+
+    - linear=False: build_congestion_bins の境界値を np.searchsorted で引く。
+      pd.cut(bins=bins, labels=False, include_lowest=True, right=False) と同じ結果になる
+      （0未満・欠損は0とする）
+    - linear=True: calculate_scaled_level と同じ min〜max の線形マッピング
+    """
+
+    def __init__(
+        self,
+        min_threshold: float,
+        max_threshold: float,
+        middle_threshold: Optional[float] = None,
+        total_levels: int = TOTAL_CONGESTION_LEVELS,
+        linear: bool = False,
+    ):
+        self.min_threshold = float(min_threshold)
+        self.max_threshold = float(max_threshold)
+        if self.max_threshold <= self.min_threshold:
+            self.max_threshold = self.min_threshold + 1
+        self.total_levels = total_levels
+        self.linear = linear
+        self.bins = None
+        if not linear:
+            if middle_threshold is None:
+                middle_threshold = (self.min_threshold + self.max_threshold) / 2
+            self.bins = np.asarray(
+                build_congestion_bins(min_threshold, middle_threshold, max_threshold, total_levels),
+                dtype=np.float64,
+            )
+
+    def levels(self, counts) -> np.ndarray:
+        """人数の配列（任意の形）を同じ形の混雑度の配列（int64）に変換する"""
+        counts = np.asarray(counts, dtype=np.float64)
+        missing = np.isnan(counts)
+        if self.linear:
+            step = (self.max_threshold - self.min_threshold) / (self.total_levels - 1)
+            with np.errstate(invalid='ignore'):
+                levels = np.floor((counts - self.min_threshold) / step) + 1
+            levels = np.clip(np.nan_to_num(levels), 1, self.total_levels)
+            levels = np.where(counts < self.min_threshold, 1, levels)
+            levels = np.where(counts >= self.max_threshold, self.total_levels, levels)
+            levels = np.where(missing | (counts <= 0), 0, levels)
+        else:
+            levels = np.searchsorted(self.bins, counts, side='right') - 1
+            levels = np.minimum(levels, len(self.bins) - 2)
+            levels = np.where(missing | (levels < 0), 0, levels)
+        return levels.astype(np.int64)
+
+    def level(self, count: float) -> int:
+        """1つの人数の混雑度"""
+        return int(self.levels([count])[0])
+
+
+@lru_cache(maxsize=4096)
+def _cached_scale(
+    min_threshold: float,
+    max_threshold: float,
+    middle_threshold: Optional[float],
+    total_levels: int,
+    linear: bool,
+) -> CongestionScale:
+    return CongestionScale(min_threshold, max_threshold, middle_threshold, total_levels, linear)
+
+
+def get_congestion_scale(
+    place: str,
+    granularity: str,
+    middle_threshold: Optional[float] = None,
+    total_levels: int = TOTAL_CONGESTION_LEVELS,
+) -> CongestionScale:
+    """
+    場所・粒度（・中間の境界値）ごとの CongestionScale を返す
+
+    境界値の表は congestion_thresholds の THRESHOLDS_BY_GRANULARITY を使い、
+    場所がない場合は 'default' の値を使う。同じ境界値になる組み合わせは同じオブジェクトを共有する。
+    """
+    thresholds = THRESHOLDS_BY_GRANULARITY[granularity]
+    min_threshold, max_threshold = thresholds.get(place, thresholds['default'])
+    linear = granularity in LINEAR_GRANULARITIES
+    if linear or middle_threshold is None:
+        middle_threshold = None
+    else:
+        middle_threshold = float(middle_threshold)
+    return _cached_scale(float(min_threshold), float(max_threshold), middle_threshold, total_levels, linear)
@@ -0,0 +1,175 @@
+"""
+各ビューの場所ごとの混雑度境界値 (min_threshold, max_threshold)
+
+粒度（granularity）ごとに1つの表を持ち、CongestionScale はこの表から境界値を作る。
+各ビューのモジュールは従来の名前（CONGESTION_THRESHOLDS など）で同じ表を参照する。
+"""
+
+from typing import Dict, Tuple
+
+Thresholds = Dict[str, Tuple[float, float]]
+
+# カレンダー（日ごとの合計）
+CALENDAR_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義
+    'honmachi2': (2300, 9500),
+    'honmachi3': (1500, 8500),
+    'honmachi4': (1000, 10000),
+    'jinnya': (700, 7000),
+    'kokubunjidori': (1600, 5800),
+    'nakabashi': (1600, 7800),
+    'omotesando': (700, 7000),
+    'yasukawadori': (7000, 26000),
+    'yottekan': (300, 3500),
+    'gyouzinbashi': (300, 1400),  # 行神橋の閾値
+    'old-town': (850, 7000),     # 古い町並の閾値
+    'station': (400, 2100),   
+    # デフォルト値
+    'default': (2300, 9500)
+}
+
+# 時間×日付（1時間ごとの合計）
+DATE_TIME_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義
+    'honmachi2': (65, 850),
+    'honmachi3': (35, 400),
+    'honmachi4': (50, 2000),
+    'jinnya': (50, 1000),
+    'kokubunjidori': (40, 450),
+    'nakabashi': (40, 650),
+    'omotesando': (25, 700),
+    'yasukawadori': (400, 2900),
+    'yottekan': (10, 300),
+    'old-town': (15, 150),        # 旧市街地域の歩行者データ分析に基づく
+    'gyouzinbashi': (25, 900),    # 行神橋のデータから適切な値を算出
+    'station': (25, 200),  
+    # デフォルト値
+    'default': (10, 500)
+}
+
+# 曜日×時間帯（1時間ごとの平均）
+WEEK_TIME_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義
+    'honmachi2': (15, 400),
+    'honmachi3': (10, 250),
+    'honmachi4': (15, 300),
+    'jinnya': (10, 500),
+    'kokubunjidori': (15, 220),
+    'nakabashi': (10, 350),
+    'omotesando': (5, 160),
+    'yasukawadori': (100, 2000),
+    'yottekan': (3, 70),
+    
+    # 新しく追加する3つの場所の閾値
+    'gyouzinbashi': (10, 170),    # 行神橋の閾値
+    'old-town': (5, 1000),        # 古い町並の閾値
+    'station': (10, 180),         # 駅周辺の閾値
+    
+    # デフォルト値
+    'default': (10, 500)
+}
+
+# 週単位
+WEEK_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義（日単位の7倍程度）
+    'honmachi2': (16100, 66500),
+    'honmachi3': (10500, 59500),
+    'honmachi4': (7000, 70000),
+    'jinnya': (4900, 49000),
+    'kokubunjidori': (11200, 40600),
+    'nakabashi': (11200, 54600),
+    'omotesando': (4900, 49000),
+    'yasukawadori': (49000, 182000),
+    'yottekan': (2100, 24500),
+    'old-town': (5950, 49000),
+    'gyouzinbashi': (2100, 9800),
+    'station': (2800, 14700),
+    'default': (16100, 66500)
+}
+
+# 月単位
+MONTH_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義（日単位の30倍程度）
+    'honmachi2': (69000, 285000),
+    'honmachi3': (45000, 255000),
+    'honmachi4': (30000, 300000),
+    'jinnya': (21000, 210000),
+    'kokubunjidori': (48000, 174000),
+    'nakabashi': (48000, 234000),
+    'omotesando': (21000, 210000),
+    'yasukawadori': (210000, 780000),
+    'yottekan': (9000, 105000),
+    'old-town': (25500, 210000),
+    'gyouzinbashi': (9000, 42000),
+    'station': (12000, 63000),
+    # デフォルト値
+    'default': (69000, 285000)
+}
+
+# 年単位
+YEAR_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義（日単位の365倍程度）
+    'honmachi2': (838500, 3467500),
+    'honmachi3': (547500, 3102500),
+    'honmachi4': (365000, 3650000),
+    'jinnya': (255500, 2555000),
+    'kokubunjidori': (584000, 2117000),
+    'nakabashi': (584000, 2847000),
+    'omotesando': (255500, 2555000),
+    'yasukawadori': (2555000, 9490000),
+    'yottekan': (109500, 1277500),
+    'old-town': (310250, 2555000),
+    'gyouzinbashi': (109500, 511000),
+    'station': (146000, 766500),
+    # デフォルト値
+    'default': (838500, 3467500)
+}
+
+# イベント効果（日ごとの合計）
+EVENT_THRESHOLDS: Thresholds = {
+    # 場所ごとの(min_threshold, max_threshold)を定義
+    'honmachi2': (65, 850),
+    'honmachi3': (35, 400),
+    'honmachi4': (50, 2000),
+    'jinnya': (50, 1000),
+    'kokubunjidori': (40, 450),
+    'nakabashi': (40, 650),
+    'omotesando': (25, 700),
+    'yasukawadori': (400, 2900),
+    'yottekan': (10, 300),
+    'old-town': (15, 150),        # 旧市街地域の歩行者データ分析に基づく
+    'gyouzinbashi': (25, 900),    # 行神橋のデータから適切な値を算出
+    'station': (25, 200),  
+    # デフォルト値
+    'default': (10, 500)
+}
+
+
+def _scale_thresholds(thresholds: Tuple[float, float]) -> Tuple[int, int]:
+    """日ごとの境界値を1時間あたりに換算する"""
+    min_threshold, max_threshold = thresholds
+    # 24でスケールしつつ、極端な小ささを避ける
+    min_hourly = max(1, int(min_threshold / 24))
+    max_hourly = max(min_hourly + 1, int(max_threshold / 24))
+    return (min_hourly, max_hourly)
+
+
+# イベント効果（1時間ごとの合計）: 日ごとの境界値を時間にスケーリングして使用
+EVENT_HOURLY_THRESHOLDS: Thresholds = {
+    place: _scale_thresholds(bounds) for place, bounds in EVENT_THRESHOLDS.items()
+}
+
+# 粒度ごとの境界値の表
+THRESHOLDS_BY_GRANULARITY: Dict[str, Thresholds] = {
+    'calendar': CALENDAR_THRESHOLDS,
+    'date_time': DATE_TIME_THRESHOLDS,
+    'week_time': WEEK_TIME_THRESHOLDS,
+    'week': WEEK_THRESHOLDS,
+    'month': MONTH_THRESHOLDS,
+    'year': YEAR_THRESHOLDS,
+    'event': EVENT_THRESHOLDS,
+    'event_hourly': EVENT_HOURLY_THRESHOLDS,
+}
+
+# min〜max を線形に分ける粒度（その他は平均値を中間の境界値とする）
+LINEAR_GRANULARITIES = frozenset({'event', 'event_hourly'})
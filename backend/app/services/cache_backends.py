@@ -0,0 +1,161 @@
+"""
+ワーカープロセス間でレスポンスキャッシュを共有するための保存先
+
+- SQLiteBackend: 同じサーバー上のワーカーでSQLiteファイルを共有する
+- RedisBackend: Redisを共有する（redisパッケージ、またはget/set/deleteを持つクライアントを渡す）
+
+保存する値はバイト列で、シリアライズには orjson（インストールされていれば）か json を使う。
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson がない環境では標準の json を使う
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """JSONとして扱える値をコンパクトなバイト列にする"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SQLiteBackend:
+    """
+    SQLiteファイルにキャッシュを保存する
+
+    スレッドごとに接続を持ち、WALモードで複数プロセスからの読み書きを可能にする。
+    保存件数が max_entries を超えた場合は古いものから削除する。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL, expires_at REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, Optional[float]]]:
+        """(値, 保存時刻, 有効期限) を返す。ない場合・期限切れの場合はNone"""
+        row = self._conn().execute(
+            "SELECT value, stored_at, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, stored_at, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return bytes(value), stored_at, expires_at
+
+    def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, data, now, now + ttl if ttl is not None else None),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self, prefix: str = "") -> None:
+        """prefix で始まるキーを全て削除する"""
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._conn().execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+
+class RedisBackend:
+    """
+    Redisにキャッシュを保存する
+
+    値の先頭16バイトに保存時刻と有効期限を記録し、削除はRedisのEXに任せる。
+    client には redis.Redis 互換（get / set(ex=) / delete / scan_iter）のオブジェクトを渡せる。
+    """
+
+    name = "redis"
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "ai_cam:cache:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("Redisをキャッシュに使うには redis パッケージが必要です") from e
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, Optional[float]]]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None or len(raw) < 16:
+            return None
+        stored_at, expires_at = struct.unpack('<dd', raw[:16])
+        return raw[16:], stored_at, (expires_at if expires_at > 0 else None)
+
+    def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        header = struct.pack('<dd', now, now + ttl if ttl is not None else 0.0)
+        ex = max(int(ttl), 1) if ttl is not None else None
+        self.client.set(self.prefix + key, header + data, ex=ex)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self, prefix: str = "") -> None:
+        """prefix で始まるキーを全て削除する"""
+        for key in self.client.scan_iter(match=self.prefix + prefix + "*"):
+            self.client.delete(key)
+
+
+def create_backend(kind: str, path: Optional[str] = None, url: Optional[str] = None, prefix: str = "ai_cam:cache:"):
+    """
+    設定値からキャッシュの共有先を作成する
+
+    "memory"（共有しない）の場合はNoneを返す。
+    """
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return None
+    if kind == "sqlite":
+        return SQLiteBackend(path or os.path.join("app", "data", "cache", "response_cache.sqlite3"))
+    if kind == "redis":
+        return RedisBackend(url=url, prefix=prefix)
+    raise ValueError(f"Unknown cache backend: {kind}")
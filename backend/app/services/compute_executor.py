@@ -0,0 +1,144 @@
+"""
+async なエンドポイントから呼び出す pandas の集計などのブロッキング処理を実行するエグゼキューター
+
+イベントループ上で直接実行すると、重いリクエストが他の全てのリクエストを止めてしまうため、
+専用のスレッドプールで実行する。待ち行列が上限を超えた場合は 503 を返して過負荷を知らせる。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+# 待ち時間・計算時間のパーセンタイルの計算に使う直近の件数
+_SAMPLE_SIZE = 1000
+
+
+class ComputeBusyError(HTTPException):
+    """待ち行列が上限に達している（503 Service Unavailable）"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=503,
+            detail="サーバーが混み合っています。しばらくしてから再度お試しください",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class ComputeExecutor:
+    """
+    ブロッキング処理用のスレッドプール
+
+    - max_workers: 同時に実行する数（未指定の場合はCPU数）
+    - max_queue: 実行待ちにできる数。実行中と実行待ちの合計が max_workers + max_queue
+      に達している場合は、待たずに ComputeBusyError（503）を送出する
+    - 実行待ちの時間（queue wait）と実行時間（compute）を記録する
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: int = 32):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compute")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._queue_waits: Deque[float] = deque(maxlen=_SAMPLE_SIZE)
+        self._compute_times: Deque[float] = deque(maxlen=_SAMPLE_SIZE)
+
+    def _record(self, queue_wait: float, compute: float, ok: bool) -> None:
+        with self._lock:
+            self._queue_waits.append(queue_wait)
+            self._compute_times.append(compute)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """func(*args, **kwargs) をスレッドプールで実行し、結果を返す"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ComputeBusyError()
+            self._pending += 1
+            self.submitted += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self._record(started_at - submitted_at, time.perf_counter() - started_at, ok)
+
+        future = self._executor.submit(task)
+        # 実行前に取り消された場合も件数を戻せるよう、完了時のコールバックで減らす
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """実行待ちの件数、待ち時間と実行時間（秒）の平均・パーセンタイル"""
+        with self._lock:
+            waits = list(self._queue_waits)
+            computes = list(self._compute_times)
+            pending = self._pending
+            counts = {
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+        def summary(samples):
+            return {
+                'avg': round(sum(samples) / len(samples), 4) if samples else 0.0,
+                'p50': round(_percentile(samples, 0.50), 4),
+                'p95': round(_percentile(samples, 0.95), 4),
+                'p99': round(_percentile(samples, 0.99), 4),
+                'max': round(max(samples), 4) if samples else 0.0,
+            }
+
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'running': min(pending, self.max_workers),
+            'queued': max(pending - self.max_workers, 0),
+            **counts,
+            'queue_wait': summary(waits),
+            'compute': summary(computes),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+compute_executor = ComputeExecutor(
+    max_workers=settings.COMPUTE_WORKERS,
+    max_queue=settings.COMPUTE_MAX_QUEUE,
+)
@@ -0,0 +1,277 @@
+"""APIレスポンスをリクエスト間で共有するキャッシュ（LRU・有効期限・同時リクエストの集約）"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'expires_at', 'size')
+
+    def __init__(self, value: Any, stored_at: float, expires_at: Optional[float], size: int):
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.size = size
+
+
+class ResponseCache:
+    """
+    件数とバイト数の上限を持つLRUキャッシュ
+
+    - 上限を超えた場合は最も長く使われていないエントリから削除する
+    - ttl=None のエントリは有効期限なし（上限による削除か is_fresh による無効化のみ）
+    - get_or_compute は同じキーの同時リクエストを1回の計算にまとめる
+
+    backend（SQLiteBackend / RedisBackend）を指定すると、プロセス内のLRUに加えて
+    encode でバイト列にした値を共有先にも保存し、他のワーカーが計算した結果も利用する。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        sizer: Optional[Callable[[Any], int]] = None,
+        backend=None,
+        encode: Optional[Callable[[Any], bytes]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None,
+        namespace: str = "default",
+    ):
+        if backend is not None and (encode is None or decode is None):
+            raise ValueError("backend を使う場合は encode と decode が必要です")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizer = sizer or (lambda value: 0)
+        self.backend = backend
+        self._encode = encode
+        self._decode = decode
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.backend_hits = 0
+        self.backend_errors = 0
+
+    def _backend_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _store_local(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _get_shared(self, key: str, is_fresh: Optional[Callable[[float], bool]]) -> Any:
+        """共有先からエントリを取得し、プロセス内のLRUにも保存する"""
+        try:
+            found = self.backend.get(self._backend_key(key))
+            if found is None:
+                return None
+            data, stored_at, expires_at = found
+            if is_fresh is not None and not is_fresh(stored_at):
+                self.backend.delete(self._backend_key(key))
+                return None
+            value = self._decode(data)
+        except Exception as e:
+            with self._lock:
+                self.backend_errors += 1
+            print(f"ResponseCache: failed to read {key} from {self.backend.name}: {e}")
+            return None
+        if len(data) <= self.max_bytes:
+            self._store_local(key, _Entry(value, stored_at, expires_at, len(data)))
+        return value
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def get(self, key: str, is_fresh: Optional[Callable[[float], bool]] = None) -> Any:
+        """
+        キャッシュされた値を返す（ない場合・期限切れの場合はNone）
+
+        is_fresh にはエントリの保存時刻を受け取り、まだ有効かどうかを返す関数を指定できる。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and time.time() >= entry.expires_at:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None and self.backend is None:
+                self.misses += 1
+                return None
+
+        if entry is None:
+            value = self._get_shared(key, is_fresh)
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self.backend_hits += 1
+            return value
+
+        # 有効性の確認はファイルの確認などを伴うためロックの外で行う
+        if is_fresh is not None and not is_fresh(entry.stored_at):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """値を保存する。1件で上限を超える値はプロセス内のLRUには保存しない"""
+        data = self._encode(value) if self._encode is not None else None
+        size = len(data) if data is not None else self._sizer(value)
+
+        if self.backend is not None:
+            try:
+                self.backend.set(self._backend_key(key), data, ttl)
+            except Exception as e:
+                with self._lock:
+                    self.backend_errors += 1
+                print(f"ResponseCache: failed to write {key} to {self.backend.name}: {e}")
+
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        self._store_local(key, _Entry(value, now, now + ttl if ttl is not None else None, size))
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        is_fresh: Optional[Callable[[float], bool]] = None,
+    ) -> Any:
+        """
+        キャッシュがあれば返し、なければ compute() の結果を保存して返す
+
+        計算中に同じキーのリクエストが来た場合は、その計算の完了を待って同じ結果を返す。
+        計算が例外で終わった場合は保存せず、待っていた全てのリクエストに同じ例外を返す。
+        計算を始めたリクエストがキャンセルされても計算は続け、待っているリクエストには結果を返す。
+        共有先の読み書きと is_fresh の確認はファイルや通信を伴うため、イベントループを
+        止めないようにスレッドで実行する。
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            started = time.time()
+            if self._lookup_blocks(key, is_fresh):
+                value = await asyncio.to_thread(self.get, key, is_fresh)
+            else:
+                value = self.get(key, is_fresh)
+            if value is not None:
+                return value
+            # 確認している間に他のリクエストが計算を始めた・終えた場合はその結果を使う
+            future = self._inflight.get(key)
+            if future is None:
+                value = self._stored_since(key, started)
+                if value is not None:
+                    return value
+
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            # 待っている側がキャンセルされても計算中の処理には影響させない
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        # 計算は別のタスクで行い、計算を始めたリクエストがキャンセルされても
+        # 待っている他のリクエストには結果を返す
+        await asyncio.shield(asyncio.ensure_future(self._compute(key, compute, ttl, future)))
+        return future.result()
+
+    async def _compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float],
+        future: asyncio.Future,
+    ) -> None:
+        """compute() の結果（または例外）を future に設定し、結果を保存する"""
+        try:
+            try:
+                value = await compute()
+            except asyncio.CancelledError:
+                future.cancel()
+                return
+            except Exception as e:
+                future.set_exception(e)
+                # 待っているリクエストがない場合に未取得の例外として警告されないようにする
+                future.exception()
+                return
+            # 保存が終わるまでに来たリクエストは完了済みの future から結果を受け取る
+            future.set_result(value)
+            await asyncio.to_thread(self.set, key, value, ttl)
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    def _lookup_blocks(self, key: str, is_fresh: Optional[Callable[[float], bool]]) -> bool:
+        """get が共有先の読み込みか is_fresh の確認を行うかどうか"""
+        if self.backend is not None:
+            return True
+        with self._lock:
+            return is_fresh is not None and key in self._entries
+
+    def _stored_since(self, key: str, since: float) -> Any:
+        """since 以降にプロセス内のLRUに保存された値（ない場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.stored_at < since:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.misses -= 1
+            return entry.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear(self._backend_key(""))
+
+    def stats(self) -> dict:
+        """キャッシュの利用状況（件数・バイト数・ヒット率など）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._inflight),
+                'backend': self.backend.name if self.backend is not None else 'memory',
+                'backend_hits': self.backend_hits,
+                'backend_errors': self.backend_errors,
+            }
@@ -0,0 +1 @@
+"""サービス間で共有する小さなヘルパー"""
@@ -0,0 +1,70 @@
+"""ファイルの変更の検知と書き込みに使うヘルパー"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Any, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間の排他を行わない
+    fcntl = None
+
+# 置き換えたファイルの権限（mkstemp は 0600 で作るため、open() で作った場合と同じにする）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_FILE_MODE = 0o666 & ~_UMASK
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """ファイルの (mtime_ns, size) を返す。存在しない場合はNone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', **kwargs) -> Iterator[IO]:
+    """
+    同じディレクトリの一時ファイルに書き込み、書き終えたら path に置き換える
+
+    一時ファイルは書き込むたびに別の名前で作るため、複数のプロセスが同じファイルを
+    同時に書き込んでも、書きかけの内容で置き換わることはない。
+    失敗した場合は一時ファイルを削除する。
+    置き換えたファイルの権限は open() で作った場合と同じ（umask を適用した 0666）。
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """同じディレクトリの一時ファイルに書き込んでから置き換える"""
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """path のロックファイルでプロセス間の排他を行う（同じプロセスのスレッド間は排他しない）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
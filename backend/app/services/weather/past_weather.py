@@ -1,59 +1,183 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from datetime import date, datetime, timedelta
-from tqdm import tqdm
-import time
+"""
+気象庁の過去の気象データ（1時間ごとの値）を取得して天気CSVに追加する
+
+天気CSVにまだない日（24時間分そろっていない日）のみを取得する。
+取得しても24時間分そろわなかった日は {CSV}.short_days.json に記録し、
+その日から SHORT_DAY_RETRY_DAYS 日が過ぎた後に取得し直してもそろわなければ、以後は取得しない。
+取得は少数のスレッドで並列に行い、全スレッドで共有するトークンバケットで
+気象庁へのリクエストの間隔を保つ。取得した日は CHUNK_DAYS 日ごとに書き込むため、
+途中で止まっても次回は残りの日から再開できる。
+
+python -m app.jobs.fetch_weather_job で実行する（python -m app.services.weather.past_weather でも同じ）。
+"""
+
+import csv
+import json
 import os
-from datetime import datetime
-
-# ====== ここで取得範囲を指定 ======
-prec_no = '52'      # 地点番号 (例: 甲府)
-block_no = '47617'  # ブロック番号 (例: 甲府)
-output_csv = 'app/data/weather/past_weather.csv'
-
-# 今日の日付を取得
-# ▼▼ 修正 ▼▼ import文に合わせて、date.today()で今日の日付を取得します
-today = date.today()
-# 昨日の日付を計算
-end_date = today - timedelta(days=1)
-# 10日前の日付を計算 (開始日)
-start_date = end_date - timedelta(days=10)
-print(f"取得開始日: {start_date}")
-print(f"取得終了日: {end_date}")
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from html import unescape as html_unescape
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.utils.files import atomic_write
+
+# ====== 取得する地点 ======
+PREC_NO = '52'      # 地点番号 (例: 甲府)
+BLOCK_NO = '47617'  # ブロック番号 (例: 甲府)
+OUTPUT_CSV = 'app/data/weather/past_weather.csv'
+JMA_URL = 'https://www.data.jma.go.jp/stats/etrn/view/hourly_s1.php'
+
+# 期間を指定しない場合は昨日までの DEFAULT_DAYS 日前から取得する
+DEFAULT_DAYS = 10
+# 同時に取得する日数と、全体でのリクエスト数の上限（件/秒）
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 2.0
+# この日数を取得するごとにCSVに書き込む
+CHUNK_DAYS = 31
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+REQUEST_TIMEOUT = 15
+# 24時間分そろわなかった日を取得し直す期間（その日からの日数）
+SHORT_DAY_RETRY_DAYS = 7
 # =================================
 
 # 欲しいカラム名（ページの表ヘッダに合わせる）- 日本語
 japanese_target_cols = ['時', '降水量 (mm)', '気温 (℃)', '日照 時間 (h)', '積雪 (cm)', '降雪 (cm)', '天気']
+CSV_COLUMNS = ['日付'] + japanese_target_cols
+HOURS_PER_DAY = 24
 
-def fetch_one_day(year, month, day, prec_no, block_no):
-    """指定された1日分の気象データを気象庁サイトから取得する"""
-    url = (f'https://www.data.jma.go.jp/stats/etrn/view/hourly_s1.php'
-           f'?prec_no={prec_no}&block_no={block_no}&year={year}&month={month}&day={day}&view=p1')
-    try:
-        res = requests.get(url, timeout=15)
-        res.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"URLへのアクセス中にエラーが発生しました: {url} - {e}")
-        return []
-        
-    res.encoding = res.apparent_encoding
-    soup = BeautifulSoup(res.text, 'html.parser')
-    table = soup.find('table', {'id': 'tablefix1'})
-    if not table:
-        print(f"テーブルが見つかりません: {year}-{month:02d}-{day:02d}")
-        return []
 
-    header_rows = table.find_all('tr')[:2]
-    header1 = [th.get_text(strip=True).replace('\n', '') for th in header_rows[0].find_all('th')]
-    header2 = [th.get_text(strip=True).replace('\n', '') for th in header_rows[1].find_all('th')]
+class TokenBucket:
+    """
+    複数のスレッドで共有するトークンバケット
+
+    rate 件/秒でトークンが貯まり、最大 capacity 件まで続けて取得できる。
+    トークンがない場合は貯まるまで待つ。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def create_session(max_workers: int = MAX_WORKERS) -> requests.Session:
+    """接続を使い回すセッション（同時に取得する数だけ接続を保持する）"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# 表の開始タグ（ここから読み取りを始める）
+_TABLE_START = re.compile(r'<table\b[^>]*\bid\s*=\s*["\']?tablefix1["\'\s>]', re.IGNORECASE)
+# コメント・タグ（終了タグかどうか、タグ名、属性）・文字列
+_TOKEN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)([^>]*)>|([^<]+|<)', re.DOTALL)
+_ATTRIBUTE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+
+def _attributes(text: str) -> Dict[str, str]:
+    """タグの属性（値がない属性は空文字）"""
+    return {
+        name.lower(): html_unescape(double or single or bare or '')
+        for name, double, single, bare in _ATTRIBUTE.findall(text)
+    }
+
+
+def _read_hourly_table(html: str) -> Optional[List[List[list]]]:
+    """
+    ページから id="tablefix1" の表の行を取り出す（表がない場合は None）
+
+    表の部分だけを先頭から順に読み、表の終わりで読み取りをやめる。
+    各行はセル（th / td の種類、文字列、colspan、rowspan、最初の画像の alt）のリスト。
+    文字列は BeautifulSoup の get_text(strip=True) と同じく、前後の空白を除いてつなげたもの。
+    colspan・rowspan は表ヘッダ（th）のみ読む。
+    """
+    match = _TABLE_START.search(html)
+    if not match:
+        return None
+
+    rows: List[List[list]] = []
+    row: Optional[List[list]] = None
+    cell: Optional[list] = None
+    depth = 0
+    for end_tag, tag, attrs, data in _TOKEN.findall(html, match.start()):
+        if data:
+            if cell is not None:
+                data = (html_unescape(data) if '&' in data else data).strip()
+                if data:
+                    cell[1].append(data)
+            continue
+        if not tag:
+            continue
+        tag = tag.lower()
+        if end_tag:
+            if tag == 'table':
+                depth -= 1
+                if depth == 0:
+                    break
+            elif tag == 'td' or tag == 'th':
+                cell = None
+            elif tag == 'tr':
+                row = cell = None
+        elif tag == 'td':
+            if row is not None:
+                cell = ['td', [], 1, 1, None]
+                row.append(cell)
+        elif tag == 'img':
+            if cell is not None and cell[4] is None:
+                cell[4] = _attributes(attrs).get('alt', '')
+        elif tag == 'tr':
+            row = []
+            rows.append(row)
+        elif tag == 'th':
+            if row is not None:
+                attributes = _attributes(attrs)
+                cell = ['th', [], int(attributes.get('colspan') or 1), int(attributes.get('rowspan') or 1), None]
+                row.append(cell)
+        elif tag == 'table':
+            depth += 1
+    return rows
+
+
+@lru_cache(maxsize=32)
+def _target_column_indices(layout: tuple) -> Tuple[Optional[int], ...]:
+    """
+    表ヘッダ（2行分の文字列・colspan・rowspan）から対象のカラムの位置を求める
+
+    同じ地点・同じ種類のページはヘッダが同じため、ヘッダごとに1回だけ求める。
+    """
+    header1, header2 = layout
     columns = []
     i2 = 0
-    for th in header_rows[0].find_all('th'):
-        colspan = int(th.get('colspan', 1))
-        rowspan = int(th.get('rowspan', 1))
+    for text, colspan, rowspan in header1:
         if rowspan == 2:
-            columns.append(th.get_text(strip=True).replace('\n', ''))
+            columns.append(text)
         else:
             for _ in range(colspan):
                 columns.append(header2[i2])
@@ -66,128 +190,283 @@ def fetch_one_day(year, month, day, prec_no, block_no):
                 found_index = i
                 break
         col_indices.append(found_index)
-    
+    return tuple(col_indices)
+
+
+def parse_hourly_table(html: str, year: int, month: int, day: int) -> List[List[str]]:
+    """1日分のページの表から対象の列を取り出す（先頭は日付の列）"""
+    rows = _read_hourly_table(html)
+    if rows is None or len(rows) < 2:
+        print(f"テーブルが見つかりません: {year}-{month:02d}-{day:02d}")
+        return []
+
+    header_rows = [[cell for cell in row if cell[0] == 'th'] for row in rows[:2]]
+    layout = (
+        tuple((''.join(cell[1]).replace('\n', ''), cell[2], cell[3]) for cell in header_rows[0]),
+        tuple(''.join(cell[1]).replace('\n', '') for cell in header_rows[1]),
+    )
+    col_indices = _target_column_indices(layout)
+    weather_index = japanese_target_cols.index('天気')
+    date_str = f'{year}-{month:02d}-{day:02d}'
+
     all_data = []
-    data_rows = table.find_all('tr')[2:]
-    for tr in data_rows:
-        if tr.find('th'):
+    for row in rows[2:]:
+        if any(cell[0] == 'th' for cell in row):
             continue
-        tds = tr.find_all('td')
-        if not tds:
+        if not row:
             continue
-        row = []
+        values = [date_str]
         for idx, col_idx in enumerate(col_indices):
-            if col_idx is not None and col_idx < len(tds):
-                if japanese_target_cols[idx] == '天気':
-                    img = tds[col_idx].find('img')
-                    row.append(img['alt'] if img and 'alt' in img.attrs else '')
-                else:
-                    row.append(tds[col_idx].get_text(strip=True))
+            if col_idx is None or col_idx >= len(row):
+                values.append('')
+            elif idx == weather_index:
+                values.append(row[col_idx][4] or '')
             else:
-                row.append('')
-        row = [f'{year}-{month:02d}-{day:02d}'] + row
-        all_data.append(row)
+                values.append(''.join(row[col_idx][1]))
+        all_data.append(values)
 
     return all_data
 
-# --- メイン処理 ---
-# 1. 既存CSV読み込み
-existing_df = pd.DataFrame()
-if os.path.exists(output_csv):
+
+def fetch_one_day(
+    year: int,
+    month: int,
+    day: int,
+    prec_no: str = PREC_NO,
+    block_no: str = BLOCK_NO,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    max_retries: int = MAX_RETRIES,
+    backoff: float = RETRY_BACKOFF,
+) -> List[List[str]]:
+    """
+    指定された1日分の気象データを気象庁サイトから取得する
+
+    失敗した場合は待ち時間を倍にしながら再試行し、それでも取得できなければ空のリストを返す
+    （CSVには書き込まないため、次回の実行で再度取得する）。
+    """
+    session = session or requests
+    params = {
+        'prec_no': prec_no, 'block_no': block_no,
+        'year': year, 'month': month, 'day': day, 'view': 'p1',
+    }
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            res = session.get(JMA_URL, params=params, timeout=REQUEST_TIMEOUT)
+            res.raise_for_status()
+            break
+        except requests.exceptions.RequestException as e:
+            if attempt == max_retries:
+                print(f"URLへのアクセス中にエラーが発生しました: {year}-{month:02d}-{day:02d} - {e}")
+                return []
+            wait_sec = backoff * (2 ** attempt)
+            print(f"{year}-{month:02d}-{day:02d} の取得に失敗しました（{attempt + 1}回目）: {e} / {wait_sec:.1f}秒後に再試行します")
+            time.sleep(wait_sec)
+
+    res.encoding = res.apparent_encoding
+    return parse_hourly_table(res.text, year, month, day)
+
+
+def normalize_rows(rows: Iterable[List[str]]) -> List[List[str]]:
+    """
+    取得した行の '時' を天気CSVの表記にそろえ、日付・時刻順に並べる
+
+    24時は同じ日の0時として扱い、同じ日付・時刻の行は後のものを残す。
+    """
+    by_key: Dict[tuple, List[str]] = {}
+    for row in rows:
+        hour = str(row[1]).replace('時', '').strip()
+        hour = '0' if hour == '24' else hour
+        if not hour.isdigit():
+            continue
+        by_key[(row[0], int(hour))] = [row[0], f"{int(hour)}時"] + list(row[2:])
+    return [by_key[key] for key in sorted(by_key)]
+
+
+def existing_day_counts(output_csv: str = OUTPUT_CSV) -> Dict[str, int]:
+    """天気CSVにある日ごとの行数"""
+    if not os.path.exists(output_csv):
+        return {}
     try:
-        existing_df = pd.read_csv(output_csv, encoding='utf-8-sig', dtype={'時': str})
-        print(f'既存のCSV "{output_csv}" を読み込みました。現在の行数: {len(existing_df)}')
+        dates = pd.read_csv(output_csv, encoding='utf-8-sig', usecols=['日付'], dtype=str)['日付']
     except Exception as e:
         print(f'既存のCSV "{output_csv}" の読み込み中にエラーが発生しました: {e}')
-        existing_df = pd.DataFrame()
-
-# ▼▼▼【修正箇所】ダウンロード対象日の決定ロジックを変更 ▼▼▼
-# 既存の日付チェックをやめ、指定された範囲を常にダウンロード対象とする
-print(f"指定された期間 ({start_date} から {end_date}) のデータを取得・更新します。")
-dates_to_fetch = []
-dt = start_date
-dt_end = end_date
-while dt <= dt_end:
-    dates_to_fetch.append((dt.year, dt.month, dt.day))
-    dt += timedelta(days=1)
-# ▲▲▲ 修正ここまで ▲▲▲
-
-# 3. データ取得
-# 3. データ取得
-new_data_rows = []
-if dates_to_fetch:
-    print(f"{len(dates_to_fetch)}日分のデータを取得します...")
-    for y, m, d in tqdm(dates_to_fetch):
-        try:
-            day_data = fetch_one_day(y, m, d, prec_no, block_no)
-            print(f"{y}-{m}-{d} 取得件数: {len(day_data)}")
-            if day_data:
-                new_data_rows.extend(day_data)
-            time.sleep(1)
-        except Exception as e:
-            print(f'{y}-{m:02d}-{d:02d} のデータ取得中にエラーが発生しました: {e}')
-    print(f"全取得件数: {len(new_data_rows)}")
-else:
-    print("指定された期間に、取得対象のデータはありませんでした。")
-
-
-# 4. データ結合と事前重複排除
-if new_data_rows:
-    new_data_df = pd.DataFrame(new_data_rows, columns=['日付'] + japanese_target_cols)
-    combined_df = pd.concat([existing_df, new_data_df], ignore_index=True)
-    print(f"{len(new_data_rows)}行の新しいデータを取得しました。")
-else:
-    combined_df = existing_df.copy()
-
-if not combined_df.empty and '日付' in combined_df.columns and '時' in combined_df.columns:
-    # '時'列の表記（'1時'と'1'）を統一
-    combined_df['時'] = combined_df['時'].astype(str).str.replace('時', '').str.strip()
-    # 日付と時刻をキーにして重複を削除。keep='last'で常に新しいデータを優先する
-    combined_df.drop_duplicates(subset=['日付', '時'], keep='last', inplace=True)
-    print(f"重複排除後の行数: {len(combined_df)}")
-
-if not combined_df.empty and '日付' in combined_df.columns and '時' in combined_df.columns:
-    # '時'列の表記（'1時'と'1'）を統一
-    combined_df['時'] = combined_df['時'].astype(str).str.replace('時', '').str.strip()
-    # 24時を0時に変換
-    combined_df['時'] = combined_df['時'].replace({'24': '0'})
-    # 日付と時刻をキーにして重複を削除。keep='last'で常に新しいデータを優先する
-    combined_df.drop_duplicates(subset=['日付', '時'], keep='last', inplace=True)
-    print(f"重複排除後の行数: {len(combined_df)}")
-
-
-# 5. 結合したDataFrameの整形、ソート、保存
-if not combined_df.empty:
-    # --- 処理の安定化：主要な列を文字列に統一 ---
-    combined_df['日付'] = combined_df['日付'].astype(str)
-    combined_df['時'] = combined_df['時'].astype(str)
-
-    # --- 一時的な作業列を作成 ---
-    hour_numeric = pd.to_numeric(combined_df['時'], errors='coerce')
-    date_dt = pd.to_datetime(combined_df['日付'], errors='coerce')
-
-    # --- 24時の処理 ---
-    is_24h = (hour_numeric == 24)
-    valid_dates_for_24h = is_24h & date_dt.notna()
-    date_dt.loc[valid_dates_for_24h] = date_dt.loc[valid_dates_for_24h] + pd.to_timedelta(1, unit='d')
-    hour_numeric.loc[is_24h] = 0
-
-    # --- 不正な行の除外 ---
-    combined_df['temp_date'] = date_dt
-    combined_df['temp_hour'] = hour_numeric
-    valid_df = combined_df.dropna(subset=['temp_date', 'temp_hour']).copy()
-
-    # --- 有効なデータのみをソート ---
-    valid_df.sort_values(by=['temp_date', 'temp_hour'], inplace=True, ascending=True)
-
-    # --- 表示用列の再構築 ---
-    valid_df['日付'] = valid_df['temp_date'].dt.strftime('%Y-%m-%d')
-    valid_df['時'] = valid_df['temp_hour'].astype(int).astype(str) + '時'
-    
-    # --- 最終的なDataFrameの作成 ---
-    final_df = valid_df[['日付'] + japanese_target_cols].copy()
-    
-    final_df.to_csv(output_csv, index=False, encoding='utf-8-sig')
-    print(f'データを更新し、"{output_csv}" を日付時間順・日本語列名で保存しました。総行数: {len(final_df)}')
-else:
-    print('処理対象のデータがありませんでした。CSVファイルは変更されませんでした。')
+        return {}
+    return dates.value_counts().to_dict()
+
+
+def short_days_path(output_csv: str = OUTPUT_CSV) -> str:
+    return f"{output_csv}.short_days.json"
+
+
+def read_short_days(output_csv: str = OUTPUT_CSV) -> Dict[str, str]:
+    """24時間分そろわなかった日と、最後に取得した日付 {日付: 取得した日付}"""
+    try:
+        with open(short_days_path(output_csv), encoding='utf-8') as f:
+            return {str(day): str(attempted) for day, attempted in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f'"{short_days_path(output_csv)}" の読み込み中にエラーが発生しました: {e}')
+        return {}
+
+
+def write_short_days(output_csv: str, short_days: Dict[str, str]) -> None:
+    """24時間分そろわなかった日を保存する（保存できなかった場合は次回も取得する）"""
+    path = short_days_path(output_csv)
+    try:
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(short_days.items())), f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f'"{path}" の書き込み中にエラーが発生しました: {e}')
+
+
+def missing_days(
+    start_date: date,
+    end_date: date,
+    day_counts: Dict[str, int],
+    short_days: Optional[Dict[str, str]] = None,
+) -> List[date]:
+    """
+    start_date〜end_date のうち、24時間分そろっていない日
+
+    その日から SHORT_DAY_RETRY_DAYS 日が過ぎた後に取得してもそろわなかった日は除く
+    （気象庁のデータに欠けがあり、取得し直してもそろわない日）。
+    """
+    short_days = short_days or {}
+    days = []
+    current = start_date
+    while current <= end_date:
+        key = current.strftime('%Y-%m-%d')
+        attempted = short_days.get(key)
+        given_up = attempted is not None and date.fromisoformat(attempted) - current >= timedelta(days=SHORT_DAY_RETRY_DAYS)
+        if day_counts.get(key, 0) < HOURS_PER_DAY and not given_up:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def _read_last_date(path: str) -> str:
+    """天気CSVの最終行の日付（ヘッダのみの場合は空文字）"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - 4096, 0))
+        lines = f.read().splitlines()
+    last_line = lines[-1].decode('utf-8-sig') if lines else ''
+    return '' if last_line.startswith('日付') else last_line[:10]
+
+
+def write_rows(output_csv: str, rows: List[List[str]], day_counts: Dict[str, int]) -> str:
+    """
+    日付・時刻順の行を天気CSVに反映し、反映方法（create / append / merge）を返す
+
+    取得した日が全て既存の最終日より後であれば末尾に追記する。
+    途中までしかない日や過去の日を取得した場合は、その日の行を差し替えて日付・時刻順に書き直す。
+    """
+    if not os.path.exists(output_csv):
+        with atomic_write(output_csv, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(rows)
+        return 'create'
+
+    new_dates = sorted({row[0] for row in rows})
+    if not any(day_counts.get(d) for d in new_dates) and new_dates[0] > _read_last_date(output_csv):
+        with open(output_csv, 'a', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(rows)
+        return 'append'
+
+    existing = pd.read_csv(output_csv, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    existing = existing[~existing['日付'].isin(new_dates)]
+    combined = pd.concat([existing, pd.DataFrame(rows, columns=CSV_COLUMNS)], ignore_index=True)
+    hours = pd.to_numeric(combined['時'].str.replace('時', ''), errors='coerce')
+    combined = combined.assign(_hour=hours).sort_values(['日付', '_hour'], kind='stable').drop(columns='_hour')
+    with atomic_write(output_csv, 'w', encoding='utf-8-sig', newline='') as f:
+        combined.to_csv(f, index=False)
+    return 'merge'
+
+
+def run_fetch_weather(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    output_csv: str = OUTPUT_CSV,
+    max_workers: int = MAX_WORKERS,
+    requests_per_second: float = REQUESTS_PER_SECOND,
+    session: Optional[requests.Session] = None,
+    chunk_days: int = CHUNK_DAYS,
+    today: Optional[date] = None,
+) -> dict:
+    """
+    start_date〜end_date のうち天気CSVにない日を取得して反映する
+
+    期間を省略した場合は昨日と、その DEFAULT_DAYS 日前まで。
+    """
+    started = time.perf_counter()
+    today = today or date.today()
+    end_date = end_date or today - timedelta(days=1)
+    start_date = start_date or end_date - timedelta(days=DEFAULT_DAYS)
+
+    day_counts = existing_day_counts(output_csv)
+    short_days = read_short_days(output_csv)
+    targets = missing_days(start_date, end_date, day_counts, short_days)
+    print(f"取得期間: {start_date} から {end_date}（未取得の日: {len(targets)}日）")
+
+    session = session or create_session(max_workers)
+    limiter = TokenBucket(requests_per_second)
+    result = {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'missing_days': len(targets),
+        'fetched_days': 0,
+        'failed_days': [],
+        'short_days': [],
+        'rows_written': 0,
+        'writes': [],
+    }
+
+    def fetch(day: date) -> List[List[str]]:
+        return fetch_one_day(day.year, day.month, day.day, session=session, limiter=limiter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i in range(0, len(targets), chunk_days):
+            chunk = targets[i:i + chunk_days]
+            rows = []
+            for day, day_rows in zip(chunk, executor.map(fetch, chunk)):
+                if day_rows:
+                    result['fetched_days'] += 1
+                    rows.extend(day_rows)
+                else:
+                    result['failed_days'].append(day.isoformat())
+
+            rows = normalize_rows(rows)
+            if rows:
+                mode = write_rows(output_csv, rows, day_counts)
+                result['writes'].append(mode)
+                result['rows_written'] += len(rows)
+                # 取得した日の行は全て差し替えるため、その日の行数は取得した行数になる
+                new_counts = pd.Series([row[0] for row in rows]).value_counts().to_dict()
+                day_counts.update(new_counts)
+                recorded = dict(short_days)
+                for day, count in sorted(new_counts.items()):
+                    if count < HOURS_PER_DAY:
+                        short_days[day] = today.isoformat()
+                        result['short_days'].append(day)
+                    else:
+                        short_days.pop(day, None)
+                if short_days != recorded:
+                    write_short_days(output_csv, short_days)
+                print(f"{chunk[0]}〜{chunk[-1]}: {len(rows)}行を反映しました（{mode}）")
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    print(
+        f"全取得件数: {result['rows_written']}行 / 取得できなかった日: {len(result['failed_days'])}日"
+        f" / 24時間分そろわなかった日: {len(result['short_days'])}日"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    run_fetch_weather()
@@ -1,257 +1,534 @@
+import hashlib
+import json
+import numpy as np
 import pandas as pd
-import os
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import threading
+import time
+from typing import Callable, List, Dict, Optional, Any, Tuple
+
+from app.core.config import settings
+from app.services.utils.files import file_signature, write_json_atomic
+
+WEATHER_DATA_PATH = "app/data/weather/past_weather.csv"
+
+# 曜日別・日付別の時間帯データの対象（7時から22時まで）
+HOURS = range(7, 23)
+
+
+class _Groups:
+    """
+    行をキーごとにまとめた区切り
+
+    キーで安定に並べ替えるため、各グループの中は元の順のまま。
+    合計は同じ件数のグループを (グループ数, 件数) の行列にまとめて行ごとに np.sum し、
+    グループごとに Series.sum() / mean() を呼んだ場合と同じ順で足し合わせる
+    （np.add.reduceat は足し合わせる順が異なり、丸めた結果が変わることがある）。
+    """
+
+    def __init__(self, keys: np.ndarray):
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        self.starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else np.array([], dtype=int)
+        self.keys = sorted_keys[self.starts]
+        self.sizes = np.diff(np.append(self.starts, len(keys)))
+
+    def _sum(self, values: np.ndarray) -> np.ndarray:
+        """並べ替え済みの値のグループごとの合計"""
+        sums = np.zeros(len(self.starts), dtype=values.dtype)
+        for size in np.unique(self.sizes):
+            groups = np.flatnonzero(self.sizes == size)
+            sums[groups] = values[self.starts[groups, None] + np.arange(size)].sum(axis=1)
+        return sums
+
+    def mode(self, codes: np.ndarray, categories: np.ndarray) -> np.ndarray:
+        """グループごとに最も多いカテゴリ（同数の場合は並べ替えて最初のもの）"""
+        group_ids = np.repeat(np.arange(len(self.starts)), self.sizes)
+        counts = np.bincount(
+            group_ids * len(categories) + codes[self.order],
+            minlength=len(self.starts) * len(categories),
+        ).reshape(len(self.starts), len(categories))
+        return categories[counts.argmax(axis=1)]
+
+    def nansum(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """グループごとの欠損値を除いた (合計, 件数)"""
+        values = values[self.order]
+        valid = ~np.isnan(values)
+        return self._sum(np.where(valid, values, 0.0)), self._sum(valid.astype(np.int64))
+
+    def nanmean(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """グループごとの欠損値を除いた (平均, 件数)"""
+        sums, counts = self.nansum(values)
+        return np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0), counts
+
+
+def _rounded(values: np.ndarray, counts: np.ndarray) -> List[Optional[np.float64]]:
+    """小数第1位に丸めた値（全て欠損のグループはNone）"""
+    rounded = np.round(values, 1)
+    return [rounded[i] if counts[i] else None for i in range(len(values))]
+
+
+def _value(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+class WeatherIndex:
+    """
+    天気データを (年, 月) ごとにまとめた配列
+
+    読み込み時に行を年月順に並べ替えた（同じ月の中は元の順のまま）配列を作り、
+    各取得メソッドは該当する月の範囲を切り出して組み立てる。
+    日別・曜日×時間別のサマリーは全期間分を読み込み時にまとめて集計しておく。
+    月ごとの結果は保持して使い回すため、返した値は呼び出し元で変更しないこと。
+
+    読み込み直した場合は previous（前の索引）と月ごとに行を比べ、
+    変わっていない月は前の索引で作成済みの結果を引き継ぐ。
+    月ごとの更新時刻は、stamps（保存済みの {(年, 月): (行のダイジェスト, 更新時刻)}）か
+    previous と行が同じ月はその時刻を引き継ぎ、それ以外の月は updated_at とする。
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        updated_at: float = 0.0,
+        previous: Optional['WeatherIndex'] = None,
+        stamps: Optional[Dict[Tuple[int, int], Tuple[str, float]]] = None,
+    ):
+        dt = df['datetime']
+        month_keys = (dt.dt.year * 12 + dt.dt.month - 1).to_numpy()
+        order = np.argsort(month_keys, kind='stable')
+        month_keys = month_keys[order]
+
+        self.day = dt.dt.day.to_numpy()[order]
+        self.hour = dt.dt.hour.to_numpy()[order]
+        self.weekday = dt.dt.weekday.to_numpy()[order]
+        self.weather = df['weather'].to_numpy(dtype=object)[order]
+        self.temperature = df['tempriture'].to_numpy(dtype=float)[order]
+        self.rain = df['rain'].to_numpy(dtype=float)[order]
+        self.sun = df['sun'].to_numpy(dtype=float)[order]
+        self.datetime = dt.to_numpy()[order]
+        # 月ごとの変更の検出に使う行ごとのハッシュ値
+        self._row_hashes = pd.util.hash_pandas_object(
+            df[['datetime', 'weather', 'tempriture', 'rain', 'sun']], index=False
+        ).to_numpy()[order]
+
+        # {(年, 月): (開始位置, 終了位置)}
+        keys, starts = np.unique(month_keys, return_index=True)
+        ends = np.append(starts[1:], len(month_keys))
+        self._months: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (int(key) // 12, int(key) % 12 + 1): (int(start), int(end))
+            for key, start, end in zip(keys, starts, ends)
+        }
+        self._results: Dict[Tuple[str, int, int], Any] = {}
+        # {(年, 月): その月の行のダイジェスト}
+        self._digests = {
+            key: hashlib.sha1(self._row_hashes[start:end].tobytes()).hexdigest()
+            for key, (start, end) in self._months.items()
+        }
+        # {(年, 月): その月のデータが最後に変わった時刻}
+        self.month_updates: Dict[Tuple[int, int], float] = {}
+        self._stamp_months(stamps or {}, previous, updated_at)
+        self.changed_months: List[Tuple[int, int]] = []
+        if previous is not None:
+            self._inherit(previous)
+
+        # 天気はカテゴリの番号（並べ替えた順）で持ち、最頻値は件数の行列から求める
+        self._categories, self._weather_codes = np.unique(self.weather.astype(str), return_inverse=True)
+        self._categories = self._categories.astype(object)
+        self._month_keys = month_keys
+        self._daily = self._build_daily_summaries()
+        self._week_time = self._build_week_time_summaries()
+
+    def _digest(self, key: Tuple[int, int]) -> str:
+        """月の行のダイジェスト（データがない月は空文字列）"""
+        return self._digests.get(key, "")
+
+    def _stamp_months(
+        self,
+        stamps: Dict[Tuple[int, int], Tuple[str, float]],
+        previous: Optional['WeatherIndex'],
+        updated_at: float,
+    ) -> None:
+        """
+        月ごとの更新時刻を決める
+
+        同じCSVを読み込んだワーカーが同じ時刻を返すよう、行が変わっていない月は
+        保存済みの時刻を使い、追加・変更された月とデータがなくなった月は updated_at とする。
+        """
+        keys = set(self._months) | set(stamps)
+        if previous is not None:
+            keys |= set(previous.month_updates)
+        for key in sorted(keys):
+            digest = self._digest(key)
+            if key in stamps and stamps[key][0] == digest:
+                self.month_updates[key] = stamps[key][1]
+            elif previous is not None and key in previous.month_updates and previous._digest(key) == digest:
+                self.month_updates[key] = previous.month_updates[key]
+            else:
+                self.month_updates[key] = updated_at
+
+    def month_stamps(self) -> Dict[Tuple[int, int], Tuple[str, float]]:
+        """保存する {(年, 月): (行のダイジェスト, 更新時刻)}"""
+        return {key: (self._digest(key), updated_at) for key, updated_at in self.month_updates.items()}
+
+    def _inherit(self, previous: 'WeatherIndex') -> None:
+        """行が変わっていない月の作成済みの結果を前の索引から引き継ぐ"""
+        for key in sorted(set(self._months) | set(previous._months)):
+            if self._digest(key) != previous._digest(key):
+                # 追加・変更された月と、データがなくなった月
+                self.changed_months.append(key)
+
+        changed = set(self.changed_months)
+        self._results = {
+            result_key: result
+            # 他のスレッドが追加している途中でも読めるよう、複製してから取り出す
+            for result_key, result in dict(previous._results).items()
+            if result_key[1:] not in changed
+        }
+
+    def updated_at(self, year: Optional[int] = None, month: Optional[int] = None) -> float:
+        """指定年月（省略した場合は全期間）のデータが最後に変わった時刻"""
+        if year is None or month is None:
+            return max(self.month_updates.values(), default=0.0)
+        return self.month_updates.get((year, month), 0.0)
+
+    def _build_daily_summaries(self) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+        """全期間の日別サマリー（最も頻繁な天気・平均気温・降水量の合計）を年月ごとに作成する"""
+        groups = _Groups(self._month_keys * 32 + self.day)
+        weather = groups.mode(self._weather_codes, self._categories)
+        avg_temperature = _rounded(*groups.nanmean(self.temperature))
+        total_rain = _rounded(*groups.nansum(self.rain))
+
+        daily: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        for i, key in enumerate(groups.keys.tolist()):
+            year, month, day = key // 32 // 12, key // 32 % 12 + 1, key % 32
+            daily.setdefault((year, month), []).append({
+                'day': day,
+                'date': f"{year}-{month:02d}-{day:02d}",
+                'weather': weather[i],
+                'avg_temperature': avg_temperature[i],
+                'total_rain': total_rain[i],
+            })
+        return daily
+
+    def _build_week_time_summaries(self) -> Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]]:
+        """全期間の曜日別・時間別サマリー（7時から22時まで）を年月ごとに作成する"""
+        week_time: Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]] = {}
+        # データがある曜日は、対象の時間帯のデータがなくても空のリストとする
+        for key in np.unique(self._month_keys * 7 + self.weekday).tolist():
+            week_time.setdefault((key // 7 // 12, key // 7 % 12 + 1), {})[key % 7] = []
+
+        in_hours = (self.hour >= HOURS.start) & (self.hour < HOURS.stop)
+        groups = _Groups(((self._month_keys * 7 + self.weekday) * 24 + self.hour)[in_hours])
+        weather = groups.mode(self._weather_codes[in_hours], self._categories)
+        avg_temperature = _rounded(*groups.nanmean(self.temperature[in_hours]))
+        avg_rain = _rounded(*groups.nanmean(self.rain[in_hours]))
+
+        for i, key in enumerate(groups.keys.tolist()):
+            month_key, weekday, hour = key // 24 // 7, key // 24 % 7, key % 24
+            week_time[(month_key // 12, month_key % 12 + 1)][weekday].append({
+                'hour': hour,
+                'weather': weather[i],
+                'avg_temperature': avg_temperature[i],
+                'avg_rain': avg_rain[i],
+            })
+        return week_time
+
+    def _memo(self, name: str, year: int, month: int, build: Callable[[slice], Any], empty: Any) -> Any:
+        """月ごとの結果を初回だけ作成する（データがない月は empty）"""
+        key = (name, year, month)
+        result = self._results.get(key)
+        if result is None:
+            bounds = self._months.get((year, month))
+            result = build(slice(*bounds)) if bounds else empty
+            self._results[key] = result
+        return result
+
+    def _day_groups(self, rows: slice) -> List[Tuple[int, np.ndarray]]:
+        """月の中の日ごとの行位置（元データに現れる順）"""
+        days = self.day[rows]
+        unique_days, first = np.unique(days, return_index=True)
+        return [
+            (int(day), np.flatnonzero(days == day) + rows.start)
+            for day in unique_days[np.argsort(first)]
+        ]
+
+    def date_range(self, year: int, month: int) -> List[Dict[str, Any]]:
+        def build(rows: slice) -> List[Dict[str, Any]]:
+            datetimes = pd.DatetimeIndex(self.datetime[rows])
+            return [
+                {
+                    'date': date_str,
+                    'time': time_str,
+                    'hour': hour,
+                    'day': day,
+                    'weather': weather,
+                    'temperature': _value(temperature),
+                    'rain': _value(rain),
+                    'sun': _value(sun),
+                }
+                for date_str, time_str, hour, day, weather, temperature, rain, sun in zip(
+                    datetimes.strftime('%Y-%m-%d'), datetimes.strftime('%H:%M'), self.hour[rows].tolist(), self.day[rows].tolist(),
+                    self.weather[rows], self.temperature[rows].tolist(), self.rain[rows].tolist(), self.sun[rows].tolist(),
+                )
+            ]
+        return self._memo('date_range', year, month, build, [])
+
+    def daily_summary(self, year: int, month: int) -> List[Dict[str, Any]]:
+        return self._daily.get((year, month), [])
+
+    def hourly_for_day(self, year: int, month: int, day: int) -> List[Dict[str, Any]]:
+        def build(rows: slice) -> Dict[int, List[Dict[str, Any]]]:
+            by_day = {}
+            for day_num, positions in self._day_groups(rows):
+                # 時間順（同じ時間は元の順）
+                positions = positions[np.argsort(self.hour[positions], kind='stable')]
+                by_day[day_num] = [
+                    {
+                        'hour': hour,
+                        'weather': weather,
+                        'temperature': _value(temperature),
+                        'rain': _value(rain),
+                        'sun': _value(sun),
+                    }
+                    for hour, weather, temperature, rain, sun in zip(
+                        self.hour[positions].tolist(), self.weather[positions], self.temperature[positions].tolist(),
+                        self.rain[positions].tolist(), self.sun[positions].tolist(),
+                    )
+                ]
+            return by_day
+        return self._memo('hourly', year, month, build, {}).get(day, [])
+
+    def week_time(self, year: int, month: int) -> Dict[int, List[Dict[str, Any]]]:
+        return self._week_time.get((year, month), {})
+
+    def date_time(self, year: int, month: int) -> Dict[int, List[Dict[str, Any]]]:
+        def build(rows: slice) -> Dict[int, List[Dict[str, Any]]]:
+            date_weather = {}
+            for day, positions in self._day_groups(rows):
+                # 時間ごとに最後に現れるデータ
+                latest = {hour: position for hour, position in zip(self.hour[positions].tolist(), positions)}
+                hourly_weather = []
+                for hour in HOURS:
+                    position = latest.get(hour)
+                    if position is None:
+                        continue
+                    hourly_weather.append({
+                        'hour': hour,
+                        'weather': self.weather[position],
+                        'temperature': _value(self.temperature[position]),
+                        'rain': _value(self.rain[position]),
+                    })
+                date_weather[day] = hourly_weather
+            return date_weather
+        return self._memo('date_time', year, month, build, {})
+
 
 class WeatherService:
-    def __init__(self):
-        self.weather_data_path = "app/data/weather/past_weather.csv"
+    """
+    天気データの取得
+
+    past_weather.py が天気CSVに行を追加した場合も再起動せずに反映できるよう、
+    取得のたびに（reload_interval 秒に1回まで）ファイルの (mtime, size) を確認し、
+    変わっていればバックグラウンドのスレッドで索引を作り直して差し替える。
+    作り直している間と失敗した場合は、それまでの索引で応答する。
+
+    月ごとの更新時刻は行のダイジェストとともに stamps_path（省略した場合は天気CSVの隣の
+    {CSV}.months.json）に保存し、起動したばかりのワーカーも、行が変わっていない月は
+    前に記録した時刻を返す。
+    """
+
+    def __init__(
+        self,
+        weather_data_path: str = WEATHER_DATA_PATH,
+        reload_interval: Optional[float] = None,
+        stamps_path: Optional[str] = None,
+    ):
+        self.weather_data_path = weather_data_path
+        self.stamps_path = stamps_path or f"{weather_data_path}.months.json"
+        self.reload_interval = settings.WEATHER_RELOAD_INTERVAL if reload_interval is None else reload_interval
         self._weather_df = None
+        self._index: Optional[WeatherIndex] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._reloading: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
         self._load_weather_data()
     
-    def _load_weather_data(self):
-        """天気データをロードする"""
-        if os.path.exists(self.weather_data_path):
-            try:
-                self._weather_df = pd.read_csv(self.weather_data_path)
-                print(f"CSV columns: {self._weather_df.columns.tolist()}")
-                print(f"CSV shape: {self._weather_df.shape}")
-                
-                # 日付と時刻の変換（実際の列名に合わせて）
-                self._weather_df['datetime'] = pd.to_datetime(
-                    self._weather_df['日付'] + ' ' + self._weather_df['時'].str.replace('時', ':00'),
-                    format='%Y-%m-%d %H:%M'
-                )
-                
-                # 気温データのクリーンアップ
-                self._weather_df['tempriture'] = pd.to_numeric(self._weather_df['気温 (℃)'], errors='coerce')
-                
-                # 降水量データのクリーンアップ（'--'を欠損値として扱う）
-                self._weather_df['rain'] = self._weather_df['降水量 (mm)'].replace('--', None)
-                self._weather_df['rain'] = pd.to_numeric(self._weather_df['rain'], errors='coerce')
-                
-                # 日照時間データのクリーンアップ
-                self._weather_df['sun'] = pd.to_numeric(self._weather_df['日照 時間 (h)'], errors='coerce')
-                
-                # 天気データを標準化された列名にコピー
-                self._weather_df['weather'] = self._weather_df['天気']
-                
-                # 天気データが存在する行のみ保持
-                self._weather_df = self._weather_df.dropna(subset=['weather'])
-                
-                print(f"Weather data loaded successfully: {len(self._weather_df)} records")
-                print(f"Date range: {self._weather_df['datetime'].min()} to {self._weather_df['datetime'].max()}")
-                
-            except Exception as e:
-                print(f"Error loading weather data: {e}")
-                print(f"Error details: {type(e).__name__}: {str(e)}")
-                self._weather_df = None
-        else:
+    def _read_weather_df(self) -> pd.DataFrame:
+        """天気CSVを読み込み、列を整える"""
+        weather_df = pd.read_csv(self.weather_data_path)
+        print(f"CSV columns: {weather_df.columns.tolist()}")
+        print(f"CSV shape: {weather_df.shape}")
+        
+        # 日付と時刻の変換（実際の列名に合わせて）
+        weather_df['datetime'] = pd.to_datetime(
+            weather_df['日付'] + ' ' + weather_df['時'].str.replace('時', ':00'),
+            format='%Y-%m-%d %H:%M'
+        )
+        
+        # 気温データのクリーンアップ
+        weather_df['tempriture'] = pd.to_numeric(weather_df['気温 (℃)'], errors='coerce')
+        
+        # 降水量データのクリーンアップ（'--'を欠損値として扱う）
+        weather_df['rain'] = weather_df['降水量 (mm)'].replace('--', None)
+        weather_df['rain'] = pd.to_numeric(weather_df['rain'], errors='coerce')
+        
+        # 日照時間データのクリーンアップ
+        weather_df['sun'] = pd.to_numeric(weather_df['日照 時間 (h)'], errors='coerce')
+        
+        # 天気データを標準化された列名にコピー
+        weather_df['weather'] = weather_df['天気']
+        
+        # 天気データが存在する行のみ保持
+        return weather_df.dropna(subset=['weather'])
+
+    def _read_stamps(self) -> Dict[Tuple[int, int], Tuple[str, float]]:
+        """保存済みの月ごとの (行のダイジェスト, 更新時刻)。読み込めない場合は空"""
+        try:
+            with open(self.stamps_path, encoding='utf-8') as f:
+                data = json.load(f)
+            return {
+                (int(key[:4]), int(key[5:7])): (str(entry["hash"]), float(entry["updated_at"]))
+                for key, entry in data.items()
+            }
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error reading weather month stamps: {e}")
+            return {}
+
+    def _write_stamps(self, stamps: Dict[Tuple[int, int], Tuple[str, float]]) -> None:
+        """月ごとの (行のダイジェスト, 更新時刻) を保存する（失敗した場合はこのワーカーの中だけで使う）"""
+        data = {
+            f"{year:04d}-{month:02d}": {"hash": digest, "updated_at": updated_at}
+            for (year, month), (digest, updated_at) in sorted(stamps.items())
+        }
+        try:
+            write_json_atomic(self.stamps_path, data)
+        except Exception as e:
+            print(f"Error writing weather month stamps: {e}")
+
+    def _load_weather_data(self) -> bool:
+        """
+        天気データをロードし、年月ごとの索引を作成して差し替える
+
+        読み込み直す場合に失敗したときは、それまでのデータを使い続ける。
+        """
+        # 読み込み中に書き込まれた場合に次の確認で検知できるよう、読み込む前の状態を記録する
+        signature = file_signature(self.weather_data_path)
+        if signature is None:
             print(f"Weather data file not found: {self.weather_data_path}")
-            self._weather_df = None
+            return False
+
+        try:
+            weather_df = self._read_weather_df()
+            stamps = self._read_stamps()
+            index = WeatherIndex(weather_df, updated_at=signature[0] / 1e9, previous=self._index, stamps=stamps)
+        except Exception as e:
+            print(f"Error loading weather data: {e}")
+            print(f"Error details: {type(e).__name__}: {str(e)}")
+            return False
+
+        if index.month_stamps() != stamps:
+            self._write_stamps(index.month_stamps())
+
+        with self._lock:
+            self._weather_df, self._index, self._signature = weather_df, index, signature
+
+        print(f"Weather data loaded successfully: {len(weather_df)} records")
+        print(f"Date range: {weather_df['datetime'].min()} to {weather_df['datetime'].max()}")
+        if index.changed_months:
+            print(f"Weather data reloaded: {len(index.changed_months)} months changed")
+        return True
+
+    def reload(self) -> bool:
+        """天気CSVを今すぐ読み込み直す（成功した場合はTrue）"""
+        return self._load_weather_data()
+
+    def _check_for_updates(self) -> None:
+        """天気CSVが更新されていれば、バックグラウンドで読み込み直す"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check or (self._reloading is not None and self._reloading.is_alive()):
+                return
+            self._next_check = now + self.reload_interval
+            signature = file_signature(self.weather_data_path)
+            if signature is None or signature == self._signature:
+                return
+            self._reloading = threading.Thread(target=self._load_weather_data, name="weather-reload", daemon=True)
+            self._reloading.start()
+
+    def _current_index(self) -> Optional[WeatherIndex]:
+        self._check_for_updates()
+        return self._index
+
+    def updated_at(self, year: Optional[int] = None, month: Optional[int] = None) -> float:
+        """
+        指定年月（省略した場合は全期間）の天気データが最後に変わった時刻（天気CSVの更新時刻）
+
+        キャッシュした応答の元になった天気データが、その後に変わっていないかの確認に使う。
+        """
+        index = self._current_index()
+        return index.updated_at(year, month) if index is not None else 0.0
     
     def get_weather_for_date_range(self, year: int, month: int) -> List[Dict[str, Any]]:
         """指定された年月の天気データを取得"""
-        if self._weather_df is None:
+        index = self._current_index()
+        if index is None:
             return []
         
         try:
-            # 指定された年月でフィルタリング
-            filtered_df = self._weather_df[
-                (self._weather_df['datetime'].dt.year == year) &
-                (self._weather_df['datetime'].dt.month == month)
-            ]
-            
-            if filtered_df.empty:
-                return []
-            
-            # 日付ごとの天気データを作成
-            weather_data = []
-            for _, row in filtered_df.iterrows():
-                weather_info = {
-                    'date': row['datetime'].strftime('%Y-%m-%d'),
-                    'time': row['datetime'].strftime('%H:%M'),
-                    'hour': row['datetime'].hour,
-                    'day': row['datetime'].day,
-                    'weather': row['weather'],
-                    'temperature': row['tempriture'] if pd.notna(row['tempriture']) else None,
-                    'rain': row['rain'] if pd.notna(row['rain']) and row['rain'] != '--' else None,
-                    'sun': row['sun'] if pd.notna(row['sun']) else None
-                }
-                weather_data.append(weather_info)
-            
-            return weather_data
-            
+            return index.date_range(year, month)
         except Exception as e:
             print(f"Error getting weather data for {year}/{month}: {e}")
             return []
     
     def get_daily_weather_summary(self, year: int, month: int) -> List[Dict[str, Any]]:
-        """指定された年月の日別天気サマリーを取得"""
-        if self._weather_df is None:
+        """指定された年月の日別天気サマリーを取得（日ごとに最も頻繁な天気・平均気温・降水量の合計）"""
+        index = self._current_index()
+        if index is None:
             return []
         
         try:
-            # 指定された年月でフィルタリング
-            filtered_df = self._weather_df[
-                (self._weather_df['datetime'].dt.year == year) &
-                (self._weather_df['datetime'].dt.month == month)
-            ]
-            
-            if filtered_df.empty:
-                return []
-            
-            # 日付ごとにグループ化して代表的な天気を取得
-            daily_summary = []
-            for day in filtered_df['datetime'].dt.day.unique():
-                day_data = filtered_df[filtered_df['datetime'].dt.day == day]
-                
-                # 最も頻繁に出現する天気を取得
-                most_common_weather = day_data['weather'].mode()
-                weather = most_common_weather[0] if not most_common_weather.empty else '不明'
-                
-                # 平均気温を計算
-                avg_temp = day_data['tempriture'].mean() if day_data['tempriture'].notna().any() else None
-                
-                # 降水量の合計
-                total_rain = day_data['rain'].sum() if day_data['rain'].notna().any() else None
-                
-                daily_summary.append({
-                    'day': int(day),
-                    'date': f"{year}-{month:02d}-{day:02d}",
-                    'weather': weather,
-                    'avg_temperature': round(avg_temp, 1) if avg_temp is not None else None,
-                    'total_rain': round(total_rain, 1) if total_rain is not None else None
-                })
-            
-            # 日付順でソート
-            daily_summary.sort(key=lambda x: x['day'])
-            return daily_summary
-            
+            return index.daily_summary(year, month)
         except Exception as e:
             print(f"Error getting daily weather summary for {year}/{month}: {e}")
             return []
     
     def get_hourly_weather_for_day(self, year: int, month: int, day: int) -> List[Dict[str, Any]]:
-        """指定された日の時間別天気データを取得"""
-        if self._weather_df is None:
+        """指定された日の時間別天気データを取得（時間順）"""
+        index = self._current_index()
+        if index is None:
             return []
         
         try:
-            # 指定された日でフィルタリング
-            filtered_df = self._weather_df[
-                (self._weather_df['datetime'].dt.year == year) &
-                (self._weather_df['datetime'].dt.month == month) &
-                (self._weather_df['datetime'].dt.day == day)
-            ]
-            
-            if filtered_df.empty:
-                return []
-            
-            hourly_data = []
-            for _, row in filtered_df.iterrows():
-                hourly_data.append({
-                    'hour': row['datetime'].hour,
-                    'weather': row['weather'],
-                    'temperature': row['tempriture'] if pd.notna(row['tempriture']) else None,
-                    'rain': row['rain'] if pd.notna(row['rain']) and row['rain'] != '--' else None,
-                    'sun': row['sun'] if pd.notna(row['sun']) else None
-                })
-            
-            # 時間順でソート
-            hourly_data.sort(key=lambda x: x['hour'])
-            return hourly_data
-            
+            return index.hourly_for_day(year, month, day)
         except Exception as e:
             print(f"Error getting hourly weather for {year}/{month}/{day}: {e}")
             return []
     
     def get_weather_for_week_time(self, year: int, month: int) -> Dict[int, List[Dict[str, Any]]]:
-        """指定された年月の曜日別・時間別天気データを取得"""
-        if self._weather_df is None:
+        """指定された年月の曜日別・時間別天気データを取得（7時から22時まで）"""
+        index = self._current_index()
+        if index is None:
             return {}
         
         try:
-            # 指定された年月でフィルタリング
-            filtered_df = self._weather_df[
-                (self._weather_df['datetime'].dt.year == year) &
-                (self._weather_df['datetime'].dt.month == month)
-            ]
-            
-            if filtered_df.empty:
-                return {}
-            
-            # 曜日別にグループ化
-            filtered_df['weekday'] = filtered_df['datetime'].dt.weekday
-            
-            weekday_weather = {}
-            for weekday in range(7):  # 0:月曜〜6:日曜
-                weekday_data = filtered_df[filtered_df['weekday'] == weekday]
-                if not weekday_data.empty:
-                    # 時間別の代表的な天気を取得
-                    hourly_weather = []
-                    for hour in range(7, 23):  # 7時から22時まで
-                        hour_data = weekday_data[weekday_data['datetime'].dt.hour == hour]
-                        if not hour_data.empty:
-                            # 最も頻繁に出現する天気を取得
-                            most_common_weather = hour_data['weather'].mode()
-                            weather = most_common_weather[0] if not most_common_weather.empty else '不明'
-                            avg_temp = hour_data['tempriture'].mean() if hour_data['tempriture'].notna().any() else None
-                            avg_rain = hour_data['rain'].mean() if hour_data['rain'].notna().any() else None
-                            
-                            hourly_weather.append({
-                                'hour': hour,
-                                'weather': weather,
-                                'avg_temperature': round(avg_temp, 1) if avg_temp is not None else None,
-                                'avg_rain': round(avg_rain, 1) if avg_rain is not None else None
-                            })
-                    
-                    weekday_weather[weekday] = hourly_weather
-            
-            return weekday_weather
-            
+            return index.week_time(year, month)
         except Exception as e:
             print(f"Error getting weather for week time {year}/{month}: {e}")
             return {}
     
     def get_weather_for_date_time(self, year: int, month: int) -> Dict[int, List[Dict[str, Any]]]:
-        """指定された年月の日付別・時間別天気データを取得"""
-        if self._weather_df is None:
+        """指定された年月の日付別・時間別天気データを取得（7時から22時まで、同じ時間は最新のデータ）"""
+        index = self._current_index()
+        if index is None:
             return {}
         
         try:
-            # 指定された年月でフィルタリング
-            filtered_df = self._weather_df[
-                (self._weather_df['datetime'].dt.year == year) &
-                (self._weather_df['datetime'].dt.month == month)
-            ]
-            
-            if filtered_df.empty:
-                return {}
-            
-            # 日付別にグループ化
-            date_weather = {}
-            for day in filtered_df['datetime'].dt.day.unique():
-                day_data = filtered_df[filtered_df['datetime'].dt.day == day]
-                
-                # 時間別の天気データを取得
-                hourly_weather = []
-                for hour in range(7, 23):  # 7時から22時まで
-                    hour_data = day_data[day_data['datetime'].dt.hour == hour]
-                    if not hour_data.empty:
-                        # 最新の天気データを取得
-                        latest_weather = hour_data.iloc[-1]
-                        hourly_weather.append({
-                            'hour': hour,
-                            'weather': latest_weather['weather'],
-                            'temperature': latest_weather['tempriture'] if pd.notna(latest_weather['tempriture']) else None,
-                            'rain': latest_weather['rain'] if pd.notna(latest_weather['rain']) else None
-                        })
-                
-                date_weather[int(day)] = hourly_weather
-            
-            return date_weather
-            
+            return index.date_time(year, month)
         except Exception as e:
             print(f"Error getting weather for date time {year}/{month}: {e}")
             return {}
@@ -270,4 +547,4 @@ if __name__ == "__main__":
         print("Warning: No weather data loaded.")
 else:
     # モジュールとしてインポートされた場合のサービスインスタンス作成
-    weather_service = WeatherService()
+    weather_service = WeatherService(stamps_path=settings.WEATHER_STAMPS_PATH)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+気象庁の1時間ごとのページの表の読み取りのベンチマーク
+
+保存したページ（*.html）のディレクトリを読み、BeautifulSoup で表全体を解析する従来の方法と
+past_weather.parse_hourly_table の結果が一致することを確認して、1ページあたりの時間を比べる。
+--save を指定した場合は、その日のページを気象庁から取得してディレクトリに保存する
+（test_past_weather.py も保存した全てのページで結果が一致することを確認する）。
+
+    python benchmark_jma_parser.py [ページのディレクトリ] [--repeat N]
+    python benchmark_jma_parser.py [ページのディレクトリ] --save 2025-10-01 2025-10-02
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import date
+
+from bs4 import BeautifulSoup
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.weather.past_weather import (
+    BLOCK_NO,
+    JMA_URL,
+    PREC_NO,
+    REQUEST_TIMEOUT,
+    REQUESTS_PER_SECOND,
+    TokenBucket,
+    create_session,
+    japanese_target_cols,
+    parse_hourly_table,
+)
+
+DEFAULT_PAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures", "jma")
+
+
+def parse_with_soup(html, year, month, day):
+    """従来の読み取り（ページごとに BeautifulSoup で解析し、ヘッダからカラムの位置を求める）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', {'id': 'tablefix1'})
+    if not table:
+        return []
+
+    header_rows = table.find_all('tr')[:2]
+    header2 = [th.get_text(strip=True).replace('\n', '') for th in header_rows[1].find_all('th')]
+    columns = []
+    i2 = 0
+    for th in header_rows[0].find_all('th'):
+        colspan = int(th.get('colspan', 1))
+        rowspan = int(th.get('rowspan', 1))
+        if rowspan == 2:
+            columns.append(th.get_text(strip=True).replace('\n', ''))
+        else:
+            for _ in range(colspan):
+                columns.append(header2[i2])
+                i2 += 1
+    col_indices = []
+    for col in japanese_target_cols:
+        found_index = None
+        for i, c in enumerate(columns):
+            if col.replace(' ', '') in c.replace('\n', '').replace(' ', ''):
+                found_index = i
+                break
+        col_indices.append(found_index)
+
+    all_data = []
+    for tr in table.find_all('tr')[2:]:
+        if tr.find('th'):
+            continue
+        tds = tr.find_all('td')
+        if not tds:
+            continue
+        row = []
+        for idx, col_idx in enumerate(col_indices):
+            if col_idx is not None and col_idx < len(tds):
+                if japanese_target_cols[idx] == '天気':
+                    img = tds[col_idx].find('img')
+                    row.append(img['alt'] if img and 'alt' in img.attrs else '')
+                else:
+                    row.append(tds[col_idx].get_text(strip=True))
+            else:
+                row.append('')
+        all_data.append([f'{year}-{month:02d}-{day:02d}'] + row)
+    return all_data
+
+
+def save_pages(days, page_dir):
+    """気象庁のページを取得時と同じ文字コードで読み、hourly_s1_{日付}.html として保存する"""
+    os.makedirs(page_dir, exist_ok=True)
+    session = create_session(1)
+    limiter = TokenBucket(REQUESTS_PER_SECOND)
+    for day in days:
+        limiter.acquire()
+        params = {
+            'prec_no': PREC_NO, 'block_no': BLOCK_NO,
+            'year': day.year, 'month': day.month, 'day': day.day, 'view': 'p1',
+        }
+        res = session.get(JMA_URL, params=params, timeout=REQUEST_TIMEOUT)
+        res.raise_for_status()
+        res.encoding = res.apparent_encoding
+        path = os.path.join(page_dir, f"hourly_s1_{day.isoformat()}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(res.text)
+        print(f"保存しました: {path}（{len(parse_hourly_table(res.text, day.year, day.month, day.day))}行）")
+
+
+def time_per_page(parse, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse(html, 2025, 1, 1)
+    return (time.perf_counter() - started) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="気象庁のページの表の読み取りのベンチマーク")
+    parser.add_argument("page_dir", nargs="?", default=DEFAULT_PAGE_DIR, help="保存したページのディレクトリ")
+    parser.add_argument("--repeat", type=int, default=20, help="各ページを読み取る回数")
+    parser.add_argument("--save", type=date.fromisoformat, nargs="+", metavar="YYYY-MM-DD", help="気象庁から取得して保存する日")
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save, args.page_dir)
+        return
+
+    paths = sorted(glob.glob(os.path.join(args.page_dir, "*.html")))
+    if not paths:
+        print(f"ページがありません: {args.page_dir}")
+        sys.exit(1)
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        pages.append(content.decode("utf-8", errors="replace"))
+
+    mismatched = [
+        os.path.basename(path) for path, html in zip(paths, pages)
+        if parse_hourly_table(html, 2025, 1, 1) != parse_with_soup(html, 2025, 1, 1)
+    ]
+    if mismatched:
+        print(f"✗ 読み取り結果が一致しません: {', '.join(mismatched)}")
+        sys.exit(1)
+
+    soup_sec = time_per_page(parse_with_soup, pages, args.repeat)
+    table_sec = time_per_page(parse_hourly_table, pages, args.repeat)
+    print(f"{len(pages)}ページ × {args.repeat}回")
+    print(f"BeautifulSoup: {soup_sec * 1000:.2f} ms/ページ")
+    print(f"parse_hourly_table: {table_sec * 1000:.2f} ms/ページ ({soup_sec / table_sec:.1f}倍)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
-import json
-import os
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
-from app.services.analyze.get_trend_analysis import get_congestion_data
+from app.services.analyze.today_snapshots import SNAPSHOT_DIR, generate_snapshots
 
 # データ保存ディレクトリ
-DATA_OUTPUT_DIR = Path("app/data/generated/today_details")
+DATA_OUTPUT_DIR = Path(SNAPSHOT_DIR)
 DATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # 利用可能な場所のリスト
@@ -15,44 +14,29 @@ AVAILABLE_PLACES = [
     "gyouzinbashi", "old-town", "station"
 ]
 
-def generate_today_data_for_all_places():
-    """全ての場所について今日のデータを生成"""
-    today = datetime.now().strftime("%Y-%m-%d")
+def generate_today_data_for_all_places(max_workers=None):
+    """
+    全ての場所について今日のデータを生成
     
-    for place in AVAILABLE_PLACES:
-        try:
-            print(f"Generating data for {place}...")
-            
-            # CSVファイルパスを構築
-            csv_file_path = os.path.join("app", "data", "meidai", f"{place}.csv")
-            
-            # データを生成
-            data = get_congestion_data(csv_file_path, datetime.now())
-            
-            # ファイルに保存
-            output_file = DATA_OUTPUT_DIR / f"{place}_{today}.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
-            
-            print(f"✓ Data saved for {place}")
-            
-        except Exception as e:
-            print(f"✗ Error generating data for {place}: {e}")
-            # エラーの場合は空のデータ構造を保存
-            error_data = {
-                "status": "error",
-                "message": f"データ生成エラー: {str(e)}",
-                "data": None
-            }
-            output_file = DATA_OUTPUT_DIR / f"{place}_{today}.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(error_data, f, ensure_ascii=False, indent=2)
+    場所ごとにプロセスを分けて並列に生成し、各ファイルは書き込み後の置き換えで更新する
+    """
+    print(f"Generating data for {len(AVAILABLE_PLACES)} places...")
+    results = generate_snapshots(AVAILABLE_PLACES, datetime.now(), max_workers=max_workers)
+    
+    for place, result in results.items():
+        if result["status"] == "success":
+            print(f"✓ Data saved for {place} ({result['seconds']}s)")
+        else:
+            print(f"✗ Error generating data for {place}: {result.get('error')}")
+    return results
 
 def cleanup_old_data():
     """古いデータファイルを削除（7日より古いもの）"""
     cutoff_date = datetime.now() - timedelta(days=7)
     
     for file_path in DATA_OUTPUT_DIR.glob("*.json"):
+        if file_path.name.startswith(".tmp-"):
+            continue
         try:
             # ファイル名から日付を抽出
             parts = file_path.stem.split('_')
@@ -68,6 +52,7 @@ def cleanup_old_data():
 
 if __name__ == "__main__":
     print("Starting today data generation...")
-    generate_today_data_for_all_places()
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    generate_today_data_for_all_places(workers)
     cleanup_old_data()
     print("Data generation completed!")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+1時間単位集計のテスト・ベンチマークスクリプト
+
+複数年分の .dat ファイルの内容を生成し、.dat から1時間ごとの合計への直接変換
+（parse_dat_hourly / hourly_rows）の結果が、以前の 15分単位CSVへの変換 + groupby + apply
+による集計と一致することを確認する。直接実行すると処理時間も表示する。
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数（S3には接続しない）
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.api.endpoints.fetch_csv_exmeidai import CSV_HEADER, hourly_rows, parse_dat_hourly
+
+
+def dat_to_csv_reference(dat_content, year, month, day):
+    """以前の実装（比較用）: datファイルを名古屋大学フォーマットの15分単位CSVに変換する"""
+    csv_content = io.StringIO()
+    csv_writer = csv.writer(csv_content)
+    date_obj = datetime.strptime(f"{year}-{month}-{day}", "%Y-%m-%d")
+    dayofweek = date_obj.strftime("%A")
+    date_str = date_obj.strftime("%Y-%m-%d")
+
+    lines = dat_content.splitlines()
+    if len(lines) > 1:
+        lines = lines[1:]
+    for line in lines:
+        if line.strip():
+            try:
+                fields = [field.strip('"').strip() for field in line.split(',')]
+                time_str = fields[0] if len(fields) > 0 else "00:00"
+                count = fields[1] if len(fields) > 1 else "0"
+                hour = datetime.strptime(time_str, "%H:%M").strftime("%H")
+                csv_writer.writerow([
+                    f"{date_str} {time_str}:00", date_str, hour, dayofweek, "person", "SumOfBothDirection", count
+                ])
+            except Exception:
+                pass
+    return csv_content.getvalue()
+
+
+def aggregate_by_hour_reference(df):
+    """以前の実装（比較用）: 15分単位のデータを1時間単位に集計する"""
+    df = df.copy()
+    df['datetime_jst'] = pd.to_datetime(df['datetime_jst'])
+    df['date_hour'] = df['datetime_jst'].dt.floor('h')
+    aggregated = df.groupby([
+        'date_hour',
+        'date_jst',
+        'time_jst',
+        'dayofweek',
+        'name',
+        'countingDirection'
+    ])['count_1_hour'].apply(lambda x: pd.to_numeric(x, errors='coerce').sum()).reset_index()
+    aggregated['datetime_jst'] = aggregated['date_hour'].dt.strftime('%Y-%m-%d %H:00:00')
+    aggregated.drop('date_hour', axis=1, inplace=True)
+    aggregated['count_1_hour'] = aggregated['count_1_hour'].round().astype(int)
+    return aggregated[[
+        'datetime_jst',
+        'date_jst',
+        'time_jst',
+        'dayofweek',
+        'name',
+        'countingDirection',
+        'count_1_hour'
+    ]]
+
+
+def reference_csv(dat_by_date):
+    """以前の実装で、日ごとの .dat の内容から最終ファイルの内容を作成する"""
+    csv_data = CSV_HEADER + "\n" + "".join(
+        dat_to_csv_reference(dat, *date_str.split("-")) for date_str, dat in sorted(dat_by_date.items())
+    )
+    return aggregate_by_hour_reference(pd.read_csv(io.StringIO(csv_data))).to_csv(index=False)
+
+
+def streaming_csv(dat_by_date):
+    """.dat から1時間ごとの合計に直接変換して最終ファイルの内容を作成する"""
+    return CSV_HEADER + "\n" + "".join(
+        line for date_str, dat in sorted(dat_by_date.items()) for line in hourly_rows(date_str, parse_dat_hourly(dat))
+    )
+
+
+def make_dat_contents(years=2, seed=0):
+    """15分単位の人数を持つ日ごとの .dat の内容を生成する（数値化できない値や欠損も含める）"""
+    rng = np.random.default_rng(seed)
+    dat_by_date = {}
+    start = date(2022, 1, 1)
+    for offset in range(years * 365):
+        counts = rng.integers(0, 40, 96).astype(str).astype(object)
+        counts[rng.random(96) < 0.01] = "-"
+        counts[rng.random(96) < 0.01] = ""
+        lines = ['"time","count"'] + [f'"{i // 4:02d}:{i % 4 * 15:02d}","{count}"' for i, count in enumerate(counts)]
+        dat_by_date[(start + timedelta(days=offset)).isoformat()] = "\n".join(lines) + "\n"
+    return dat_by_date
+
+
+def test_streaming_matches_reference():
+    """直接変換の結果が以前の実装と一致することを確認する"""
+    dat_by_date = make_dat_contents(years=1)
+    actual = streaming_csv(dat_by_date)
+    assert actual.count("\n") == 1 + 365 * 24
+    assert actual == reference_csv(dat_by_date)
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    dat_by_date = make_dat_contents(years=years)
+    print(f"{years}年分 / {len(dat_by_date)}ファイル")
+
+    start = time.perf_counter()
+    expected = reference_csv(dat_by_date)
+    print(f"以前の実装: {time.perf_counter() - start:.3f}秒")
+
+    start = time.perf_counter()
+    actual = streaming_csv(dat_by_date)
+    print(f"直接変換: {time.perf_counter() - start:.3f}秒")
+
+    assert actual == expected
+    print("✓ 結果が一致しました")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+カレンダーの一括取得（/api/get-calendars）のテストスクリプト
+
+まとめて計算した各月のカレンダーが、1か月ずつ計算した結果と一致することを確認する。
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+from fastapi import HTTPException
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.api.endpoints import get_graph
+from app.models import CalendarBatchRequest, GraphRequest
+from app.services.analyze.get_data_for_calendar250414 import get_data_for_calendar, get_data_for_calendars
+from app.services.analyze.pedestrian_store import read_pedestrian_csv
+from app.services.analyze.rollup_store import rollup_store
+from app.services.highlighter_service import highlight_calendar_data
+from app.services.utils.files import file_signature
+from app.services.weather.weather_service import weather_service
+from test_trend_engine import write_place_csv
+
+
+def test_batch_matches_single_months():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            write_place_csv("yasukawadori")
+            rollup = rollup_store.get("yasukawadori")
+
+            # データがない月・重複した指定も含める
+            months = [(2024, 12), (2023, 10), (2024, 2), (2024, 12), (2025, 6)]
+            calendars = get_data_for_calendars(rollup, months, "yasukawadori")
+            assert list(calendars) == [(2024, 12), (2023, 10), (2024, 2), (2025, 6)]
+            for (year, month), data in calendars.items():
+                assert data == get_data_for_calendar(rollup, year, month, "yasukawadori")
+            assert all(day is None or day.congestion == 0 for week in calendars[(2025, 6)] for day in week)
+
+            # 範囲指定で1年分を取得すると、月ごとにハイライトしたカレンダーが返る
+            request = CalendarBatchRequest(
+                place="yasukawadori",
+                action="cal_holiday",
+                start={"year": 2024, "month": 3},
+                end={"year": 2025, "month": 2},
+            )
+            response = asyncio.run(get_graph.get_calendars(request))
+            assert [(c.year, c.month) for c in response.calendars][0] == (2024, 3)
+            assert len(response.calendars) == 12
+            for c in response.calendars:
+                weather_data = weather_service.get_daily_weather_summary(c.year, c.month)
+                expected = highlight_calendar_data(
+                    get_data_for_calendar(rollup, c.year, c.month, "yasukawadori", weather_data), "cal_holiday"
+                )
+                assert c.data == expected
+
+            # 先月も返すアクションの結果は従来どおり
+            single = asyncio.run(get_graph.get_graph(GraphRequest(place="yasukawadori", year=2024, month=1, action="cal_holiday")))
+            assert single.previous_year == 2023 and single.previous_month == 12
+            assert single.previous_month_data == highlight_calendar_data(
+                get_data_for_calendar(
+                    rollup, 2023, 12, "yasukawadori", weather_service.get_daily_weather_summary(2023, 12)
+                ),
+                "cal_holiday",
+            )
+
+            # 不正な指定は400、存在しない場所は404
+            invalid = [
+                CalendarBatchRequest(place="yasukawadori"),
+                CalendarBatchRequest(place="yasukawadori", action="wti_event", months=[{"year": 2024, "month": 1}]),
+                CalendarBatchRequest(place="yasukawadori", months=[{"year": 2024, "month": 13}]),
+                CalendarBatchRequest(place="yasukawadori", start={"year": 2025, "month": 1}, end={"year": 2024, "month": 1}),
+                CalendarBatchRequest(place="yasukawadori", start={"year": 2020, "month": 1}, end={"year": 2024, "month": 1}),
+            ]
+            for request in invalid:
+                try:
+                    asyncio.run(get_graph.get_calendars(request))
+                except HTTPException as e:
+                    assert e.status_code == 400
+                else:
+                    raise AssertionError(request)
+            try:
+                asyncio.run(get_graph.get_calendars(CalendarBatchRequest(place="unknown", months=[{"year": 2024, "month": 1}])))
+            except HTTPException as e:
+                assert e.status_code == 404
+            else:
+                raise AssertionError("unknown place")
+        finally:
+            os.chdir(cwd)
+
+
+def test_calendar_cache_follows_whole_history():
+    """カレンダーのキャッシュは他の月の取り込みでも無効になる（混雑度の基準が全期間の平均のため）"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            path = write_place_csv("yasukawadori")
+            rollup_store.get("yasukawadori")
+            stored_at = time.time()
+            assert get_graph._cache_is_fresh("yasukawadori", 2024, 1, "cal_holiday", stored_at)
+
+            # 2025年4月の行を追記する
+            previous_signature = file_signature(path)
+            with open(path, encoding="utf-8") as f:
+                header = f.readline()
+            lines = "".join(
+                f"2025-04-01 {hour:02d}:00:00,2025-04-01,{hour},Tuesday,person,SumOfBothDirection,5000\n"
+                for hour in range(24)
+            )
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            rollup_store.apply_rows("yasukawadori", read_pedestrian_csv(io.StringIO(header + lines)), previous_signature)
+
+            assert not get_graph._cache_is_fresh("yasukawadori", 2024, 1, "cal_holiday", stored_at)
+            assert not get_graph._cache_is_fresh("yasukawadori", 2024, 1, "cal", stored_at)
+            # 月ごとの中間閾値を使う時間帯ビューはその月が変わらなければ有効
+            assert get_graph._cache_is_fresh("yasukawadori", 2024, 1, "date_time", stored_at)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_months()
+    test_calendar_cache_follows_whole_history()
+    print("✓ テスト成功")
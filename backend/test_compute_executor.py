@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+集計処理用エグゼキューター（待ち行列の上限と計測）のテストスクリプト
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.compute_executor import ComputeBusyError, ComputeExecutor
+
+
+def test_backpressure_and_metrics():
+    """上限を超えたリクエストは待たずに503となり、待ち時間と実行時間が記録される"""
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    def blocking(value):
+        release.wait(5)
+        return value * 2
+
+    async def run():
+        first = asyncio.ensure_future(executor.run(blocking, 1))
+        second = asyncio.ensure_future(executor.run(blocking, 2))
+        await asyncio.sleep(0.05)
+
+        # 実行中1件 + 待ち1件で上限に達している
+        try:
+            await executor.run(blocking, 3)
+            raise AssertionError("ComputeBusyError が送出されていません")
+        except ComputeBusyError as e:
+            assert e.status_code == 503 and e.headers["Retry-After"] == "1"
+
+        # 集計の実行中もイベントループは他の処理を続けられる
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert ticks == 5 and not first.done()
+
+        release.set()
+        return await asyncio.gather(first, second)
+
+    try:
+        assert asyncio.run(run()) == [2, 4]
+        stats = executor.stats()
+        assert (stats["submitted"], stats["rejected"], stats["completed"]) == (2, 1, 2)
+        assert stats["running"] == 0 and stats["queued"] == 0
+        # 2件目は1件目の完了を待っていた
+        assert stats["queue_wait"]["max"] >= 0.05
+        assert stats["compute"]["max"] >= 0.05
+    finally:
+        executor.shutdown()
+
+
+def test_exceptions_are_counted():
+    executor = ComputeExecutor(max_workers=2, max_queue=0)
+
+    def failing():
+        raise ValueError("failed")
+
+    try:
+        try:
+            asyncio.run(executor.run(failing))
+            raise AssertionError("ValueError が送出されていません")
+        except ValueError:
+            pass
+        time.sleep(0.01)
+        stats = executor.stats()
+        assert stats["failed"] == 1 and stats["running"] == 0
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    test_backpressure_and_metrics()
+    test_exceptions_are_counted()
+    print("✓ テスト成功")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+共通の混雑度スケール（CongestionScale）のテストスクリプト
+
+配列をまとめて変換した混雑度が、従来の pd.cut による計算・1件ずつの線形マッピングと
+一致することを確認する。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.analyze.utils.congestion_scale import (
+    build_congestion_bins,
+    calculate_scaled_level,
+    get_congestion_scale,
+)
+from app.services.analyze.utils.congestion_thresholds import THRESHOLDS_BY_GRANULARITY
+
+
+def test_scale_matches_reference():
+    rng = np.random.default_rng(0)
+    for granularity, thresholds in THRESHOLDS_BY_GRANULARITY.items():
+        for place, (min_threshold, max_threshold) in thresholds.items():
+            for middle in [None, min_threshold, max_threshold, (min_threshold + max_threshold) / 3]:
+                scale = get_congestion_scale(place, granularity, middle)
+                counts = np.concatenate([
+                    rng.uniform(0, max_threshold * 1.5, 2000),
+                    rng.integers(0, int(max_threshold * 1.5), 2000),
+                    [0, 1, min_threshold, max_threshold, max_threshold + 0.5],
+                ])
+                if scale.linear:
+                    expected = [calculate_scaled_level(count, min_threshold, max_threshold) for count in counts]
+                else:
+                    # 境界値ちょうどの値も含める
+                    counts = np.concatenate([counts, scale.bins[:-1]])
+                    middle_threshold = middle if middle is not None else (min_threshold + max_threshold) / 2
+                    bins = build_congestion_bins(min_threshold, middle_threshold, max_threshold)
+                    expected = pd.cut(counts, bins=bins, labels=False, include_lowest=True, right=False)
+                assert np.array_equal(scale.levels(counts), expected), (granularity, place, middle)
+
+
+def test_scale_is_shared():
+    # 場所・粒度・中間の境界値が同じであれば同じオブジェクト
+    assert get_congestion_scale("station", "calendar", 1200) is get_congestion_scale("station", "calendar", 1200.0)
+    assert get_congestion_scale("unknown", "calendar") is get_congestion_scale("default", "calendar")
+    assert get_congestion_scale("station", "calendar", 1200) is not get_congestion_scale("station", "calendar", 1300)
+
+    # 欠損・負の値は混雑度0、形はそのまま
+    scale = get_congestion_scale("station", "date_time", 80)
+    levels = scale.levels(np.array([[np.nan, -5], [0, 10_000]]))
+    assert levels.shape == (2, 2) and levels.tolist() == [[0, 0], [0, 20]]
+    assert scale.level(0) == 0 and scale.level(1) == 1
+
+
+if __name__ == "__main__":
+    test_scale_matches_reference()
+    test_scale_is_shared()
+    print("✓ テスト成功")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+名古屋大学オープンデータのCSV取り込み（fetch_csv）のテストスクリプト
+
+追記分を集計に反映できなかった場合も、追記したCSVと取り込み位置は保存され、
+次回の取り込みで同じ行を再び追記しないこと、
+全件取得が途中で失敗した場合は一時ファイルを残さないことを確認する。
+"""
+import os
+import sys
+import tempfile
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+import requests
+
+from app.api.endpoints import fetch_csv
+
+HEADER = "datetime_jst,name,count"
+
+
+def test_state_is_saved_before_apply():
+    cwd = os.getcwd()
+    original = (fetch_csv.csvs, fetch_csv.fetch_csv_incremental, fetch_csv.pedestrian_store.apply_rows)
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            os.makedirs(fetch_csv.data_dir)
+            file_path = os.path.join(fetch_csv.data_dir, "honmachi2.csv")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(HEADER + "\n2024-01-01 10:00:00,person,1\n")
+            fetch_csv.save_ingest_state({"honmachi2.csv": {"header": HEADER, "tail_offset": 0}})
+
+            new_line = "2024-01-01 11:00:00,person,2"
+
+            def fake_incremental(csv, path, entry):
+                # 前回の位置以降に行がある場合のみ追記する（実際の Range 取得と同じ）
+                if entry["tail_offset"] > 0:
+                    return entry, []
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(new_line + "\n")
+                return dict(entry, tail_offset=100), [HEADER.split(","), new_line.split(",")]
+
+            def failing_apply(*args, **kwargs):
+                raise RuntimeError("apply failed")
+
+            fetch_csv.csvs = [{"name": "honmachi2.csv", "url": "https://example.invalid/plaza.csv"}]
+            fetch_csv.fetch_csv_incremental = fake_incremental
+            fetch_csv.pedestrian_store.apply_rows = failing_apply
+
+            result = fetch_csv.run_fetch_csv()
+            assert result["results"][0]["status"] == "error"
+            assert fetch_csv.load_ingest_state()["honmachi2.csv"]["tail_offset"] == 100
+
+            # 次回は保存した位置から取得するため、同じ行は追記されない
+            result = fetch_csv.run_fetch_csv()
+            assert result["results"][0] == {"name": "honmachi2.csv", "status": "success", "mode": "incremental", "rows": 0}
+            with open(file_path, encoding="utf-8") as f:
+                assert f.read().count(new_line) == 1
+        finally:
+            fetch_csv.csvs, fetch_csv.fetch_csv_incremental, fetch_csv.pedestrian_store.apply_rows = original
+            os.chdir(cwd)
+
+
+class BrokenStreamResponse:
+    """途中で接続が切れるレスポンス"""
+
+    headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        yield (HEADER + "\n2024-01-01 10:00:00,person,1\n").encode("utf-8")
+        raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+
+def test_failed_full_fetch_keeps_previous_file():
+    original = fetch_csv.requests.get
+    with tempfile.TemporaryDirectory() as work:
+        file_path = os.path.join(work, "honmachi2.csv")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(HEADER + "\n")
+        fetch_csv.requests.get = lambda *args, **kwargs: BrokenStreamResponse()
+        try:
+            fetch_csv.fetch_csv_full({"name": "honmachi2.csv", "url": "https://example.invalid/plaza.csv"}, file_path)
+            raise AssertionError("ChunkedEncodingError was not raised")
+        except requests.exceptions.ChunkedEncodingError:
+            pass
+        finally:
+            fetch_csv.requests.get = original
+
+        # 書きかけの一時ファイルは残らず、元のファイルもそのまま
+        assert os.listdir(work) == ["honmachi2.csv"]
+        with open(file_path, encoding="utf-8") as f:
+            assert f.read() == HEADER + "\n"
+
+
+if __name__ == "__main__":
+    test_state_is_saved_before_apply()
+    test_failed_full_fetch_keeps_previous_file()
+    print("✓ テスト成功")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+固定カメラ（exmeidai）データ取得のテストスクリプト
+
+S3の代わりにディレクトリを読むクライアントを使い、オフラインで並列取得を確認する
+"""
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数（S3には接続しない）
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.api.endpoints import fetch_csv_exmeidai
+from app.services.analyze.pedestrian_store import BINARY_DIR, read_binary_twin, read_pedestrian_csv
+from app.services.utils.files import file_signature
+from test_aggregate_by_hour import reference_csv, streaming_csv
+
+
+class DirectoryS3Client:
+    """ディレクトリ配下のファイルをS3のオブジェクトとして返すクライアント"""
+
+    def __init__(self, root, fail_once=(), fail_always=()):
+        self.root = root
+        self.fail_once = set(fail_once)
+        self.fail_always = set(fail_always)
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        contents = []
+        base = os.path.join(self.root, Prefix)
+        for name in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+            path = os.path.join(base, name)
+            with open(path, "rb") as f:
+                etag = '"%s"' % hashlib.md5(f.read()).hexdigest()
+            contents.append({"Key": Prefix + name, "Size": os.path.getsize(path), "ETag": etag})
+        yield {"Contents": contents}
+
+    def get_object(self, Bucket, Key):
+        if Key in self.fail_always:
+            raise ConnectionError(f"failure: {Key}")
+        if Key in self.fail_once:
+            self.fail_once.discard(Key)
+            raise ConnectionError(f"temporary failure: {Key}")
+        with open(os.path.join(self.root, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+
+
+def write_dat(root, camera_num, date_str, counts):
+    """15分ごとの人数を持つ .dat ファイルを作成する"""
+    camera_dir = os.path.join(root, f"for-work/city-takayama/fa-cam{camera_num}")
+    os.makedirs(camera_dir, exist_ok=True)
+    lines = ['"time","count"']
+    for i, count in enumerate(counts):
+        lines.append(f'"{i // 4:02d}:{i % 4 * 15:02d}","{count}"')
+    path = os.path.join(camera_dir, f"C{date_str}.dat")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_fetch_cameras_parallel():
+    """複数カメラを並列に取得し、失敗したファイルは再試行されることを確認する"""
+    with tempfile.TemporaryDirectory() as root:
+        for camera_num in [1, 2]:
+            for day in range(1, 11):
+                write_dat(root, camera_num, f"202405{day:02d}", [camera_num] * 96)
+        flaky_key = "for-work/city-takayama/fa-cam2/C20240503.dat"
+        client = DirectoryS3Client(root, fail_once=[flaky_key])
+
+        results, stats = fetch_csv_exmeidai.fetch_cameras([1, 2, 3], client, max_in_flight=4, backoff=0)
+
+        assert (results[1]["processed"], results[1]["failed"]) == (10, 0)
+        assert (results[2]["processed"], results[2]["failed"]) == (10, 0)
+        assert (results[3]["success"], results[3]["processed"]) == (True, 0)
+        assert len(results[2]["objects"]) == 10
+
+        summary = stats.summary()
+        assert summary["files"] == 20
+        assert summary["bytes"] > 0 and summary["files_per_sec"] > 0
+        print(f"取得: {summary}")
+
+        days = results[2]["days"]
+        assert sorted(days) == [f"2024-05-{day:02d}" for day in range(1, 11)]
+        assert all(totals == {hour: 8.0 for hour in range(24)} for totals in days.values())
+
+
+def test_streaming_converter_matches_csv_path():
+    """1時間単位への直接変換が、15分単位CSVを経由した集計と一致することを確認する"""
+    dat = "\n".join([
+        '"time","count"',
+        '"00:00","3"', '"00:15","4"', '"00:30","-"', '"00:45",""',
+        '"01:00","10"', '"01:45","2.5"',
+        '"xx:yy","5"',
+        '',
+        '"23:15","7"', '"23:30"',
+    ])
+    assert streaming_csv({"2024-05-01": dat}) == reference_csv({"2024-05-01": dat})
+
+
+def test_incremental_run_matches_full_rebuild():
+    """マニフェストによる差分取得の結果が全件作り直しと一致することを確認する"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            os.makedirs(fetch_csv_exmeidai.data_dir)
+            client = DirectoryS3Client(root)
+            for day in range(1, 6):
+                write_dat(root, 1, f"202405{day:02d}", [day] * 96)
+
+            first = fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+            assert first["results"]["old-town"]["mode"] == "full"
+
+            # 新しい日の追加と、過去の日の再アップロード
+            write_dat(root, 1, "20240506", [6] * 96)
+            write_dat(root, 1, "20240503", [30] * 96)
+            second = fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+            old_town = second["results"]["old-town"]
+            assert old_town["mode"] == "incremental"
+            assert (old_town["files_processed"], old_town["files_skipped"]) == (2, 4)
+
+            final_file = os.path.join(fetch_csv_exmeidai.data_dir, "old-town.csv")
+            with open(final_file, encoding="utf-8") as f:
+                incremental = f.read().splitlines()
+            cached = fetch_csv_exmeidai.rollup_store.get("old-town")
+
+            # バイナリ版にも同じ内容が反映されている
+            binary = read_binary_twin(BINARY_DIR, "old-town", file_signature(final_file))
+            from_csv = read_pedestrian_csv(final_file)
+            assert binary is not None
+            pd.testing.assert_frame_equal(
+                binary.astype({"name": str, "countingDirection": str}),
+                from_csv.astype({"name": str, "countingDirection": str}),
+                check_dtype=False,
+            )
+
+            rebuilt = fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client, full_rebuild=True)
+            assert rebuilt["results"]["old-town"]["files_processed"] == 6
+            with open(final_file, encoding="utf-8") as f:
+                full = f.read().splitlines()
+            assert incremental == full
+            assert cached.daily["count"].tolist() == fetch_csv_exmeidai.rollup_store.get("old-town").daily["count"].tolist()
+
+            # 最終日より後の日のみの場合は追記される
+            write_dat(root, 1, "20240507", [7] * 96)
+            third = fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+            assert third["results"]["old-town"]["files_processed"] == 1
+            with open(final_file, encoding="utf-8") as f:
+                appended = f.read().splitlines()
+            assert appended[:len(full)] == full
+            assert len(appended) == len(full) + 24 and appended[-1].endswith(",28")
+        finally:
+            os.chdir(cwd)
+
+
+def test_changed_object_refetches_whole_day():
+    """同じ日付の一部のファイルのみ更新された場合も、その日の他のファイルの人数が残ることを確認する"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            os.makedirs(fetch_csv_exmeidai.data_dir)
+            client = DirectoryS3Client(root)
+            for day in range(1, 4):
+                write_dat(root, 1, f"202405{day:02d}", [day] * 96)
+                write_dat(root, 1, f"202405{day:02d}_2", [10] * 96)
+            fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+
+            # 2日目の片方のファイルのみ更新
+            write_dat(root, 1, "20240502_2", [20] * 96)
+            second = fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+            assert (second["results"]["old-town"]["files_processed"], second["results"]["old-town"]["files_skipped"]) == (2, 4)
+
+            final_file = os.path.join(fetch_csv_exmeidai.data_dir, "old-town.csv")
+            with open(final_file, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            assert [line.rsplit(",", 1)[1] for line in lines if line.startswith("2024-05-02")] == [str(4 * (2 + 20))] * 24
+
+            # その日の他のファイルが取得できない場合はその日を反映せず、処理済みにもしない
+            write_dat(root, 1, "20240503_2", [30] * 96)
+            failing = DirectoryS3Client(root, fail_always=["for-work/city-takayama/fa-cam1/C20240503.dat"])
+            results, _ = fetch_csv_exmeidai.fetch_cameras(
+                [1], failing, max_in_flight=2, backoff=0, manifest=fetch_csv_exmeidai.load_manifest()
+            )
+            assert results[1]["failed_dates"] == {"2024-05-03"} and results[1]["days"] == {}
+            assert results[1]["objects"] == []
+
+            fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client)
+            with open(final_file, encoding="utf-8") as f:
+                incremental = f.read().splitlines()
+            fetch_csv_exmeidai.run_fetch_all_exmeidai(max_in_flight=2, client=client, full_rebuild=True)
+            with open(final_file, encoding="utf-8") as f:
+                assert incremental == f.read().splitlines()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_fetch_cameras_parallel()
+    test_streaming_converter_matches_csv_path()
+    test_incremental_run_matches_full_rebuild()
+    test_changed_object_refetches_whole_day()
+    print("✓ テスト成功")
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+気象庁の過去の気象データ取得（past_weather）のテストスクリプト
+
+保存した気象庁のページを返すセッションで、天気CSVにない日だけを取得して
+書き込むこと・再実行では残りの日だけを取得すること、
+24時間分そろわない日は一定の期間だけ取得し直すことを確認する。
+"""
+import glob
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import requests
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.weather.past_weather import (
+    CSV_COLUMNS,
+    SHORT_DAY_RETRY_DAYS,
+    TokenBucket,
+    _target_column_indices,
+    existing_day_counts,
+    fetch_one_day,
+    parse_hourly_table,
+    read_short_days,
+    run_fetch_weather,
+)
+from app.services.weather.weather_service import WeatherService
+from benchmark_jma_parser import parse_with_soup
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures", "jma")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.encoding = None
+        self.apparent_encoding = "utf-8"
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """日ごとに保存したページを返す（ページがない日はデータなしのページ）"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, params=None, timeout=None):
+        day = date(int(params["year"]), int(params["month"]), int(params["day"]))
+        self.requested.append(day)
+        return FakeResponse(self.pages.get(day, read_fixture("hourly_s1_no_data.html")))
+
+
+def write_existing_csv(path):
+    """9/30 は24時間分、10/1 は途中までの天気CSV"""
+    lines = [",".join(CSV_COLUMNS)]
+    lines += [f"2025-09-30,{hour}時,--,20.0,0.0,,,晴れ" for hour in range(24)]
+    lines += [f"2025-10-01,{hour}時,--,15.0,,,,曇り" for hour in range(6)]
+    with open(path, "w", encoding="utf-8-sig") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_fetches_only_missing_days():
+    pages = {
+        date(2025, 10, 1): read_fixture("hourly_s1_2025-10-01.html"),
+        date(2025, 10, 2): read_fixture("hourly_s1_2025-10-02.html"),
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            output_csv = os.path.join("app", "data", "weather", "past_weather.csv")
+            os.makedirs(os.path.dirname(output_csv))
+            write_existing_csv(output_csv)
+
+            # 途中までの 10/1 と未取得の日を取得し、10/1 を差し替えて日付・時刻順に書き直す
+            session = FakeSession(pages)
+            result = run_fetch_weather(date(2025, 9, 30), date(2025, 10, 3), output_csv, session=session, chunk_days=2)
+            assert sorted(session.requested) == [date(2025, 10, 1), date(2025, 10, 2), date(2025, 10, 3)]
+            assert result["fetched_days"] == 2 and result["failed_days"] == ["2025-10-03"]
+            assert result["rows_written"] == 48 and result["writes"] == ["merge"]
+
+            with open(output_csv, encoding="utf-8-sig") as f:
+                lines = f.read().splitlines()
+            assert lines[0] == ",".join(CSV_COLUMNS)
+            assert [line[:10] for line in lines[1:]] == ["2025-09-30"] * 24 + ["2025-10-01"] * 24 + ["2025-10-02"] * 24
+            assert [line.split(",")[1] for line in lines[25:49]] == [f"{hour}時" for hour in range(24)]
+
+            # 24時は同じ日の0時、1〜23時はページの値のまま
+            parsed = parse_hourly_table(pages[date(2025, 10, 1)], 2025, 10, 1)
+            assert lines[25].split(",")[2:] == parsed[-1][2:]
+            assert lines[26].split(",")[2:] == parsed[0][2:]
+
+            # 再実行ではまだない 10/3 だけを取得し、ファイルは変わらない
+            with open(output_csv, "rb") as f:
+                before = f.read()
+            session = FakeSession(pages)
+            result = run_fetch_weather(date(2025, 9, 30), date(2025, 10, 3), output_csv, session=session)
+            assert session.requested == [date(2025, 10, 3)] and result["writes"] == []
+            with open(output_csv, "rb") as f:
+                assert f.read() == before
+
+            # 公開された 10/3 は末尾に追記する
+            pages[date(2025, 10, 3)] = read_fixture("hourly_s1_2025-10-02.html")
+            session = FakeSession(pages)
+            result = run_fetch_weather(date(2025, 9, 30), date(2025, 10, 3), output_csv, session=session)
+            assert session.requested == [date(2025, 10, 3)] and result["writes"] == ["append"]
+            with open(output_csv, "rb") as f:
+                after = f.read()
+            assert after.startswith(before) and after.count(b"2025-10-03") == 24
+
+            # 書き込んだCSVは天気データとして読み込める（天気は3時間ごと）
+            service = WeatherService(weather_data_path=output_csv)
+            hourly = service.get_hourly_weather_for_day(2025, 10, 3)
+            assert [hour["hour"] for hour in hourly] == list(range(0, 24, 3))
+            assert [day["day"] for day in service.get_daily_weather_summary(2025, 10)] == [1, 2, 3]
+        finally:
+            os.chdir(cwd)
+
+
+def short_page(name, hours):
+    """最初の hours 時間分の行だけが公開されているページ"""
+    lines, kept = [], 0
+    for line in read_fixture(name).splitlines():
+        if line.startswith('<tr class="mtx" style="text-align:right;">'):
+            kept += 1
+            if kept > hours:
+                continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def test_short_days_are_retried_for_a_while():
+    pages = {
+        date(2025, 10, 1): short_page("hourly_s1_2025-10-01.html", 20),
+        date(2025, 10, 2): short_page("hourly_s1_2025-10-02.html", 12),
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            output_csv = os.path.join("app", "data", "weather", "past_weather.csv")
+
+            def run(today):
+                session = FakeSession(pages)
+                result = run_fetch_weather(date(2025, 10, 1), date(2025, 10, 2), output_csv, session=session, today=today)
+                return sorted(session.requested), result
+
+            requested, result = run(date(2025, 10, 3))
+            assert requested == [date(2025, 10, 1), date(2025, 10, 2)]
+            assert result["short_days"] == ["2025-10-01", "2025-10-02"]
+            assert read_short_days(output_csv) == {"2025-10-01": "2025-10-03", "2025-10-02": "2025-10-03"}
+
+            # 数日後に残りが公開された 10/1 は記録から外す
+            pages[date(2025, 10, 1)] = read_fixture("hourly_s1_2025-10-01.html")
+            requested, result = run(date(2025, 10, 5))
+            assert requested == [date(2025, 10, 1), date(2025, 10, 2)] and result["short_days"] == ["2025-10-02"]
+            assert read_short_days(output_csv) == {"2025-10-02": "2025-10-05"}
+
+            # その日から SHORT_DAY_RETRY_DAYS 日が過ぎた後にもそろわなければ、以後は取得しない
+            requested, _ = run(date(2025, 10, 2) + timedelta(days=SHORT_DAY_RETRY_DAYS))
+            assert requested == [date(2025, 10, 2)]
+            requested, result = run(date(2025, 10, 20))
+            assert requested == [] and result["missing_days"] == 0
+            assert existing_day_counts(output_csv) == {"2025-10-01": 24, "2025-10-02": 12}
+        finally:
+            os.chdir(cwd)
+
+
+def test_parser_matches_soup():
+    page = read_fixture("hourly_s1_2025-10-01.html")
+    weather_cell = '<img src="../../data/image/tenki/large/F2-01.png" alt="晴れ" style="width:20px">'
+    variants = [
+        page,
+        read_fixture("hourly_s1_2025-10-02.html"),
+        read_fixture("hourly_s1_no_data.html"),
+        # 大文字のタグ・コメント・文字参照・単引用符の属性
+        page.replace("<td class=\"data_0_0\">16.7</td>", "<TD class='data_0_0'> &nbsp;16<!-- x -->.7 </TD>", 1),
+        page.replace("<td class=\"data_0_0\">--</td>", "<td>&lt; 0.5 &amp;</td>", 3),
+        # alt のない画像・値のない alt・2つ目の画像
+        page.replace(weather_cell, '<img src="a.png">', 1).replace(weather_cell, "<img alt><img alt=\"雨\">", 1),
+        page.replace(weather_cell, "<img src=a.png alt=&quot;快晴&quot;>", 1),
+        # 本文中の見出し行・空の行
+        page.replace("<tr class=\"mtx\" style=\"text-align:right;\">", "<tr><th>注</th></tr><tr></tr><tr class=\"mtx\">", 1),
+        # 表ヘッダが異なるページ（気温の列がない）
+        page.replace("気温<br>(℃)", "地中温度<br>(℃)"),
+    ]
+    for html in variants:
+        assert parse_hourly_table(html, 2025, 10, 1) == parse_with_soup(html, 2025, 10, 1)
+    assert parse_hourly_table(variants[-1], 2025, 10, 1)[0][3] == ""
+
+    # 保存した全てのページ（ページ全体の構成・記号付きの値・途中までの日・データなし）
+    pages = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    assert len(pages) >= 6
+    for path in pages:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        assert parse_hourly_table(html, 2025, 1, 15) == parse_with_soup(html, 2025, 1, 15), os.path.basename(path)
+
+    full = parse_hourly_table(read_fixture("hourly_s1_layout_2025-01-15.html"), 2025, 1, 15)
+    assert [row[1] for row in full] == [str(hour) for hour in range(1, 25)]
+    assert full[4][2:4] == ["1.5)", "-0.5#"] and full[16][2:4] == ["×", "×"]
+    assert len(parse_hourly_table(read_fixture("hourly_s1_layout_partial_2025-01-16.html"), 2025, 1, 16)) == 15
+    assert parse_hourly_table(read_fixture("hourly_s1_layout_no_data.html"), 2025, 1, 17) == []
+
+    # 同じヘッダのページではカラムの位置を求め直さない
+    _target_column_indices.cache_clear()
+    for html in variants[:2]:
+        parse_hourly_table(html, 2025, 10, 1)
+    info = _target_column_indices.cache_info()
+    assert info.misses == 1 and info.hits == 1
+
+
+def test_failed_request_is_retried():
+    class FailingSession:
+        calls = 0
+
+        def get(self, url, params=None, timeout=None):
+            self.calls += 1
+            raise requests.exceptions.ConnectionError("connection refused")
+
+    session = FailingSession()
+    assert fetch_one_day(2025, 10, 1, session=session, max_retries=2, backoff=0) == []
+    assert session.calls == 3
+
+
+def test_token_bucket_spaces_requests():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=1.0, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5] and now[0] == 1.0
+
+    # 待っている間に貯まった分はすぐに使える（上限は capacity）
+    now[0] += 10
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == [0.5, 0.5, 0.5]
+
+
+if __name__ == "__main__":
+    test_fetches_only_missing_days()
+    test_short_days_are_retried_for_a_while()
+    test_parser_matches_soup()
+    test_failed_request_is_retried()
+    test_token_bucket_spaces_requests()
+    print("✓ テスト成功")
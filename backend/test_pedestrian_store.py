@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+歩行者データのバイナリ版（pedestrian_store.write_binary_twin）のテストスクリプト
+
+同じ場所を複数のプロセスが書き出す場合に、書き出し済みの配列や
+他のプロセスが書き出している途中の一時ディレクトリを削除しないことを確認する。
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.analyze import pedestrian_store
+from app.services.analyze.pedestrian_store import read_binary_twin, write_binary_twin
+
+
+def pedestrian_df(hours):
+    return pd.DataFrame({
+        "datetime_jst": pd.date_range("2024-01-01", periods=hours, freq="h").astype("datetime64[ns]"),
+        "time_jst": np.arange(hours, dtype="int16") % 24,
+        "name": pd.Categorical(["person"] * hours),
+        "countingDirection": pd.Categorical(["SumOfBothDirection"] * hours),
+        "count_1_hour": np.arange(hours, dtype="int32"),
+    })
+
+
+def test_concurrent_writers_keep_finished_bundles():
+    with tempfile.TemporaryDirectory() as binary_dir:
+        place_dir = os.path.join(binary_dir, "station")
+        df = pedestrian_df(48)
+        write_binary_twin(binary_dir, "station", df, (1, 100))
+        published = os.path.join(place_dir, "data-1-100", "count_1_hour.npy")
+        before = os.stat(published).st_ino
+
+        # 他のプロセスが書き出している途中の一時ディレクトリ
+        in_progress = tempfile.mkdtemp(prefix=".tmp-data-", dir=place_dir)
+
+        # 同じCSVから書き出し済みの配列は置き換えない
+        write_binary_twin(binary_dir, "station", df, (1, 100))
+        assert os.stat(published).st_ino == before
+        pd.testing.assert_frame_equal(read_binary_twin(binary_dir, "station", (1, 100)), df)
+
+        # 新しいCSVの配列に切り替えると、書き出し済みの古い配列だけを削除する
+        appended = pedestrian_df(72)
+        write_binary_twin(binary_dir, "station", appended, (2, 150))
+        assert read_binary_twin(binary_dir, "station", (1, 100)) is None
+        pd.testing.assert_frame_equal(read_binary_twin(binary_dir, "station", (2, 150)), appended)
+        assert sorted(os.listdir(place_dir)) == sorted([".lock", os.path.basename(in_progress), "data-2-150", "meta.json"])
+
+
+def test_failed_write_leaves_no_temp_dir():
+    original = pedestrian_store.np.save
+    with tempfile.TemporaryDirectory() as binary_dir:
+        df = pedestrian_df(24)
+        write_binary_twin(binary_dir, "station", df, (1, 100))
+
+        def failing_save(path, array):
+            raise OSError("disk full")
+
+        pedestrian_store.np.save = failing_save
+        try:
+            write_binary_twin(binary_dir, "station", pedestrian_df(48), (2, 150))
+            raise AssertionError("OSError was not raised")
+        except OSError:
+            pass
+        finally:
+            pedestrian_store.np.save = original
+
+        place_dir = os.path.join(binary_dir, "station")
+        assert sorted(os.listdir(place_dir)) == [".lock", "data-1-100", "meta.json"]
+        pd.testing.assert_frame_equal(read_binary_twin(binary_dir, "station", (1, 100)), df)
+
+
+if __name__ == "__main__":
+    test_concurrent_writers_keep_finished_bundles()
+    test_failed_write_leaves_no_temp_dir()
+    print("✓ テスト成功")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+全地点のトレンド分析の並列実行（PlacePool）のテストスクリプト
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.analyze.get_trend_analysis import get_congestion_data
+from app.services.analyze.place_pool import PlacePool
+from test_trend_engine import write_place_csv
+
+
+def test_parallel_places_with_partial_results():
+    """並列実行の結果が逐次実行と一致し、タイムアウトした場所はエラーとして返す"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        pool = PlacePool(max_workers=2)
+        try:
+            paths = {
+                "yasukawadori": write_place_csv("yasukawadori", seed=1),
+                "old-town": write_place_csv("old-town", seed=2),
+            }
+            target_date = datetime(2025, 1, 3)
+            results, errors, timings = asyncio.run(pool.congestion_for_places(paths, target_date))
+
+            assert sorted(results) == ["old-town", "yasukawadori"]
+            for place in results:
+                assert results[place] == get_congestion_data(paths[place], target_date)
+                assert timings[place]["status"] == "ok"
+                assert timings[place]["compute_seconds"] <= timings[place]["seconds"]
+            assert errors == {}
+
+            # タイムアウトした場所はエラーとして返す
+            results, errors, timings = asyncio.run(
+                pool.congestion_for_places({"yasukawadori": paths["yasukawadori"]}, target_date, timeout=0.001)
+            )
+            assert results == {} and "yasukawadori" in errors
+            assert timings["yasukawadori"]["status"] == "timeout"
+        finally:
+            pool.shutdown()
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_parallel_places_with_partial_results()
+    print("✓ テスト成功")
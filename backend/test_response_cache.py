@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+レスポンスキャッシュ（LRU・有効期限・同時リクエストの集約）のテストスクリプト
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.cache_backends import RedisBackend, SQLiteBackend, dumps, loads
+from app.services.response_cache import ResponseCache
+
+
+class FakeRedis:
+    """get / set(ex=) / delete / scan_iter のみを持つRedisの代わり"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    """件数・バイト数の上限を超えると最も使われていないエントリから削除される"""
+    cache = ResponseCache(max_entries=3, max_bytes=100, sizer=len)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    cache.set("c", "x" * 10)
+    assert cache.get("a") is not None  # a を最近使ったことにする
+    cache.set("d", "x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    cache.set("e", "x" * 90)
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("e") is not None
+    assert cache.stats()["evictions"] >= 3
+
+    # 1件で上限を超える値は保存しない
+    cache.set("huge", "x" * 200)
+    assert cache.get("huge") is None
+
+
+def test_ttl_and_freshness():
+    """有効期限切れ・is_fresh で無効と判定されたエントリは返さない"""
+    cache = ResponseCache()
+    cache.set("past", "value")
+    cache.set("current", "value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("past") == "value"
+    assert cache.get("current") is None
+    assert cache.get("past", is_fresh=lambda stored_at: False) is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_single_flight():
+    """同じキーの同時リクエストは1回の計算にまとめられる"""
+    cache = ResponseCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"result": len(calls)}
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_compute("key", compute) for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["coalesced"] == 19
+
+    # 例外は保存されず、次のリクエストで再計算される
+    async def failing():
+        raise ValueError("failed")
+
+    async def run_failing():
+        return await asyncio.gather(
+            *[cache.get_or_compute("error", failing) for _ in range(3)], return_exceptions=True
+        )
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run_failing()))
+    assert cache.get("error") is None
+
+
+def _check_shared_backend(make_backend):
+    """別ワーカーのキャッシュが計算した結果を共有先から取得できる"""
+    worker_a = ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="graph")
+    worker_b = ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="graph")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"data": [{"x": "2024-05-01", "y": 12}], "message": "ok"}
+
+    first = asyncio.run(worker_a.get_or_compute("key", compute, ttl=60))
+    second = asyncio.run(worker_b.get_or_compute("key", compute, ttl=60))
+    assert len(calls) == 1
+    assert first == second
+    assert worker_b.stats()["backend_hits"] == 1
+
+    # 共有先のエントリも is_fresh で無効化される
+    assert worker_a.get("key", is_fresh=lambda stored_at: True) == first
+    fresh_b = ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="graph")
+    assert fresh_b.get("key", is_fresh=lambda stored_at: False) is None
+    assert fresh_b.get("key") is None
+
+    # clear は同じ名前空間のみを削除する
+    other = ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="other")
+    other.set("key", {"value": 1})
+    worker_a.set("key", first)
+    worker_a.clear()
+    assert ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="graph").get("key") is None
+    assert ResponseCache(backend=make_backend(), encode=dumps, decode=loads, namespace="other").get("key") == {"value": 1}
+
+
+def test_sqlite_backend_shared_between_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        _check_shared_backend(lambda: SQLiteBackend(path))
+
+        # 有効期限切れのエントリは返さない
+        backend = SQLiteBackend(path)
+        backend.set("expired", b"value", ttl=0.01)
+        time.sleep(0.02)
+        assert backend.get("expired") is None
+
+
+def test_redis_backend_with_fake_client():
+    client = FakeRedis()
+    _check_shared_backend(lambda: RedisBackend(client=client))
+    assert all(key.startswith("ai_cam:cache:") for key in client.data)
+
+
+def test_lookup_runs_off_event_loop():
+    """共有先の読み書きと is_fresh の確認はイベントループのスレッドでは行わない"""
+
+    class RecordingRedis(FakeRedis):
+        def __init__(self):
+            super().__init__()
+            self.threads = []
+
+        def get(self, key):
+            self.threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, value, ex=None):
+            self.threads.append(threading.current_thread())
+            super().set(key, value, ex)
+
+    client = RecordingRedis()
+    cache = ResponseCache(backend=RedisBackend(client=client), encode=dumps, decode=loads)
+    fresh_threads = []
+
+    def is_fresh(stored_at):
+        fresh_threads.append(threading.current_thread())
+        return True
+
+    async def compute():
+        return {"value": 1}
+
+    async def run():
+        loop_thread = threading.current_thread()
+        first = await cache.get_or_compute("key", compute, is_fresh=is_fresh)
+        second = await cache.get_or_compute("key", compute, is_fresh=is_fresh)
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(run())
+    assert first == second == {"value": 1}
+    assert len(client.threads) == 2 and len(fresh_threads) == 1
+    assert all(thread is not loop_thread for thread in client.threads + fresh_threads)
+
+
+def test_leader_cancellation_does_not_fail_waiters():
+    """計算を始めたリクエストがキャンセルされても、待っているリクエストは結果を受け取る"""
+    cache = ResponseCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        try:
+            await leader
+            raise AssertionError("leader was not cancelled")
+        except asyncio.CancelledError:
+            pass
+        value = await waiter
+        # 結果の保存も続けて行われる
+        while cache._inflight:
+            await asyncio.sleep(0.01)
+        return value
+
+    assert asyncio.run(run()) == {"value": 1}
+    assert len(calls) == 1 and cache.get("key") == {"value": 1}
+
+
+if __name__ == "__main__":
+    test_lru_eviction_by_entries_and_bytes()
+    test_ttl_and_freshness()
+    test_single_flight()
+    test_sqlite_backend_shared_between_workers()
+    test_redis_backend_with_fake_client()
+    test_lookup_runs_off_event_loop()
+    test_leader_cancellation_does_not_fail_waiters()
+    print("✓ テスト成功")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+集計キューブ（rollup_store）の差分更新のテストスクリプト
+
+追記・再取得した日以降だけを集計し直した結果と中間閾値が、
+全体から作り直した結果と一致することを確認する。
+"""
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.analyze.rollup_store import (
+    RollupStore,
+    rollup_store,
+    merge_hourly_cube,
+    rollup_from_hourly,
+    update_rollup,
+)
+from test_trend_engine import write_place_csv
+
+
+def hourly_cube(start, days, seed=0):
+    """日 × 時間 の集計キューブを作成する（データがない日も含める）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq="D")
+    dates = dates[rng.random(days) >= 0.05]
+    return pd.DataFrame({
+        "date": np.repeat(dates.values, 24),
+        "hour": np.tile(np.arange(24), len(dates)),
+        "count": rng.integers(0, 600, len(dates) * 24),
+        "rows": np.ones(len(dates) * 24, dtype=int),
+    })
+
+
+def assert_same_rollup(actual, expected):
+    for name, table in expected.tables().items():
+        pd.testing.assert_frame_equal(actual.tables()[name], table, check_dtype=False, obj=name)
+    assert actual.middles == expected.middles
+    assert actual.middle_stats == expected.middle_stats
+    for year, month in [(2023, 12), (2024, 2), (2024, 11)]:
+        for column in ["date_time_middle", "week_time_middle"]:
+            assert actual.month_middle(year, month, column) == expected.month_middle(year, month, column)
+
+
+def test_update_matches_full_rebuild():
+    history = hourly_cube("2023-11-01", 400)
+    current = rollup_from_hourly("place", history)
+
+    # 月初・週の途中・年をまたぐ追記
+    for days in [1, 3, 40, 70]:
+        delta = hourly_cube(history["date"].max() + pd.Timedelta(days=1), days, seed=days)
+        hourly = merge_hourly_cube(current.hourly, delta)
+        updated = update_rollup(current, hourly, delta["date"].min())
+        assert_same_rollup(updated, rollup_from_hourly("place", hourly))
+
+    # 過去の日の再取得（日単位の置き換え）
+    delta = hourly_cube("2024-02-27", 5, seed=99)
+    delta["count"] *= 3
+    hourly = merge_hourly_cube(current.hourly, delta, replace_dates=True)
+    updated = update_rollup(current, hourly, delta["date"].min())
+    assert_same_rollup(updated, rollup_from_hourly("place", hourly))
+
+
+def test_middle_stats_are_persisted():
+    with tempfile.TemporaryDirectory() as rollup_dir:
+        store = RollupStore(rollup_dir)
+        rollup = rollup_from_hourly("place", hourly_cube("2024-01-01", 120))
+        store.save(rollup)
+        assert store.read_meta("place")["middle_stats"] == rollup.middle_stats
+
+        loaded = store._load_from_disk("place")
+        assert loaded.middle_stats == rollup.middle_stats and loaded.middles == rollup.middles
+
+        # 読み込んだキューブからの差分更新でも中間閾値は作り直しと同じ
+        delta = hourly_cube("2024-04-30", 10, seed=1)
+        hourly = merge_hourly_cube(loaded.hourly, delta)
+        assert_same_rollup(update_rollup(loaded, hourly, delta["date"].min()), rollup_from_hourly("place", hourly))
+
+
+def test_concurrent_saves_keep_tables_and_meta_together():
+    """複数のワーカーが同時に保存しても、読み込んだCSVとメタ情報は同じキューブのもの"""
+    rollups = [
+        rollup_from_hourly("place", hourly_cube("2024-01-01", days), source_signature=(days, days))
+        for days in (60, 90)
+    ]
+    with tempfile.TemporaryDirectory() as rollup_dir:
+        RollupStore(rollup_dir).save(rollups[0])
+        errors = []
+
+        def save_repeatedly(rollup):
+            store = RollupStore(rollup_dir)
+            try:
+                for _ in range(15):
+                    store.save(rollup)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save_repeatedly, args=(rollup,)) for rollup in rollups]
+        for thread in threads:
+            thread.start()
+        reader = RollupStore(rollup_dir)
+        while any(thread.is_alive() for thread in threads):
+            loaded = reader._load_from_disk("place")
+            expected = next(r for r in rollups if list(r.source_signature) == loaded.source_signature)
+            assert len(loaded.hourly) == len(expected.hourly)
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert not [name for name in os.listdir(os.path.join(rollup_dir, "place")) if name.startswith(".tmp-")]
+
+
+def test_stamps_do_not_build_rollup():
+    """更新時刻は保存済みのメタ情報から返し、CSVの更新が未反映の場合はキューブを作り直さずに None を返す"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            path = write_place_csv("station", days=60)
+            rollup = rollup_store.get("station")
+            stamps = rollup_store.stamps("station")
+            assert stamps.updated_at() == rollup.updated_at()
+
+            # 別のワーカー（メモリ上にキューブがない）は保存済みのメタ情報から同じ時刻を返す
+            other = RollupStore(rollup_store.rollup_dir)
+            assert other.stamps("station").updated_at(2023, 12) == rollup.updated_at(2023, 12)
+            assert "station" not in other._rollups
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("2024-01-01 00:00:00,2024-01-01,0,Monday,person,SumOfBothDirection,1\n")
+            assert rollup_store.stamps("station") is None and other.stamps("station") is None
+            assert rollup_store._rollups["station"] is rollup
+            assert RollupStore("missing").stamps("unknown") is None
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_update_matches_full_rebuild()
+    test_middle_stats_are_persisted()
+    test_concurrent_saves_keep_tables_and_meta_together()
+    test_stamps_do_not_build_rollup()
+    print("✓ テスト成功")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+「今日の詳細」スナップショットの作成と配信（ETag / If-None-Match）のテストスクリプト
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.api.endpoints import trend_analysis
+from app.services.analyze import today_snapshots as today_snapshots_module
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.today_snapshots import SNAPSHOT_DIR, generate_snapshots, today_snapshots
+from app.services.compute_executor import compute_executor
+from test_trend_engine import write_place_csv
+
+
+def fetch(place, target_date, if_none_match=None):
+    return asyncio.run(trend_analysis.get_place_congestion_data(
+        place, target_date=target_date, weeks_count=3, align="calendar", if_none_match=if_none_match
+    ))
+
+
+def test_snapshot_served_with_etag():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            write_place_csv("yasukawadori", seed=1)
+            write_place_csv("old-town", seed=2)
+
+            # スナップショットがない場合は計算結果を返す
+            live = fetch("yasukawadori", "2025-01-03")
+            assert isinstance(live, dict)
+
+            results = generate_snapshots(["yasukawadori", "old-town"], datetime(2025, 1, 3), max_workers=2)
+            assert all(result["status"] == "success" for result in results.values())
+            assert sorted(os.listdir(SNAPSHOT_DIR)) == ["old-town_2025-01-03.json", "yasukawadori_2025-01-03.json"]
+
+            # スナップショットの内容は計算結果と同じ
+            response = fetch("yasukawadori", "2025-01-03")
+            assert response.status_code == 200
+            assert json.loads(response.body) == json.loads(json.dumps(live))
+            etag = response.headers["etag"]
+
+            # If-None-Match が一致する場合は304
+            not_modified = fetch("yasukawadori", "2025-01-03", if_none_match=etag)
+            assert not_modified.status_code == 304 and not_modified.body == b""
+            assert fetch("yasukawadori", "2025-01-03", if_none_match='"other"').status_code == 200
+
+            # 全ての場所の取得でもスナップショットを使い、読み込みは計算用のスレッドプールの1枠で行う
+            submitted = compute_executor.submitted
+            all_places = asyncio.run(trend_analysis.get_all_places_congestion_data(target_date="2025-01-03", timeout=None))
+            timings = all_places["data"]["timings"]
+            assert timings["yasukawadori"]["status"] == timings["old-town"]["status"] == "snapshot"
+            assert compute_executor.submitted == submitted + 1
+
+            # 前月（1/3 の表示期間に含まれる12月）の天気データが更新された場合は古いものとして扱う
+            weather_service = today_snapshots_module.weather_service
+            original_updated_at = weather_service.updated_at
+            updated = time.time() + 60
+            weather_service.updated_at = lambda year=None, month=None: (
+                updated if (year, month) == (2024, 12) else original_updated_at(year, month)
+            )
+            try:
+                assert today_snapshots.load("yasukawadori", "2025-01-03") is None
+            finally:
+                weather_service.updated_at = original_updated_at
+            assert today_snapshots.load("yasukawadori", "2025-01-03") is not None
+
+            # 集計元CSVの更新がまだ集計キューブに反映されていない場合は、キューブを作り直さずに古いものとして扱う
+            rollup = rollup_store.get("old-town")
+            csv_path = os.path.join(trend_analysis.DATA_DIR, "old-town.csv")
+            with open(csv_path, "a", encoding="utf-8") as f:
+                f.write("2025-01-03 10:00:00,2025-01-03,10,Friday,person,SumOfBothDirection,1\n")
+            assert today_snapshots.load("old-town", "2025-01-03") is None
+            assert rollup_store._rollups["old-town"] is rollup
+
+            # 集計キューブより古いスナップショットは使わない
+            path = today_snapshots.path_for("yasukawadori", "2025-01-03")
+            os.utime(path, (0, 0))
+            assert isinstance(fetch("yasukawadori", "2025-01-03"), dict)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_snapshot_served_with_etag()
+    print("✓ テスト成功")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+トレンド分析エンジン（TrendEngine）のテストスクリプト
+
+合成した歩行者データで、エンジンが切り出す日別・時間別の混雑度が
+カレンダービュー・時間帯ビューの月ごとの計算結果と一致することを確認する。
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.analyze.get_data_for_calendar250414 import get_data_for_calendar
+from app.services.analyze.get_data_for_date_time250504 import get_data_for_date_time
+from app.services.analyze.get_trend_analysis import (
+    get_congestion_data,
+    get_trend_days_for_month,
+    get_trend_window,
+    get_year_over_year_comparison,
+)
+from app.services.analyze.pedestrian_store import DATA_DIR
+from app.services.analyze.rollup_store import rollup_store
+from app.services.analyze.trend_engine import TrendEngine, months_between, previous_year_date, trend_months
+
+
+def write_place_csv(place, start="2023-11-01", days=500, seed=0):
+    """1時間単位の歩行者CSVを作成する（データがない日・0人の時間帯も含める）"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=days * 24, freq="h")
+    counts = rng.integers(0, 600, len(times))
+    counts[rng.random(len(times)) < 0.05] = 0
+    keep = ~times.normalize().isin(times.normalize().unique()[rng.random(days) < 0.03])
+    times, counts = times[keep], counts[keep]
+    df = pd.DataFrame({
+        "datetime_jst": times.strftime("%Y-%m-%d %H:00:00"),
+        "date_jst": times.strftime("%Y-%m-%d"),
+        "time_jst": times.hour,
+        "dayofweek": times.day_name(),
+        "name": "person",
+        "countingDirection": "SumOfBothDirection",
+        "count_1_hour": counts,
+    })
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"{place}.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def reference_day(rollup, place, date):
+    """カレンダービュー・時間帯ビューの月ごとの計算から該当日を取り出す"""
+    day_level = 0
+    for week in get_data_for_calendar(rollup, date.year, date.month, place):
+        for day_data in week:
+            if day_data and day_data.date == date.day:
+                day_level = day_data.congestion
+    hours = {}
+    for day_info in get_data_for_date_time(rollup, date.year, date.month, place):
+        if day_info["date"] == date.strftime("%Y-%m-%d"):
+            hours = {hour["hour"]: hour for hour in day_info["hours"]}
+    return day_level, hours
+
+
+def test_engine_matches_monthly_views():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            path = write_place_csv("yasukawadori")
+            rollup = rollup_store.get("yasukawadori")
+
+            target_date = datetime(2025, 1, 3)
+            months = trend_months(target_date, 3)
+            assert months_between(datetime(2024, 12, 10), datetime(2025, 2, 1)) == [(2024, 12), (2025, 1), (2025, 2)]
+            assert (2023, 12) in months and (2024, 1) in months and (2025, 1) in months
+
+            engine = TrendEngine(path, months)
+            for year, month in sorted(set(months)):
+                date = datetime(year, month, 1)
+                while date.month == month:
+                    day_level, hours = reference_day(rollup, "yasukawadori", date)
+                    assert engine.day_level(date) == day_level, date
+                    assert engine.hours(date) == hours, date
+                    date += timedelta(days=1)
+
+            # 各セクションが受け取る時間別データは別々の辞書
+            hours = engine.hours(target_date)
+            hours[12]["weather_info"] = {"weather": "晴"}
+            assert engine.hours(target_date)[12]["weather_info"] is None
+
+            result = get_congestion_data(path, target_date, 3)
+            extended = result["extended_week"]["daily_data"]
+            assert len(extended) == 3 * 7 + 7
+            assert extended[20]["is_today"] and extended[20]["congestion_level"] == engine.day_level(target_date)
+            assert all(day["congestion_level"] == 0 for day in extended if day["is_future"])
+            assert result["yesterday_hourly"]["date"] == "2025-01-02"
+            assert result["historical_comparison"]["reference_date"] == "2024-01-03"
+
+            # 52週でも日ごとの切り出しは索引を引くだけ
+            long_result = get_congestion_data(path, target_date, 52)
+            long_extended = long_result["extended_week"]["daily_data"]
+            assert len(long_extended) == 52 * 7 + 7
+            assert long_extended[-8]["congestion_level"] == extended[20]["congestion_level"]
+
+            # 月ごとに切り出した日別データをつなげると、一括で計算した結果と同じ
+            start_date, end_date, _ = get_trend_window(target_date, 52)
+            streamed = []
+            for year, month in months_between(start_date, end_date):
+                streamed += get_trend_days_for_month(path, target_date, 52, year, month)
+            assert streamed == long_extended
+            levels_only = get_trend_days_for_month(path, target_date, 52, 2025, 1, include_hourly=False, include_weather=False)
+            assert "hourly_congestion" not in levels_only[0] and "weather_info" not in levels_only[0]
+            assert [day["congestion_level"] for day in levels_only] == [day["congestion_level"] for day in long_extended[-10:]]
+            entries, by_hour = engine.day_weather(target_date)
+            assert all(by_hour[entry["hour"]] is entry for entry in entries)
+        finally:
+            os.chdir(cwd)
+
+
+def test_previous_year_date():
+    # 同じ月日（2/29 はうるう年でない年の2/28）
+    assert previous_year_date(datetime(2025, 1, 3)) == datetime(2024, 1, 3)
+    assert previous_year_date(datetime(2024, 2, 29)) == datetime(2023, 2, 28)
+    assert previous_year_date(datetime(2024, 2, 29), 4) == datetime(2020, 2, 29)
+    # 同じISO週・曜日
+    assert previous_year_date(datetime(2025, 1, 3), align="weekday") == datetime(2024, 1, 5)
+    assert previous_year_date(datetime(2024, 2, 29), align="weekday") == datetime(2023, 3, 2)
+    # 第53週がない年は第52週
+    assert previous_year_date(datetime(2021, 1, 3), align="weekday") == datetime(2019, 12, 29)
+    for years_back in range(1, 6):
+        date = previous_year_date(datetime(2025, 10, 10, 15), years_back, "weekday")
+        assert date.weekday() == 4 and date.hour == 15
+
+
+def test_year_over_year_comparison():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            path = write_place_csv("yasukawadori")
+            target_date = datetime(2025, 1, 3)
+
+            result = get_year_over_year_comparison(path, target_date, weeks_count=3, years=2)
+            this_year, last_year, two_years_ago = result["periods"]
+            assert last_year["reference_date"] == "2024-01-05" and two_years_ago["reference_date"] == "2023-01-06"
+            assert len(this_year["daily_data"]) == len(last_year["daily_data"]) == 3 * 7 + 7
+            assert not two_years_ago["data_available"] and two_years_ago["count_change_rate"] is None
+
+            engine = TrendEngine(path, months_between(datetime(2023, 12, 1), datetime(2025, 1, 31)))
+            for this_day, last_day in zip(this_year["daily_data"], last_year["daily_data"]):
+                date = datetime.strptime(last_day["date"], "%Y-%m-%d")
+                assert date.weekday() == datetime.strptime(this_day["date"], "%Y-%m-%d").weekday()
+                assert last_day["congestion_level"] == engine.day_level(date)
+            assert all(day["congestion_level"] == 0 for day in this_year["daily_data"] if day["days_from_reference"] > 0)
+
+            # 2/29 でも去年のセクションが作成できる
+            leap = get_congestion_data(path, datetime(2024, 2, 29), 3)
+            assert leap["historical_comparison"]["reference_date"] == "2023-02-28"
+            assert leap["last_year_today_hourly"]["date"] == "2023-02-28"
+            assert "message" not in leap["historical_comparison"]
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_engine_matches_monthly_views()
+    test_previous_year_date()
+    test_year_over_year_comparison()
+    print("✓ テスト成功")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+天気データ（WeatherService）の年月ごとの索引のテストスクリプト
+
+小さな天気CSVから、各取得メソッドが月の範囲を切り出して組み立てた結果と、
+CSVの更新後に読み込み直した索引へ差し替わること、
+起動したばかりのワーカーも変わっていない月の更新時刻をそのまま返すことを確認する。
+"""
+import os
+import stat
+import sys
+import tempfile
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の読み込みに必要な環境変数
+for key in ["GEMINI_API_KEY", "CRON_SECRET", "AWS_ACCSESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+    os.environ.setdefault(key, "test")
+# 天気データの月ごとの更新時刻は app/data ではなく一時ディレクトリに保存する
+os.environ.setdefault("WEATHER_STAMPS_PATH", os.path.join(tempfile.gettempdir(), "test_past_weather.csv.months.json"))
+
+from app.services.weather.weather_service import WeatherService, weather_service
+
+WEATHER_CSV = """日付,時,降水量 (mm),気温 (℃),日照 時間 (h),積雪 (cm),降雪 (cm),天気
+2024-01-01,7時,--,1.0,0.0,,,曇り
+2024-01-01,8時,0.5,3.0,0.2,,,晴れ
+2024-01-01,8時,1.5,4.0,0.1,,,雨
+2024-01-01,9時,--,--,0.9,,,晴れ
+2024-01-01,10時,2.0,6.0,0.5,,,曇り
+2024-01-01,11時,--,7.0,0.5,,,
+2024-01-08,8時,--,2.0,0.0,,,快晴
+2024-01-02,8時,--,5.0,0.3,,,雨
+2024-02-05,8時,1.0,8.0,0.0,,,雨
+"""
+
+
+def write_weather_csv(work, content, mtime):
+    path = os.path.join(work, "app", "data", "weather", "past_weather.csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def load_service(work, **kwargs):
+    write_weather_csv(work, WEATHER_CSV, 1_700_000_000)
+    return WeatherService(**kwargs)
+
+
+def test_month_accessors():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            service = load_service(work)
+
+            # 天気がない行は除き、同じ月の中は元の順
+            rows = service.get_weather_for_date_range(2024, 1)
+            assert [(row["date"], row["time"]) for row in rows][:3] == [
+                ("2024-01-01", "07:00"), ("2024-01-01", "08:00"), ("2024-01-01", "08:00")
+            ]
+            assert len(rows) == 7 and rows[-1]["date"] == "2024-01-02"
+            assert rows[0]["rain"] is None and rows[3]["temperature"] is None and rows[1]["sun"] == 0.2
+
+            # 最も頻繁な天気が同数の場合は Series.mode() と同じく並べ替えて最初のもの
+            summary = service.get_daily_weather_summary(2024, 1)
+            assert [day["day"] for day in summary] == [1, 2, 8]
+            assert summary[0] == {
+                "day": 1, "date": "2024-01-01", "weather": "晴れ", "avg_temperature": 3.5, "total_rain": 4.0,
+            }
+            assert summary[1]["total_rain"] is None
+
+            hourly = service.get_hourly_weather_for_day(2024, 1, 1)
+            assert [hour["hour"] for hour in hourly] == [7, 8, 8, 9, 10]
+            assert service.get_hourly_weather_for_day(2024, 1, 3) == []
+
+            # 同じ曜日の同じ時間は平均（2024-01-01 と 01-08 はどちらも月曜）
+            week_time = service.get_weather_for_week_time(2024, 1)
+            assert sorted(week_time) == [0, 1]
+            monday_8 = next(hour for hour in week_time[0] if hour["hour"] == 8)
+            assert monday_8 == {"hour": 8, "weather": "快晴", "avg_temperature": 3.0, "avg_rain": 1.0}
+
+            # 同じ時間のデータが複数ある場合は最後のもの
+            date_time = service.get_weather_for_date_time(2024, 1)
+            assert list(date_time) == [1, 8, 2]
+            assert date_time[1][1] == {"hour": 8, "weather": "雨", "temperature": 4.0, "rain": 1.5}
+
+            # 月ごとの結果は保持して同じものを返す（日別・曜日×時間別は読み込み時に作成済み）。データがない月は空
+            assert service.get_weather_for_date_time(2024, 1) is date_time
+            assert service.get_daily_weather_summary(2024, 1) is summary
+            assert service.get_weather_for_week_time(2024, 2) == {0: [{"hour": 8, "weather": "雨", "avg_temperature": 8.0, "avg_rain": 1.0}]}
+            assert service.get_daily_weather_summary(2024, 3) == []
+            assert service.get_weather_for_week_time(2023, 12) == {}
+            assert [row["day"] for row in service.get_weather_for_date_range(2024, 2)] == [5]
+        finally:
+            os.chdir(cwd)
+
+
+def test_reload_swaps_changed_months():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            service = load_service(work, reload_interval=0)
+            january = service.get_weather_for_date_time(2024, 1)
+            february = service.get_weather_for_date_time(2024, 2)
+            assert service.updated_at(2024, 1) == service.updated_at(2024, 2) == 1_700_000_000
+            assert service.updated_at(2024, 3) == 0
+
+            # 2月の行の変更と3月の行の追加（1月は変わらない）
+            content = WEATHER_CSV.replace("2024-02-05,8時,1.0,8.0,0.0,,,雨", "2024-02-05,8時,1.0,9.0,0.0,,,曇り")
+            write_weather_csv(work, content + "2024-03-01,9時,--,10.0,0.5,,,晴れ\n", 1_700_000_100)
+
+            # 取得時の確認でバックグラウンドの作り直しを始め、差し替えるまでは前の索引で応答する
+            assert service.get_weather_for_date_time(2024, 2) in (february, service._index.date_time(2024, 2))
+            service._reloading.join()
+
+            assert service.get_weather_for_date_time(2024, 1) is january
+            assert service.get_weather_for_date_time(2024, 2)[5] == [{"hour": 8, "weather": "曇り", "temperature": 9.0, "rain": 1.0}]
+            assert [day["day"] for day in service.get_daily_weather_summary(2024, 3)] == [1]
+            assert service.updated_at(2024, 1) == 1_700_000_000
+            assert service.updated_at(2024, 2) == service.updated_at(2024, 3) == service.updated_at() == 1_700_000_100
+
+            # 読み込めない内容に変わった場合はそれまでの索引を使い続ける
+            write_weather_csv(work, "壊れたファイル\n", 1_700_000_200)
+            assert not service.reload()
+            assert service.get_weather_for_date_time(2024, 1) is january
+        finally:
+            os.chdir(cwd)
+
+
+def test_fresh_services_share_month_stamps():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            running = load_service(work, reload_interval=3600)
+            assert running.updated_at(2024, 1) == 1_700_000_000
+
+            # 2月の行を変更して3月を追加し、2月の行を消す（1月は変わらない）
+            content = WEATHER_CSV.replace("2024-02-05,8時,1.0,8.0,0.0,,,雨\n", "")
+            write_weather_csv(work, content + "2024-03-01,9時,--,10.0,0.5,,,晴れ\n", 1_700_000_100)
+
+            # 後から起動したワーカーも、変わっていない月は前に記録した時刻を返す
+            first, second = WeatherService(), WeatherService()
+            for service in (first, second):
+                assert service.updated_at(2024, 1) == 1_700_000_000
+                assert service.updated_at(2024, 2) == service.updated_at(2024, 3) == 1_700_000_100
+            assert running.reload()
+            assert running._index.month_updates == first._index.month_updates == second._index.month_updates
+
+            # 他のサービスのアカウントからも読めるよう、open() で作った場合と同じ権限で保存する
+            umask = os.umask(0)
+            os.umask(umask)
+            assert stat.S_IMODE(os.stat(first.stamps_path).st_mode) == 0o666 & ~umask
+
+            # 保存した時刻を読み込めない場合はCSVの更新時刻を使う
+            with open(first.stamps_path, "w", encoding="utf-8") as f:
+                f.write("壊れたファイル")
+            assert WeatherService().updated_at(2024, 1) == 1_700_000_100
+        finally:
+            os.chdir(cwd)
+
+    # テストでは読み込み時に app/data へ書き込まない
+    assert weather_service.stamps_path == os.environ["WEATHER_STAMPS_PATH"]
+
+
+if __name__ == "__main__":
+    test_month_accessors()
+    test_reload_swaps_changed_months()
+    test_fresh_services_share_month_stamps()
+    print("✓ テスト成功")